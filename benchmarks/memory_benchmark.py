@@ -0,0 +1,67 @@
+"""Measure the orchestrator's memory per node for a large synthetic run.
+
+The workflow is a root with groups of leaves. Leaves have no command, so the
+run exercises the scheduler and the runtime records without spawning
+processes.
+
+    PYTHONPATH=src python benchmarks/memory_benchmark.py --nodes 1000000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import time
+import tracemalloc
+
+from wtflow.config import Config
+from wtflow.infra.engine import Engine, Executor
+from wtflow.infra.nodes import TreeNode
+from wtflow.infra.workflow import Graph, Tree
+
+
+def synthetic_tree(nodes: int, fan_out: int) -> Tree:
+    groups = []
+    for g in range(0, nodes, fan_out):
+        leaves = [TreeNode(name=f"leaf-{i}", timeout=60.0) for i in range(g, min(g + fan_out, nodes))]
+        groups.append(TreeNode(name=f"group-{g // fan_out}", children=leaves))
+    return Tree(name="memory benchmark", root=TreeNode(name="root", children=groups))
+
+
+def _report(label: str, size: int, nodes: int) -> None:
+    print(f"{label:<28} {size / 2**20:10.1f} MiB {size / nodes:8.0f} B/node")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=100_000, help="Number of leaf nodes")
+    parser.add_argument("--fan-out", type=int, default=1000, help="Leaves per group")
+    parser.add_argument("--jobs", type=int, default=256, help="Concurrency limit of the run")
+    args = parser.parse_args()
+
+    gc.collect()
+    tracemalloc.start()
+
+    base = tracemalloc.get_traced_memory()[0]
+    graph: Graph = synthetic_tree(args.nodes, args.fan_out).as_graph()
+    total = len(graph.nodes)
+    after_graph = tracemalloc.get_traced_memory()[0]
+    _report("graph", after_graph - base, total)
+
+    engine = Engine(Config(concurrency=args.jobs))
+    executor = Executor(graph, engine.servicer, engine.config.concurrency, metrics=engine.metrics)
+    after_state = tracemalloc.get_traced_memory()[0]
+    _report("executor and run state", after_state - after_graph, total)
+
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    exit_code = asyncio.run(executor.execute())
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    _report("peak during run", peak - base, total)
+    print(f"{total} nodes in {elapsed:.1f}s (exit code {exit_code})")
+
+
+if __name__ == "__main__":
+    main()
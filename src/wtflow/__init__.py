@@ -1,13 +1,16 @@
 from .decorator import wf
 from .infra.artifact import Artifact
 from .infra.engine import Engine
-from .infra.nodes import Node, TreeNode
+from .infra.nodes import Hedge, Matrix, Node, Resources, TreeNode
 from .infra.workflow import Graph, Tree
 
 __all__ = [
     "Artifact",
     "Engine",
+    "Hedge",
+    "Matrix",
     "Node",
+    "Resources",
     "wf",
     "Graph",
     "Tree",
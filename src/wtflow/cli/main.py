@@ -2,14 +2,18 @@ import argparse
 import asyncio
 import json
 import os
+import signal
 import sys
 from dataclasses import asdict
 from pathlib import Path
 from typing import Any, Sequence
 
-from wtflow.config import Config
+from wtflow.config import AdaptiveConfig, Config, MetricsConfig, NoStorageConfig, Sqlite3Config
 from wtflow.discover import discover_workflows
 from wtflow.infra.engine import Engine
+from wtflow.infra.server import RunServer, default_socket_path, submit
+from wtflow.infra.simulation import Distribution, Durations, simulate
+from wtflow.infra.watch import PollingWatcher, WorkflowWatcher
 from wtflow.infra.workflow import Tree
 
 
@@ -22,8 +26,12 @@ def main(argv: Sequence[str] | None = None) -> int:
 
     list_parser = subparsers.add_parser("list", help="List available workflows")
     run_parser = subparsers.add_parser("run", help="Run a workflow")
+    watch_parser = subparsers.add_parser("watch", help="Re-run the nodes of a workflow whose inputs change")
+    serve_parser = subparsers.add_parser("serve", help="Run workflows submitted with 'wtflow submit'")
+    submit_parser = subparsers.add_parser("submit", help="Run a workflow on a 'wtflow serve' daemon")
+    simulate_parser = subparsers.add_parser("simulate", help="Predict how long a workflow takes to run")
 
-    for subparser in [list_parser, run_parser]:
+    for subparser in [list_parser, run_parser, watch_parser, serve_parser, simulate_parser]:
         subparser.add_argument(
             "workflows_path",
             help="Path to workflows directory (default: 'wtfile.py')",
@@ -38,10 +46,109 @@ def main(argv: Sequence[str] | None = None) -> int:
         action="store_true",
         help="Perform a dry run without executing the workflow",
     )
+    for subparser in [run_parser, submit_parser]:
+        subparser.add_argument(
+            "--target",
+            action="append",
+            default=[],
+            metavar="NODE",
+            help="Run only this node and the nodes it depends on (repeatable)",
+        )
+        subparser.add_argument(
+            "--only",
+            action="append",
+            default=[],
+            metavar="NODE",
+            help="Run only this node, without its dependencies (repeatable)",
+        )
+    for subparser in [run_parser, serve_parser]:
+        subparser.add_argument("-j", "--jobs", type=int, default=None, help="Maximum number of nodes to run at once")
+        subparser.add_argument(
+            "--pipelined",
+            action="store_true",
+            help="Start dependents as soon as a node's process exits, storing its results in the background",
+        )
+        subparser.add_argument(
+            "--adaptive",
+            type=AdaptiveConfig.parse,
+            default=None,
+            metavar="MIN:MAX",
+            help="Adapt the number of nodes running at once to CPU, memory and IO pressure, within these bounds",
+        )
+        subparser.add_argument(
+            "--batch-size",
+            type=int,
+            default=32,
+            metavar="N",
+            help="Run up to N batchable sibling nodes one after another in a single process",
+        )
+    for subparser in [serve_parser, submit_parser]:
+        subparser.add_argument(
+            "--socket",
+            type=Path,
+            default=None,
+            metavar="PATH",
+            help="Unix socket of the daemon (default: $XDG_RUNTIME_DIR/wtflow.sock)",
+        )
+    submit_parser.add_argument("--workflow", help="Name of the workflow to run", required=True)
+    run_parser.add_argument("--prefix", action="store_true", help="Prefix each output line with the node name")
+    run_parser.add_argument("--timestamps", action="store_true", help="Prefix each output line with the time")
+    run_parser.add_argument("--color", action="store_true", help="Colour node name prefixes")
+
+    for subparser in [run_parser, watch_parser, serve_parser]:
+        subparser.add_argument(
+            "--metrics",
+            type=MetricsConfig.parse,
+            default=None,
+            metavar="ADDRESS",
+            help="Serve /metrics and /status on [HOST:]PORT or a Unix socket path",
+        )
+        subparser.add_argument(
+            "--grace-period",
+            type=float,
+            default=5.0,
+            metavar="SECONDS",
+            help="Time stopped nodes get to exit after SIGTERM before they are killed",
+        )
+
+    watch_parser.add_argument("--workflow", help="Name of the workflow to watch", required=True)
+    watch_parser.add_argument(
+        "--poll",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Poll for changes at this interval instead of using inotify",
+    )
+
+    simulate_parser.add_argument("--workflow", help="Name of the workflow to simulate", required=True)
+    simulate_parser.add_argument("--slots", type=int, required=True, help="Number of nodes that may run at once")
+    simulate_parser.add_argument(
+        "--durations",
+        type=Distribution.parse,
+        default=Distribution.parse("fixed:1"),
+        metavar="DISTRIBUTION",
+        help="Durations of nodes without history: fixed:S, uniform:LOW,HIGH, exponential:MEAN or "
+        "lognormal:MEDIAN,SIGMA (default: fixed:1)",
+    )
+    simulate_parser.add_argument(
+        "--database",
+        type=Path,
+        default=None,
+        metavar="PATH",
+        help="SQLite run database to draw the durations of previously run nodes from",
+    )
+    simulate_parser.add_argument("--seed", type=int, default=0, help="Seed of the sampled durations")
 
     args = parser.parse_args(argv)
 
-    config = Config()
+    if args.command == "submit":
+        socket_path = args.socket or default_socket_path()
+        try:
+            return asyncio.run(submit(socket_path, args.workflow, args.target, args.only))
+        except OSError as e:
+            print(f"Error: Could not reach the daemon at '{socket_path}': {e}", file=sys.stderr)
+            return 1
+
     wf_path: Path = args.workflows_path
     if not wf_path.exists():
         print(f"Error: The specified workflows path '{args.workflows_path}' does not exist.", file=sys.stderr)
@@ -52,7 +159,45 @@ def main(argv: Sequence[str] | None = None) -> int:
     if args.command == "list":
         return _cmd_list(workflow_dict)
     elif args.command == "run":
-        return asyncio.run(_cmd_run(workflow_dict, args.workflow, config, args.dry_run))
+        config = Config(
+            storage=NoStorageConfig(prefix=args.prefix, timestamps=args.timestamps, color=args.color),
+            concurrency=args.jobs,
+            metrics=args.metrics,
+            grace_period=args.grace_period,
+            pipelined=args.pipelined,
+            adaptive=args.adaptive,
+            batch_size=args.batch_size,
+        )
+        return asyncio.run(_cmd_run(workflow_dict, args.workflow, config, args.dry_run, args.target, args.only))
+    elif args.command == "watch":
+        try:
+            return asyncio.run(
+                _cmd_watch(
+                    workflow_dict,
+                    args.workflow,
+                    Config(metrics=args.metrics, grace_period=args.grace_period),
+                    args.poll,
+                )
+            )
+        except KeyboardInterrupt:
+            return 0
+    elif args.command == "serve":
+        config = Config(
+            # Clients get the output of their runs; the server's console is not the place for it.
+            storage=NoStorageConfig(echo=False),
+            concurrency=args.jobs,
+            metrics=args.metrics,
+            grace_period=args.grace_period,
+            pipelined=args.pipelined,
+            adaptive=args.adaptive,
+            batch_size=args.batch_size,
+        )
+        try:
+            return asyncio.run(_cmd_serve(workflow_dict, config, args.socket or default_socket_path()))
+        except KeyboardInterrupt:
+            return 0
+    elif args.command == "simulate":
+        return _cmd_simulate(workflow_dict, args.workflow, args.slots, args.durations, args.database, args.seed)
     else:
         raise NotImplementedError
 
@@ -74,6 +219,8 @@ async def _cmd_run(
     workflow_name: str | None = None,
     config: Config | None = None,
     dry_run: bool = False,
+    targets: Sequence[str] = (),
+    only: Sequence[str] = (),
 ) -> int:
     if not workflow_dict:
         print("No workflows found.", file=sys.stderr)
@@ -89,6 +236,24 @@ async def _cmd_run(
     else:
         wfs = [workflow_dict[workflow_name]]
 
+    if targets or only:
+        if workflow_name is None:
+            print("Error: --target and --only require --workflow.", file=sys.stderr)
+            return 1
+        try:
+            graph = wfs[0].as_graph().select(targets, only)
+        except KeyError as e:
+            print(f"Error: Node {e} not found in workflow '{workflow_name}'.", file=sys.stderr)
+            return 1
+        if dry_run:
+            print(json.dumps({"name": graph.name, "nodes": sorted(node.name for node in graph.nodes)}, indent=2))
+            return 0
+        engine = Engine(config=config)
+        try:
+            return await engine.run_graph(graph)
+        finally:
+            await engine.close()
+
     if dry_run:
 
         def _dict_factory(x: list[tuple[str, Any]]) -> dict[str, Any]:
@@ -97,12 +262,86 @@ async def _cmd_run(
         print(json.dumps([asdict(workflow, dict_factory=_dict_factory) for workflow in wfs], indent=2))
         return 0
 
-    for wf in wfs:
-        engine = Engine(config=config)
-        res += await engine.run_workflow(workflow=wf)
+    engine = Engine(config=config)
+    try:
+        for wf in wfs:
+            res += await engine.run_workflow(workflow=wf)
+    finally:
+        await engine.close()
 
     return min(res, 1)
 
 
+async def _cmd_watch(
+    workflow_dict: dict[str, Tree],
+    workflow_name: str,
+    config: Config | None = None,
+    poll_interval: float | None = None,
+) -> int:
+    if workflow_name not in workflow_dict:
+        print(f"Error: Workflow '{workflow_name}' not found.", file=sys.stderr)
+        return 1
+
+    engine = Engine(config=config)
+    watcher = PollingWatcher(poll_interval) if poll_interval is not None else None
+    try:
+        await WorkflowWatcher(engine, workflow_dict[workflow_name].as_graph(), Path.cwd(), watcher).run()
+    finally:
+        await engine.close()
+    return 0
+
+
+async def _cmd_serve(workflow_dict: dict[str, Tree], config: Config, socket_path: Path) -> int:
+    engine = Engine(config=config)
+    server = RunServer(engine, workflow_dict, socket_path)
+    try:
+        await server.start()
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(f"Serving {len(workflow_dict)} workflow(s) on {socket_path}", file=sys.stderr)
+    serving = asyncio.create_task(server.serve_forever())
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, serving.cancel)
+    try:
+        await serving
+    except asyncio.CancelledError:
+        pass
+    finally:
+        await server.close()
+        await engine.close()
+    return 0
+
+
+def _cmd_simulate(
+    workflow_dict: dict[str, Tree],
+    workflow_name: str,
+    slots: int,
+    default: Distribution,
+    database_path: Path | None = None,
+    seed: int = 0,
+) -> int:
+    if workflow_name not in workflow_dict:
+        print(f"Error: Workflow '{workflow_name}' not found.", file=sys.stderr)
+        return 1
+    if slots < 1:
+        print("Error: --slots must be at least 1.", file=sys.stderr)
+        return 1
+
+    graph = workflow_dict[workflow_name].as_graph()
+    if database_path is None:
+        durations = Durations(default, seed=seed)
+    else:
+        db_service = Sqlite3Config(str(database_path)).create_db_service()
+        durations = asyncio.run(Durations.from_history(db_service, graph, default, seed))
+    result = simulate(graph, slots, durations)
+
+    print(f"Makespan: {result.makespan:.2f}s")
+    print(f"Utilisation: {result.utilisation:.1%} of {result.slots} slot(s)")
+    print("Critical path:")
+    for node, start, end in result.critical_path:
+        print(f"  {start:10.2f}s {end:10.2f}s  {node.name}")
+    return 0
+
+
 if __name__ == "__main__":
     raise SystemExit(main())
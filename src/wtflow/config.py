@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import os
 import pathlib
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
@@ -29,28 +30,171 @@ class Sqlite3Config(DatabaseConfig):
         return Sqlite3DBService(self.database_path)
 
 
+@dataclass
+class LogDBConfig(DatabaseConfig):
+    directory: str
+    compact_to: str | None = None
+
+    def create_db_service(self) -> DBService:
+        from wtflow.services.db.log.log_db_service import LogDBService
+
+        return LogDBService(self.directory, compact_to=self.compact_to)
+
+
 class StorageConfig(ABC):
     @abstractmethod
     def create_storage_service(self) -> StorageService:
         return NotImplemented
 
 
+@dataclass
 class NoStorageConfig(StorageConfig):
+    prefix: bool = False
+    timestamps: bool = False
+    color: bool = False
+    flush_interval: float = 0.05
+    buffer_size: int = 64 * 1024
+    echo: bool = True
+
     def create_storage_service(self) -> StorageService:
-        return NoStorageService()
+        return NoStorageService(
+            prefix=self.prefix,
+            timestamps=self.timestamps,
+            color=self.color,
+            flush_interval=self.flush_interval,
+            buffer_size=self.buffer_size,
+            echo=self.echo,
+        )
 
 
 @dataclass
 class LocalStorageConfig(StorageConfig):
     base_path: pathlib.Path
+    max_open_files: int = 256
+    link_artifacts: bool = False
 
     def create_storage_service(self) -> StorageService:
         from wtflow.services.storage.local.local_storage_service import LocalStorageService
 
-        return LocalStorageService(base_path=self.base_path)
+        return LocalStorageService(
+            base_path=self.base_path,
+            max_open_files=self.max_open_files,
+            link_artifacts=self.link_artifacts,
+        )
+
+
+@dataclass
+class CASStorageConfig(StorageConfig):
+    base_path: pathlib.Path
+    max_open_files: int = 256
+
+    def create_storage_service(self) -> StorageService:
+        from wtflow.services.storage.cas.cas_storage_service import CASStorageService
+
+        return CASStorageService(base_path=self.base_path, max_open_files=self.max_open_files)
+
+
+@dataclass
+class BundleStorageConfig(StorageConfig):
+    base_path: pathlib.Path
+    max_open_files: int = 256
+    spill_threshold: int = 64 * 1024
+    bundle_size: int = 1024 * 1024 * 1024
+
+    def create_storage_service(self) -> StorageService:
+        from wtflow.services.storage.bundle.bundle_storage_service import BundleStorageService
+
+        return BundleStorageService(
+            base_path=self.base_path,
+            max_open_files=self.max_open_files,
+            spill_threshold=self.spill_threshold,
+            bundle_size=self.bundle_size,
+        )
+
+
+@dataclass
+class S3StorageConfig(StorageConfig):
+    bucket: str
+    endpoint_url: str = "https://s3.amazonaws.com"
+    region: str = "us-east-1"
+    access_key: str | None = None
+    secret_key: str | None = None
+    prefix: str = ""
+    part_size: int = 8 * 1024 * 1024
+    max_concurrency: int = 4
+
+    def create_storage_service(self) -> StorageService:
+        from wtflow.services.storage.s3.s3_client import S3Client
+        from wtflow.services.storage.s3.s3_storage_service import S3StorageService
+
+        client = S3Client(
+            endpoint_url=self.endpoint_url,
+            bucket=self.bucket,
+            access_key=self.access_key or os.environ.get("AWS_ACCESS_KEY_ID", ""),
+            secret_key=self.secret_key or os.environ.get("AWS_SECRET_ACCESS_KEY", ""),
+            region=self.region,
+        )
+        return S3StorageService(
+            client,
+            prefix=self.prefix,
+            part_size=self.part_size,
+            max_concurrency=self.max_concurrency,
+        )
+
+
+@dataclass
+class MetricsConfig:
+    """Where to serve metrics: TCP ``host``/``port``, or a Unix socket at ``unix_path``."""
+
+    host: str = "127.0.0.1"
+    port: int = 9100
+    unix_path: str | None = None
+    lag_interval: float = 0.5
+
+    @classmethod
+    def parse(cls, address: str) -> MetricsConfig:
+        """Parse ``[HOST:]PORT`` or a socket path (anything containing ``/``)."""
+        if "/" in address:
+            return cls(unix_path=address)
+        host, _, port = address.rpartition(":")
+        return cls(host=host or cls.host, port=int(port))
+
+
+@dataclass
+class AdaptiveConfig:
+    """Bounds and targets of the adaptive concurrency limit.
+
+    The limit grows by one every ``interval`` seconds while the nodes use it
+    all and the system is under the ``*_pressure`` targets (percentages of
+    time stalled), and is multiplied by ``backoff`` when one is exceeded, at
+    most once per ``cooldown`` seconds.
+    """
+
+    min_concurrency: int = 1
+    max_concurrency: int | None = None
+    interval: float = 1.0
+    cpu_pressure: float = 25.0
+    memory_pressure: float = 5.0
+    io_pressure: float = 25.0
+    backoff: float = 0.5
+    cooldown: float = 10.0
+
+    @classmethod
+    def parse(cls, bounds: str) -> AdaptiveConfig:
+        """Parse ``MIN:MAX``, ``MIN:`` or ``:MAX``."""
+        low, _, high = bounds.partition(":")
+        return cls(min_concurrency=int(low) if low else 1, max_concurrency=int(high) if high else None)
 
 
 @dataclass
 class Config:
     database: DatabaseConfig = field(default_factory=NoDatabaseConfig)
     storage: StorageConfig = field(default_factory=NoStorageConfig)
+    concurrency: int | None = None
+    metrics: MetricsConfig | None = None
+    grace_period: float = 5.0
+    reserve_core: bool = False
+    handoff_limit: int = 64 * 1024
+    pipelined: bool = False
+    adaptive: AdaptiveConfig | None = None
+    batch_size: int = 32
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable
+
+from wtflow.config import AdaptiveConfig
+
+logger = logging.getLogger(__name__)
+
+PRESSURE_PATH = Path("/proc/pressure")
+LOADAVG_PATH = Path("/proc/loadavg")
+MEMINFO_PATH = Path("/proc/meminfo")
+
+# Below this fraction of available memory the fallback reports memory pressure.
+_LOW_MEMORY = 0.1
+
+
+@dataclass(frozen=True, slots=True)
+class Pressure:
+    """How much of the time tasks were stalled on CPU, memory and IO, in percent."""
+
+    cpu: float = 0.0
+    memory: float = 0.0
+    io: float = 0.0
+
+
+def _some_avg10(path: Path) -> float:
+    for line in path.read_text().splitlines():
+        kind, *fields = line.split()
+        if kind == "some":
+            return float(dict(field.split("=") for field in fields)["avg10"])
+    raise ValueError(f"No 'some' line in {path}")
+
+
+def read_pressure(path: Path = PRESSURE_PATH) -> Pressure:
+    """Read the 10-second ``some`` averages of the kernel's pressure stall information."""
+    return Pressure(*(_some_avg10(path / resource) for resource in ("cpu", "memory", "io")))
+
+
+def read_load(loadavg: Path = LOADAVG_PATH, meminfo: Path = MEMINFO_PATH, cpus: int | None = None) -> Pressure:
+    """Estimate pressure from the load average and available memory, where PSI is missing.
+
+    CPU pressure is the share of the runnable tasks that exceed the CPUs;
+    memory pressure grows from 0 to 100 as available memory drops from 10%
+    of the total to nothing. IO is not estimated.
+    """
+    cpus = cpus or os.cpu_count() or 1
+    load = float(loadavg.read_text().split()[0])
+    cpu = 100.0 * max(0.0, load - cpus) / load if load else 0.0
+    memory = 0.0
+    info: dict[str, int] = {}
+    for line in meminfo.read_text().splitlines():
+        name, _, value = line.partition(":")
+        if value.split():
+            info[name] = int(value.split()[0])
+    if "MemTotal" in info and "MemAvailable" in info:
+        available = info["MemAvailable"] / info["MemTotal"]
+        memory = 100.0 * max(0.0, 1.0 - available / _LOW_MEMORY)
+    return Pressure(cpu, memory)
+
+
+def sample_pressure() -> Pressure:
+    try:
+        return read_pressure()
+    except (OSError, ValueError, KeyError):
+        return read_load()
+
+
+class AdaptiveLimit:
+    """A concurrency limit driven by system pressure, additive increase and multiplicative decrease.
+
+    Every ``config.interval`` seconds ``sampler`` is read. Over any target,
+    the limit is cut by ``config.backoff``; as the pressure averages lag,
+    not again until ``config.cooldown`` seconds later. Under all targets,
+    and with as many nodes running as the limit allows, it grows by one.
+    It stays between ``config.min_concurrency`` and
+    ``config.max_concurrency`` (twice the CPU count when unset), starting
+    from the CPU count.
+
+    ``raised`` resolves when the limit grows, so that a scheduler waiting on
+    running nodes can start more.
+
+    One limit may be shared by several runs: it is adjusted while any of them
+    is inside :meth:`control`, to the nodes running across all of them.
+    """
+
+    def __init__(
+        self,
+        config: AdaptiveConfig,
+        sampler: Callable[[], Pressure] = sample_pressure,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        cpus = os.cpu_count() or 1
+        self.config = config
+        self.sampler = sampler
+        self.clock = clock
+        self.minimum = max(1, config.min_concurrency)
+        self.maximum = max(self.minimum, config.max_concurrency or 2 * cpus)
+        self._limit = float(min(max(cpus, self.minimum), self.maximum))
+        self._last_backoff = -float("inf")
+        self._raised: asyncio.Future[None] | None = None
+        self._users: list[tuple[Callable[[], int], Callable[[int], None] | None]] = []
+        self._controller: asyncio.Task[None] | None = None
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def raised(self) -> asyncio.Future[None]:
+        if self._raised is None or self._raised.done():
+            self._raised = asyncio.get_running_loop().create_future()
+        return self._raised
+
+    def update(self, pressure: Pressure, running: int) -> int:
+        """Adjust the limit to ``pressure`` with ``running`` nodes and return it."""
+        config = self.config
+        if (
+            pressure.cpu > config.cpu_pressure
+            or pressure.memory > config.memory_pressure
+            or pressure.io > config.io_pressure
+        ):
+            now = self.clock()
+            if now - self._last_backoff >= config.cooldown and self._limit > self.minimum:
+                self._last_backoff = now
+                self._limit = max(float(self.minimum), self._limit * config.backoff)
+                logger.info("System under pressure (%s), concurrency limit lowered to %d", pressure, self.limit)
+        elif running >= self.limit and self._limit < self.maximum:
+            self._limit = min(float(self.maximum), self._limit + 1)
+            if self._raised is not None and not self._raised.done():
+                self._raised.set_result(None)
+        return self.limit
+
+    @asynccontextmanager
+    async def control(
+        self,
+        running: Callable[[], int],
+        on_update: Callable[[int], None] | None = None,
+    ) -> AsyncIterator[None]:
+        """Keep the limit adjusted while in the context, reporting each limit to ``on_update``.
+
+        ``running`` returns how many nodes of the caller are running.
+        """
+        user = (running, on_update)
+        self._users.append(user)
+        if self._controller is None:
+            self._controller = asyncio.create_task(self._run())
+        try:
+            yield
+        finally:
+            self._users.remove(user)
+            if not self._users and self._controller is not None:
+                controller, self._controller = self._controller, None
+                controller.cancel()
+                await asyncio.gather(controller, return_exceptions=True)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.config.interval)
+            try:
+                pressure = await asyncio.to_thread(self.sampler)
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning("Could not sample system pressure: %s", e)
+                continue
+            limit = self.update(pressure, sum(running() for running, _ in self._users))
+            for _, on_update in self._users:
+                if on_update is not None:
+                    on_update(limit)
+
+
+class Slots:
+    """A budget of running processes shared by the runs of an engine.
+
+    At most ``concurrency`` slots are held at once (unlimited when ``None``)
+    and, with an ``adaptive`` limit, no more than it currently allows.
+    """
+
+    def __init__(self, concurrency: int | None = None, adaptive: AdaptiveLimit | None = None) -> None:
+        self.concurrency = concurrency
+        self.adaptive = adaptive
+        self.held = 0
+        self._freed: asyncio.Future[None] | None = None
+
+    @property
+    def limit(self) -> int | None:
+        if self.adaptive is None:
+            return self.concurrency
+        if self.concurrency is None:
+            return self.adaptive.limit
+        return min(self.concurrency, self.adaptive.limit)
+
+    def _full(self) -> bool:
+        limit = self.limit
+        return limit is not None and self.held >= limit
+
+    async def __aenter__(self) -> None:
+        while self._full():
+            if self._freed is None or self._freed.done():
+                self._freed = asyncio.get_running_loop().create_future()
+            waiting = [self._freed]
+            if self.adaptive is not None:
+                waiting.append(self.adaptive.raised)
+            await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+        self.held += 1
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self.held -= 1
+        if self._freed is not None and not self._freed.done():
+            self._freed.set_result(None)
@@ -3,7 +3,14 @@ from __future__ import annotations
 from dataclasses import dataclass
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Artifact:
+    """An output of a node.
+
+    ``path`` is the file the node writes, relative to the working directory;
+    it is collected into storage after the node succeeds.
+    """
+
     name: str
     file_type: str = "txt"
+    path: str | None = None
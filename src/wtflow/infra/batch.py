@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+import os
+from dataclasses import dataclass
+from typing import Sequence
+
+from wtflow.infra.nodes import Node
+
+STREAMS = ("stdout", "stderr")
+DEFAULT_BATCH_SIZE = 32
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.now(tz=datetime.timezone.utc)
+
+
+@dataclass(frozen=True, slots=True)
+class Exit:
+    """The exit status of a batched command, and when the end of its output was read."""
+
+    status: int
+    time: datetime.datetime
+
+
+class Batch:
+    """The commands of several nodes, run one after another by a single shell.
+
+    Each command runs in a subshell, so that ``exit`` or ``cd`` do not leak
+    into the next one. After it, the shell writes ``marker`` followed by the
+    command's index and exit status to both stdout and stderr; ``split``
+    cuts the shell's output at the markers into one stream per command. The
+    shell stops after the first command that fails.
+    """
+
+    def __init__(self, nodes: Sequence[Node]) -> None:
+        loop = asyncio.get_running_loop()
+        self.nodes = nodes
+        self.marker = b"\x1ewtflow:" + os.urandom(8).hex().encode() + b"\x1e"
+        self.started = _utcnow()
+        self.exits: list[Exit | None] = [None] * len(nodes)
+        self.outputs = {name: [asyncio.StreamReader() for _ in nodes] for name in STREAMS}
+        self._ends: dict[str, list[asyncio.Future[Exit | None]]] = {
+            name: [loop.create_future() for _ in nodes] for name in STREAMS
+        }
+
+    @property
+    def script(self) -> str:
+        marker = self.marker.decode().replace("\x1e", "\\036")
+        lines = []
+        for i, node in enumerate(self.nodes):
+            # The command is closed on its own line, in case it ends with a comment.
+            lines += [
+                f"({node.command}\n)",
+                "wtflow_status=$?",
+                f"printf '{marker}%d %d\\n' {i} $wtflow_status",
+                f"printf '{marker}%d %d\\n' {i} $wtflow_status >&2",
+                '[ "$wtflow_status" -eq 0 ] || exit "$wtflow_status"',
+            ]
+        return "\n".join(lines)
+
+    async def split(self, name: str, stream: asyncio.StreamReader) -> None:
+        """Feed what the shell writes to its ``name`` stream to the ``outputs`` of the commands.
+
+        At the end of ``stream``, the outputs of the commands that did not
+        finish are ended too.
+        """
+        outputs, ends = self.outputs[name], self._ends[name]
+        marker = self.marker
+        i = 0
+        try:
+            while i < len(self.nodes):
+                try:
+                    data = await stream.readuntil(marker)
+                except asyncio.LimitOverrunError as e:
+                    outputs[i].feed_data(await stream.readexactly(e.consumed))
+                    continue
+                except asyncio.IncompleteReadError as e:
+                    outputs[i].feed_data(e.partial)
+                    break
+                outputs[i].feed_data(data[: -len(marker)])
+                outputs[i].feed_eof()
+                _, status = (await stream.readline()).split()
+                if not ends[i].done():
+                    ends[i].set_result(Exit(int(status), _utcnow()))
+                i += 1
+        finally:
+            for output, end in zip(outputs[i:], ends[i:]):
+                output.feed_eof()
+                if not end.done():
+                    end.set_result(None)
+
+    async def end(self, i: int) -> Exit | None:
+        """Wait until the output of command ``i`` is complete; return how it exited, or ``None`` if it did not."""
+        stdout, stderr = await asyncio.gather(self._ends["stdout"][i], self._ends["stderr"][i])
+        if stdout is None or stderr is None:
+            return None
+        self.exits[i] = stdout if stdout.time >= stderr.time else stderr
+        return self.exits[i]
+
+    def start_time(self, i: int) -> datetime.datetime:
+        """When command ``i`` started: when the output of the one before it was complete."""
+        previous = self.exits[i - 1] if i else None
+        return previous.time if previous is not None else self.started
@@ -2,18 +2,40 @@ from __future__ import annotations
 
 import asyncio
 import logging
+import math
 import os
 import signal
+from collections import deque
+from dataclasses import dataclass
 from enum import IntEnum
 from graphlib import TopologicalSorter
+from pathlib import Path
+from typing import Any, AsyncGenerator, Callable, Iterable, Iterator, Sequence
 
 from wtflow.config import Config
+from wtflow.infra.adaptive import AdaptiveLimit, Slots
 from wtflow.infra.artifact import Artifact
-from wtflow.infra.info import ExecutionInfo, RunInfo
+from wtflow.infra.batch import DEFAULT_BATCH_SIZE, STREAMS, Batch
+from wtflow.infra.events import (
+    Event,
+    EventBus,
+    LogChunk,
+    NodeFinished,
+    NodeQueued,
+    NodeStarted,
+    RunFinished,
+    RunStarted,
+)
+from wtflow.infra.handoff import DEFAULT_INLINE_LIMIT, Capture, Handoff, env_name
+from wtflow.infra.hedge import Race, SpoolStorageService, percentile
+from wtflow.infra.info import ArtifactInfo, ExecutionInfo, RunInfo
+from wtflow.infra.metrics import Metrics, MetricsServer
 from wtflow.infra.nodes import Node
+from wtflow.infra.resources import CoreAllocator, resource_setter
+from wtflow.infra.state import RunState
 from wtflow.infra.workflow import Graph, Tree
 from wtflow.services.servicer import Servicer
-from wtflow.services.storage.storage_service import StorageService
+from wtflow.services.storage.storage_service import ArtifactStats, StorageService
 
 logger = logging.getLogger(__name__)
 
@@ -30,7 +52,36 @@ class NodeResult(IntEnum):
     CANCEL = 3
 
 
-async def _wait_process(process: asyncio.subprocess.Process, timeout: float | None) -> NodeResult:
+DEFAULT_GRACE_PERIOD = 5.0
+
+
+def _signal_group(process: asyncio.subprocess.Process, sig: signal.Signals) -> None:
+    try:
+        os.killpg(process.pid, sig)
+    except ProcessLookupError:
+        pass
+
+
+async def _terminate(process: asyncio.subprocess.Process, grace_period: float) -> None:
+    """Stop the process group with SIGTERM, escalating to SIGKILL after ``grace_period``."""
+    _signal_group(process, signal.SIGTERM)
+    try:
+        await asyncio.wait_for(process.wait(), grace_period)
+        return
+    except asyncio.TimeoutError:
+        logger.warning("Process %d ignored SIGTERM for %.1fs, killing it", process.pid, grace_period)
+    _signal_group(process, signal.SIGKILL)
+    try:
+        await asyncio.wait_for(process.wait(), grace_period)
+    except asyncio.TimeoutError:
+        logger.error("Process %d did not exit after SIGKILL", process.pid)
+
+
+async def _wait_process(
+    process: asyncio.subprocess.Process,
+    timeout: float | None,
+    grace_period: float = DEFAULT_GRACE_PERIOD,
+) -> NodeResult:
     try:
         result = await asyncio.wait_for(process.wait(), timeout)
         return NodeResult.FAIL if result else NodeResult.SUCCESS
@@ -40,101 +91,832 @@ async def _wait_process(process: asyncio.subprocess.Process, timeout: float | No
         return NodeResult.CANCEL
     finally:
         if process.returncode is None:
-            os.killpg(os.getpgid(process.pid), signal.SIGTERM)
-        await process.wait()
+            await _terminate(process, grace_period)
+
 
+async def _start_process(
+    command: str,
+    setup: Callable[[int], None] | None = None,
+    env: dict[str, str] | None = None,
+) -> asyncio.subprocess.Process:
+    """Start ``command`` in a new session, passing its pid to ``setup`` before the command runs.
 
-async def _start_process(command: str) -> asyncio.subprocess.Process:
-    return await asyncio.create_subprocess_shell(
+    The shell waits for a line on its stdin until ``setup`` has run. If
+    ``setup`` fails the process group is killed and the error raised.
+    """
+    if setup is not None:
+        command = f"read _ || exit 126\n{command}"
+    process = await asyncio.create_subprocess_shell(
         command,
+        stdin=asyncio.subprocess.PIPE if setup is not None else None,
         stdout=asyncio.subprocess.PIPE,
         stderr=asyncio.subprocess.PIPE,
         start_new_session=True,
+        env=env,
     )
+    if setup is not None:
+        assert process.stdin is not None
+        try:
+            setup(process.pid)
+        except ProcessLookupError:
+            pass  # Already gone; nothing left to apply them to.
+        except OSError:
+            _signal_group(process, signal.SIGKILL)
+            process.stdin.close()
+            await process.wait()
+            raise
+        process.stdin.write(b"\n")
+        process.stdin.close()
+    return process
 
 
 async def _read_stream(
     storage_service: StorageService,
-    workflow: Graph,
+    run_info: RunInfo,
     node: Node,
     stream: asyncio.StreamReader,
     artifact: Artifact,
+    events: EventBus | None = None,
+    metrics: Metrics | None = None,
+    capture: Capture | None = None,
+    stats: ArtifactStats | None = None,
 ) -> None:
-    with storage_service.open_artifact(workflow, node, artifact) as f:
+    with storage_service.open_artifact(run_info, node, artifact) as f:
         while data := await stream.readline():
             f.write(data)
+            if f.congested:
+                await f.drain()
+            if stats is not None:
+                stats.update(data)
+            if capture is not None:
+                capture.write(data)
+            if metrics is not None:
+                metrics.captured_bytes += len(data)
+            if events:
+                chunk = LogChunk(run_id=run_info.run_id, node=node, artifact=artifact.name, data=data)
+                events.publish(chunk)
+                await events.drain(chunk)
+
+
+def _sorter(graph: Graph) -> TopologicalSorter[int]:
+    """Return a prepared sorter over node ids, the positions in ``graph.nodes``."""
+    ids = {node: i for i, node in enumerate(graph.nodes)}
+    ts: TopologicalSorter[int] = TopologicalSorter()
+    for i in range(len(graph.nodes)):
+        ts.add(i)
+    for before, after in graph.edges:
+        ts.add(ids[after], ids[before])
+    ts.prepare()
+    return ts
+
+
+@dataclass(slots=True)
+class _ExitedProcess:
+    """A node's process that has exited, and what is left to finish the node."""
+
+    node: Node
+    instance: Node
+    result: NodeResult
+    stream_tasks: list[asyncio.Task[None]]
+    captures: dict[str, Capture | None]
+    stats: dict[str, ArtifactStats]
+    spool: SpoolStorageService | None
+    hand_off: bool
 
 
 class Executor:
-    def __init__(self, graph: Graph, servicer: Servicer) -> None:
+    """Runs the nodes of a graph in dependency order.
+
+    At most ``concurrency`` executions run at the same time (unlimited when
+    ``None``). Matrix nodes are expanded one instance at a time as slots free
+    up, and count as done once all their instances finished. Nodes are
+    scheduled by id and their state is tracked in the columns of ``state``.
+
+    Progress and log output are published to ``events`` when given, and
+    counted in ``metrics``.
+
+    After the first failure the remaining executions are cancelled together:
+    their process groups get SIGTERM, then SIGKILL after ``grace_period``
+    seconds, and the executor gives up waiting on them after
+    ``teardown_timeout``.
+
+    ``slots`` is a budget of running processes shared with the other runs of
+    an engine; a node holds one while its process runs.
+
+    A node with a ``hedge`` policy that runs longer than its threshold gets a
+    second attempt; whichever finishes first is kept and the other is stopped.
+    Both attempts are recorded in the run database, but only the output of
+    the one kept is stored and published.
+
+    Nodes asking for ``Resources.cores`` get their CPUs from ``allocator``.
+    When the allocator reserves a CPU for the orchestrator, every other node
+    is kept off it.
+
+    Outputs of finished nodes are handed to the processes of the nodes that
+    depend on them through ``handoff``: declared artifacts by path, and
+    ``stdout``/``stderr`` through shared memory when within ``handoff_limit``
+    bytes.
+
+    In ``pipelined`` mode a node's dependents are released as soon as its
+    process exits successfully (once its output has been read, if it is
+    handed off); storing its artifacts and recording it in the database go
+    on in the background, outside the concurrency limit. The run waits for
+    them before it ends, and fails if any of them fails.
+
+    With an ``adaptive`` limit, the number of running nodes is also kept
+    under a limit that follows the pressure on the system; it is reported in
+    the run's metrics. Runs sharing ``slots`` should share the limit too, so
+    that it bounds their processes together.
+
+    ``batchable`` nodes without dependencies that become ready together and
+    have the same dependents are run by a single process, up to
+    ``batch_size`` at a time, one after another; see ``execute_batch``.
+    Only as many are batched as there are too few free slots for, so with
+    unlimited concurrency nothing is.
+    """
+
+    def __init__(
+        self,
+        graph: Graph,
+        servicer: Servicer,
+        concurrency: int | None = None,
+        events: EventBus | None = None,
+        metrics: Metrics | None = None,
+        grace_period: float = DEFAULT_GRACE_PERIOD,
+        allocator: CoreAllocator | None = None,
+        handoff_limit: int = DEFAULT_INLINE_LIMIT,
+        slots: Slots | None = None,
+        pipelined: bool = False,
+        adaptive: AdaptiveLimit | None = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> None:
         self.graph = graph
         self.servicer = servicer
         self.db_service = servicer.db_service
         self.run_info = RunInfo(graph=graph)
+        self.state = RunState(graph.nodes)
+        self.concurrency = concurrency
+        self.events = events
+        self.metrics = metrics or Metrics()
+        self.status = self.metrics.run_started(self.run_info)
+        self.grace_period = grace_period
+        self.allocator = allocator or CoreAllocator.for_process()
+        self.handoff = Handoff(handoff_limit)
+        self.slots = slots
+        self.pipelined = pipelined
+        self.adaptive = adaptive
+        self.batch_size = batch_size
+        self._hedge_delays: dict[Node, float | None] = {}
+
+    @property
+    def teardown_timeout(self) -> float:
+        # SIGTERM grace, SIGKILL grace, and a little for the records.
+        return 2 * self.grace_period + 1.0
+
+    def _publish(self, event_type: type[Event], **kwargs: Any) -> None:
+        if self.events:
+            self.events.publish(event_type(run_id=self.run_info.run_id, **kwargs))
+
+    def _has_capacity(self, running: int) -> bool:
+        if self.adaptive is not None and running >= self.adaptive.limit:
+            return False
+        return self.concurrency is None or running < self.concurrency
 
     async def execute(self) -> ExitCode:
+        self._publish(RunStarted, workflow=self.graph.name)
+        exit_code = ExitCode.FAIL
+        try:
+            exit_code = await self._schedule()
+            return exit_code
+        finally:
+            self.handoff.close()
+            self.metrics.run_finished(self.status, exit_code)
+            self._publish(RunFinished, exit_code=exit_code)
+
+    async def _schedule(self) -> ExitCode:
         self.run_info.start()
-        await self.db_service.start_run(self.run_info)
-        ts = TopologicalSorter(self.graph)
-        ts.prepare()
-        while ts.is_active():
-            ready_nodes = ts.get_ready()
-            tasks = [asyncio.create_task(self.execute_node(node, ts)) for node in ready_nodes]
-            for future_result in asyncio.as_completed(tasks):
-                result = await future_result
-                if result:
-                    _cancel_tasks(tasks)
-                    return ExitCode.FAIL
+        with self.metrics.db_write_latency.time():
+            await self.db_service.start_run(self.run_info)
+        ts = _sorter(self.graph)
+        # Includes the nodes released early that are still being finished.
+        running: dict[asyncio.Future[NodeResult], int] = {}
+        # The nodes released early, which no longer count against the limits.
+        finishing: set[asyncio.Future[NodeResult]] = set()
+        try:
+            if self.adaptive is None:
+                return await self._schedule_nodes(ts, running, finishing)
+            self.status.concurrency_limit = self.adaptive.limit
+            async with self.adaptive.control(lambda: len(running) - len(finishing), self._limit_changed):
+                return await self._schedule_nodes(ts, running, finishing)
+        finally:
+            await self._teardown(running)
+
+    def _limit_changed(self, limit: int) -> None:
+        self.status.concurrency_limit = limit
+
+    async def _schedule_nodes(
+        self,
+        ts: TopologicalSorter[int],
+        running: dict[asyncio.Future[NodeResult], int],
+        finishing: set[asyncio.Future[NodeResult]],
+    ) -> ExitCode:
+        nodes = self.graph.nodes
+        state = self.state
+        queue: deque[tuple[int, Iterator[dict[str, Any]] | None]] = deque()
+        expanding: set[int] = set()
+        releases: dict[asyncio.Future[None], asyncio.Future[NodeResult]] = {}
+        release_of: dict[asyncio.Future[NodeResult], asyncio.Future[None]] = {}
+        # The nodes of each batch, by the id of its first node.
+        batches: dict[int, list[int]] = {}
+
+        while ts.is_active() or running:
+            siblings: dict[tuple[Node, ...], list[int]] = {}
+            for i in ts.get_ready():
+                node = nodes[i]
+                state.queued(i)
+                self._publish(NodeQueued, node=node)
+                self.metrics.nodes_queued(self.status, 1 if node.matrix is None else len(node.matrix))
+                if node.matrix is not None:
+                    queue.append((i, iter(node.matrix)))
+                    expanding.add(i)
+                elif self._batchable(node):
+                    siblings.setdefault(self.graph.successors(node), []).append(i)
+                else:
+                    queue.append((i, None))
+            if siblings:
+                free = self._free_slots(len(running) - len(finishing))
+                for ids in siblings.values():
+                    # Every node or batch already queued is to take a slot first.
+                    size = self._batch_size(len(ids), None if free is None else free - len(queue))
+                    for start in range(0, len(ids), size):
+                        batch = ids[start : start + size]
+                        queue.append((batch[0], None))
+                        if len(batch) > 1:
+                            batches[batch[0]] = batch
+
+            while queue and self._has_capacity(len(running) - len(finishing)):
+                i, instances = queue[0]
+                if instances is None:
+                    queue.popleft()
+                    parameters = None
+                elif (parameters := next(instances, None)) is None:
+                    queue.popleft()
+                    expanding.discard(i)
+                    if not state.in_flight[i]:
+                        state.done(i)
+                        ts.done(i)
+                    continue
+                if i in batches:
+                    running[asyncio.create_task(self.execute_batch([nodes[j] for j in batches[i]]))] = i
+                    for j in batches[i]:
+                        state.started(j)
+                    continue
+                released = asyncio.get_running_loop().create_future() if self.pipelined else None
+                execution = asyncio.create_task(self.execute_node(nodes[i], parameters, released))
+                running[execution] = i
+                if released is not None:
+                    releases[released] = execution
+                    release_of[execution] = released
+                state.started(i)
+
+            if not running:
+                continue
+            waiting: list[asyncio.Future[Any]] = [*running, *releases]
+            if self.adaptive is not None:
+                waiting.append(self.adaptive.raised)
+            done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            done = {future for future in done if future in running or future in releases}
+            # In node order, so that simultaneous completions are scheduled the same way every time.
+            for future in sorted(done, key=lambda f: running[releases[f] if f in releases else f]):
+                if future in releases:
+                    task = releases.pop(future)
+                    del release_of[task]
+                    finishing.add(task)
+                    i = running[task]
+                elif future in running:
+                    i = running.pop(future)
+                    if (released := release_of.pop(future, None)) is not None:
+                        del releases[released]
+                    if future in finishing:
+                        finishing.discard(future)
+                        if future.result():
+                            state.failed(i)
+                            return ExitCode.FAIL
+                        continue
+                    if future.result():
+                        for j in batches.pop(i, [i]):
+                            state.finished(j, failed=True)
+                        return ExitCode.FAIL
+                else:
+                    continue
+                for j in batches.pop(i, [i]):
+                    if not state.finished(j) and j not in expanding:
+                        state.done(j)
+                        ts.done(j)
+
         self.run_info.end()
-        await self.db_service.finish_run(self.run_info)
+        with self.metrics.db_write_latency.time():
+            await self.db_service.finish_run(self.run_info)
         return ExitCode.SUCCESS
 
-    async def execute_node(self, node: Node, ts: TopologicalSorter[Node]) -> NodeResult:
-        execution_info = ExecutionInfo(graph=self.graph, node=node)
-        execution_info.start()
-        await self.db_service.start_execution(self.run_info, execution_info)
+    async def _teardown(self, running: dict[asyncio.Future[NodeResult], int]) -> None:
+        if not running:
+            return
+        _cancel_tasks(list(running))
+        _, pending = await asyncio.wait(running, timeout=self.teardown_timeout)
+        if pending:
+            logger.error("%d node(s) did not stop within %.1fs", len(pending), self.teardown_timeout)
+
+    async def execute_node(
+        self,
+        node: Node,
+        parameters: dict[str, Any] | None = None,
+        released: asyncio.Future[None] | None = None,
+    ) -> NodeResult:
+        """Run ``node`` (one instance of it with matrix ``parameters``) to the end.
+
+        ``released`` is resolved once the dependents of the node may start, which
+        may be before the node is finished.
+        """
+        instance = node if parameters is None else node.instance(parameters)
+        self.metrics.node_started(self.status, instance.name)
+        result = NodeResult.CANCEL
+
+        def release() -> None:
+            if released is not None and not released.done():
+                released.set_result(None)
+
         try:
-            result = await self._execute_node(node)
-            execution_info.end()
-            await self.db_service.finish_execution(self.run_info, execution_info)
+            self._publish(NodeStarted, node=instance, parameters=parameters)
+            if node.hedge is not None and instance.command:
+                result = await self._execute_hedged(node, instance, parameters, release)
+            else:
+                result = await self._execute_attempt(node, instance, parameters, release=release)
+            self._publish(NodeFinished, node=instance, result=result, parameters=parameters)
             return result
         finally:
-            ts.done(node)
+            self.metrics.node_finished(self.status, instance.name, result)
+
+    def _free_slots(self, running: int) -> int | None:
+        """How many more processes could start now; ``None`` when unlimited."""
+        limits = [(self.concurrency, running)]
+        if self.adaptive is not None:
+            limits.append((self.adaptive.limit, running))
+        if self.slots is not None:
+            limits.append((self.slots.limit, self.slots.held))
+        free = [limit - used for limit, used in limits if limit is not None]
+        return min(free) if free else None
+
+    def _batch_size(self, ready: int, free: int | None) -> int:
+        """How many of ``ready`` sibling nodes to batch together with ``free`` slots left.
+
+        Batches are only as large as it takes to keep the free slots busy, so
+        that batching does not serialise nodes that could run side by side.
+        """
+        if free is None:
+            return 1
+        if free <= 0:
+            return self.batch_size
+        return min(self.batch_size, math.ceil(ready / free))
+
+    def _batchable(self, node: Node) -> bool:
+        return node.batchable and bool(node.command) and self.batch_size > 1 and not self.graph.predecessors(node)
 
-    async def _execute_node(self, node: Node) -> NodeResult:
-        if not node.command:
+    async def execute_batch(self, nodes: Sequence[Node]) -> NodeResult:
+        """Run the commands of ``nodes`` one after another in a single process.
+
+        This saves starting a process per node for nodes that run for less
+        time than it takes to start one. Each node is still recorded, stored,
+        handed off and reported on as if it ran on its own. The first node
+        that fails stops the batch, and the nodes after it are not started.
+        """
+        if self.slots is None:
+            return await self._execute_batch(nodes)
+        async with self.slots:
+            return await self._execute_batch(nodes)
+
+    async def _execute_batch(self, nodes: Sequence[Node]) -> NodeResult:
+        batch = Batch(nodes)
+        cpus = self.allocator.cpus if self.allocator.reserved is not None else None
+        with self.metrics.spawn_latency.time():
+            process = await _start_process(batch.script, resource_setter(None, cpus))
+        splitters = [asyncio.create_task(batch.split(name, getattr(process, name))) for name in STREAMS]
+        worker = asyncio.create_task(_wait_process(process, None, self.grace_period))
+        result = NodeResult.SUCCESS
+        try:
+            for i in range(len(nodes)):
+                result = await self._execute_batched(batch, i, worker)
+                if result:
+                    break
+            return result
+        finally:
+            if not worker.done():
+                worker.cancel()
+            await asyncio.gather(worker, return_exceptions=True)
+            # Output may still be held open by a process outside the group.
+            _, pending = await asyncio.wait(splitters, timeout=self.grace_period)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*splitters, return_exceptions=True)
+
+    async def _execute_batched(self, batch: Batch, i: int, worker: asyncio.Task[NodeResult]) -> NodeResult:
+        """Follow node ``i`` of ``batch`` to its end, as ``execute_node`` does for a node with its own process."""
+        node = batch.nodes[i]
+        self.metrics.node_started(self.status, node.name)
+        result = NodeResult.CANCEL
+        try:
+            self._publish(NodeStarted, node=node, parameters=None)
+            execution_info = ExecutionInfo(graph=self.graph, node=node)
+            execution_info.start_time = batch.start_time(i)
+            with self.metrics.db_write_latency.time():
+                await self.db_service.start_execution(self.run_info, execution_info)
+            hand_off = bool(self.graph.successors(node))
+            captures = {name: self.handoff.capture() if hand_off else None for name in STREAMS}
+            stats = self._artifact_stats(captures)
+            stream_tasks = [
+                self._stream_task(node, batch.outputs[name][i], name, capture, None, stats.get(name))
+                for name, capture in captures.items()
+            ]
+            cancelled = False
+            try:
+                end = await batch.end(i)
+            except asyncio.CancelledError:
+                cancelled = True
+                worker.cancel()
+                end = None
+            if end is not None:
+                result = NodeResult.FAIL if end.status else NodeResult.SUCCESS
+            else:
+                # The process ended before the node did.
+                await asyncio.gather(worker, return_exceptions=True)
+                result = NodeResult.CANCEL if cancelled else NodeResult.FAIL
+            exited = _ExitedProcess(node, node, result, stream_tasks, captures, stats, None, hand_off)
+            result = await self._finish_process(exited, None, self._artifacts(execution_info))
+            execution_info.result = result
+            if end is not None and result == NodeResult.SUCCESS:
+                execution_info.end_time = end.time
+            else:
+                execution_info.end()
+            with self.metrics.db_write_latency.time():
+                await self.db_service.finish_execution(self.run_info, execution_info)
+            self._publish(NodeFinished, node=node, result=result, parameters=None)
+            return result
+        finally:
+            self.metrics.node_finished(self.status, node.name, result)
+
+    async def _execute_attempt(
+        self,
+        node: Node,
+        instance: Node,
+        parameters: dict[str, Any] | None,
+        attempt: int = 0,
+        race: Race | None = None,
+        release: Callable[[], None] | None = None,
+    ) -> NodeResult:
+        execution_info = ExecutionInfo(graph=self.graph, node=node, parameters=parameters, attempt=attempt)
+        execution_info.start()
+        with self.metrics.db_write_latency.time():
+            await self.db_service.start_execution(self.run_info, execution_info)
+        result = await self._execute_node(node, instance, attempt, race, release, self._artifacts(execution_info))
+        execution_info.result = result
+        execution_info.end()
+        with self.metrics.db_write_latency.time():
+            await self.db_service.finish_execution(self.run_info, execution_info)
+        return result
+
+    async def _hedge_delay(self, node: Node) -> float | None:
+        """Return how long ``node`` may run before it is hedged, from its history."""
+        if node not in self._hedge_delays:
+            assert node.hedge is not None
+            durations = await self.db_service.durations(node, node.hedge.history)
+            if len(durations) < node.hedge.min_samples:
+                self._hedge_delays[node] = node.hedge.delay
+            else:
+                self._hedge_delays[node] = percentile(durations, node.hedge.percentile)
+        return self._hedge_delays[node]
+
+    async def _execute_hedged(
+        self,
+        node: Node,
+        instance: Node,
+        parameters: dict[str, Any] | None,
+        release: Callable[[], None] | None = None,
+    ) -> NodeResult:
+        delay = await self._hedge_delay(node)
+        if delay is None:
+            return await self._execute_attempt(node, instance, parameters, release=release)
+        race = Race()
+        try:
+            primary = race.attempts[0] = asyncio.create_task(
+                self._execute_attempt(node, instance, parameters, 0, race, release)
+            )
+            done, _ = await asyncio.wait([primary], timeout=delay)
+            if done:
+                return primary.result()
+            logger.info("Node %r is running longer than %.2fs, starting a second attempt", instance.name, delay)
+            self.metrics.hedges += 1
+            race.attempts[1] = asyncio.create_task(self._execute_attempt(node, instance, parameters, 1, race, release))
+            await asyncio.wait(race.attempts.values())
+            if race.winner is None:
+                return NodeResult.CANCEL
+            return race.attempts[race.winner].result()
+        finally:
+            _cancel_tasks(list(race.attempts.values()))
+            await asyncio.gather(*race.attempts.values(), return_exceptions=True)
+            race.close()
+
+    async def _execute_node(
+        self,
+        node: Node,
+        instance: Node,
+        attempt: int = 0,
+        race: Race | None = None,
+        release: Callable[[], None] | None = None,
+        artifacts: list[ArtifactInfo] | None = None,
+    ) -> NodeResult:
+        if not instance.command:
             return NodeResult.SUCCESS
+        if self.slots is None:
+            exited = await self._execute_process(node, instance, attempt, race)
+        else:
+            async with self.slots:
+                exited = await self._execute_process(node, instance, attempt, race)
+        return await self._finish_process(exited, release if self.pipelined else None, artifacts)
 
-        process = await _start_process(node.command)
-        stream_tasks = [self._stream_task(node, process, artifact_name) for artifact_name in ("stdout", "stderr")]
-        result = await _wait_process(process, node.timeout)
-        await asyncio.gather(*stream_tasks)
+    async def _execute_process(self, node: Node, instance: Node, attempt: int, race: Race | None) -> _ExitedProcess:
+        resources = instance.resources
+        cpus = resources.cpus if resources else None
+        allocated = None
+        if resources is not None and resources.cores and not cpus:
+            cpus = allocated = await self.allocator.acquire(resources.cores)
+        elif cpus is None and self.allocator.reserved is not None:
+            cpus = self.allocator.cpus
+        try:
+            return await self._run_process(node, instance, resource_setter(resources, cpus), attempt, race)
+        finally:
+            if allocated is not None:
+                self.allocator.release(allocated)
+
+    async def _run_process(
+        self,
+        node: Node,
+        instance: Node,
+        setup: Callable[[int], None] | None,
+        attempt: int = 0,
+        race: Race | None = None,
+    ) -> _ExitedProcess:
+        assert instance.command
+        spool = race.spool(attempt) if race is not None else None
+        handoff = self.handoff.environment(self.graph.predecessors(node))
+        with self.metrics.spawn_latency.time():
+            process = await _start_process(instance.command, setup, {**os.environ, **handoff} if handoff else None)
+        hand_off = bool(self.graph.successors(node))
+        captures = {name: self.handoff.capture() if hand_off else None for name in STREAMS}
+        stats = self._artifact_stats(captures)
+        stream_tasks = [
+            self._stream_task(instance, getattr(process, name), name, capture, spool, stats.get(name))
+            for name, capture in captures.items()
+        ]
+        result = await _wait_process(process, instance.timeout, self.grace_period)
+        if race is not None and result != NodeResult.CANCEL and not await race.finish(attempt):
+            result = NodeResult.CANCEL
+        return _ExitedProcess(node, instance, result, stream_tasks, captures, stats, spool, hand_off)
+
+    def _artifacts(self, execution_info: ExecutionInfo) -> list[ArtifactInfo] | None:
+        """Where to describe the artifacts of an execution; ``None`` if the database would not keep them."""
+        return execution_info.artifacts if self.db_service.records_artifacts else None
+
+    def _artifact_stats(self, captures: dict[str, Capture | None]) -> dict[str, ArtifactStats]:
+        if not self.db_service.records_artifacts:
+            return {}
+        return {name: ArtifactStats() for name in captures}
+
+    async def _finish_process(
+        self,
+        exited: _ExitedProcess,
+        release: Callable[[], None] | None = None,
+        artifacts: list[ArtifactInfo] | None = None,
+    ) -> NodeResult:
+        """Read the rest of the output of an exited process and store its artifacts.
+
+        With ``release``, it is called as soon as the dependents of the node have
+        what they need, before the artifacts are stored. What was stored is
+        described in ``artifacts``.
+        """
+        result = exited.result
+        handed_off = False
+        if release is not None and result == NodeResult.SUCCESS and not any(exited.captures.values()):
+            self._hand_off(exited)
+            handed_off = True
+            release()
+        if result in (NodeResult.TIMEOUT, NodeResult.CANCEL):
+            # Output may still be held open by a process outside the group.
+            _, pending = await asyncio.wait(exited.stream_tasks, timeout=self.grace_period)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*exited.stream_tasks, return_exceptions=True)
+        else:
+            await asyncio.gather(*exited.stream_tasks)
+        if artifacts is not None:
+            artifacts.extend(stats.info(Artifact(name)) for name, stats in exited.stats.items())
+        if result == NodeResult.SUCCESS and not handed_off and release is not None:
+            self._hand_off(exited)
+            handed_off = True
+            release()
+        if exited.spool is not None and result != NodeResult.CANCEL:
+            await exited.spool.commit(self.servicer.storage_service, self.run_info, exited.instance, self.events)
+        if result == NodeResult.SUCCESS and exited.instance.artifacts:
+            result = await self._collect_artifacts(exited.instance, artifacts)
+        if result == NodeResult.SUCCESS and not handed_off:
+            self._hand_off(exited)
         return result
 
+    def _hand_off(self, exited: _ExitedProcess) -> None:
+        if not exited.hand_off:
+            return
+        node, instance = exited.node, exited.instance
+        for name, capture in exited.captures.items():
+            if capture is None:
+                continue
+            artifact = Artifact(name)
+            if not capture.overflowed:
+                self.handoff.publish_data(node, instance, artifact, bytes(capture.buffer))
+            elif (path := self.servicer.storage_service.local_path(self.run_info, instance, artifact)) is not None:
+                self.handoff.publish_path(node, instance, artifact, path)
+            else:
+                # Only worth a warning when a dependent is seen to use it.
+                variable = env_name(instance, artifact)
+                used = any(variable in (dependent.command or "") for dependent in self.graph.successors(node))
+                logger.log(
+                    logging.WARNING if used else logging.DEBUG,
+                    "The %s of node %r is over the hand-off limit of %d bytes and not stored locally; "
+                    "its dependents will not get it",
+                    name,
+                    instance.name,
+                    self.handoff.inline_limit,
+                )
+        for artifact in instance.artifacts:
+            if artifact.path:
+                self.handoff.publish_path(node, instance, artifact, Path(artifact.path))
+
+    async def _collect_artifacts(self, instance: Node, artifacts: list[ArtifactInfo] | None = None) -> NodeResult:
+        """Store the files declared in ``instance.artifacts``; fail the node if one cannot be stored.
+
+        The stored files are described in ``artifacts``.
+        """
+        declared = [(artifact, Path(artifact.path)) for artifact in instance.artifacts if artifact.path]
+        storage_service = self.servicer.storage_service
+
+        async def _collect(artifact: Artifact, path: Path) -> ArtifactInfo | None:
+            if artifacts is None:
+                await storage_service.store_file(self.run_info, instance, artifact, path)
+                return None
+            _, stats = await asyncio.gather(
+                storage_service.store_file(self.run_info, instance, artifact, path),
+                asyncio.to_thread(ArtifactStats.of_file, path),
+            )
+            return stats.info(artifact)
+
+        results = await asyncio.gather(*(_collect(a, path) for a, path in declared), return_exceptions=True)
+        for (artifact, _), outcome in zip(declared, results):
+            if isinstance(outcome, BaseException):
+                logger.error("Could not collect artifact %r of node %r: %s", artifact.name, instance.name, outcome)
+                return NodeResult.FAIL
+            if artifacts is not None and outcome is not None:
+                artifacts.append(outcome)
+        return NodeResult.SUCCESS
+
     def _stream_task(
         self,
         node: Node,
-        process: asyncio.subprocess.Process,
+        stream: asyncio.StreamReader,
         artifact_name: str,
+        capture: Capture | None = None,
+        storage_service: StorageService | None = None,
+        stats: ArtifactStats | None = None,
     ) -> asyncio.Task[None]:
         artifact = Artifact(artifact_name)
-        stream: asyncio.StreamReader = getattr(process, artifact_name)
-        return asyncio.create_task(_read_stream(self.servicer.storage_service, self.graph, node, stream, artifact))
+        return asyncio.create_task(
+            _read_stream(
+                storage_service or self.servicer.storage_service,
+                self.run_info,
+                node,
+                stream,
+                artifact,
+                # Output going elsewhere than storage is published once it is committed.
+                self.events if storage_service is None else None,
+                self.metrics,
+                capture,
+                stats,
+            )
+        )
 
 
 class Engine:
+    """Runs workflows with shared services.
+
+    Runs of the same engine may overlap; ``config.concurrency`` then bounds the
+    number of processes running across all of them, as does the adaptive
+    limit of ``config.adaptive``, of which there is one per engine.
+    """
+
     def __init__(self, config: Config | None = None) -> None:
         self.config = config or Config()
         self.servicer = Servicer.from_config(self.config)
+        self.events = EventBus()
+        self.metrics = Metrics()
+        self.allocator = CoreAllocator.for_process(self.config.reserve_core)
+        self.adaptive = AdaptiveLimit(self.config.adaptive) if self.config.adaptive is not None else None
+        self.slots = (
+            Slots(self.config.concurrency or None, self.adaptive)
+            if self.config.concurrency or self.adaptive is not None
+            else None
+        )
+        self.metrics_server: MetricsServer | None = None
+
+    async def start_metrics_server(self) -> MetricsServer:
+        """Serve metrics as configured by ``config.metrics``; done on the first run otherwise."""
+        if self.metrics_server is None:
+            assert self.config.metrics is not None
+            self.metrics_server = MetricsServer(self.metrics, self.config.metrics)
+            await self.metrics_server.start()
+        return self.metrics_server
+
+    async def close(self) -> None:
+        if self.metrics_server is not None:
+            await self.metrics_server.close()
+            self.metrics_server = None
 
     async def run_workflow(self, workflow: Tree) -> int:
-        graph = workflow.as_graph()
-        await self.servicer.db_service.save_graph(graph)
-        executor = Executor(graph, self.servicer)
-        result = await executor.execute()
-        return result
+        return await self.run_graph(workflow.as_graph())
+
+    def run_workflow_events(
+        self,
+        workflow: Tree,
+        buffer_size: int = 1000,
+        lossless: bool = False,
+    ) -> AsyncGenerator[Event, None]:
+        """Run ``workflow`` and yield its events as they happen.
+
+        The run ends with a ``RunFinished`` event carrying the exit code. Events
+        are buffered up to ``buffer_size``; a consumer that falls behind loses or
+        merges log chunks rather than slowing down the run. With ``lossless``,
+        nothing is lost and the nodes' output is read no faster than the
+        consumer takes it.
+        """
+        return self.run_graph_events(workflow.as_graph(), buffer_size, lossless)
+
+    async def run_graph_events(
+        self,
+        graph: Graph,
+        buffer_size: int = 1000,
+        lossless: bool = False,
+    ) -> AsyncGenerator[Event, None]:
+        """Run ``graph`` and yield its events, like :meth:`run_workflow_events`."""
+        executor = self._executor(graph)
+        subscription = self.events.subscribe(buffer_size, run_id=executor.run_info.run_id, lossless=lossless)
+        task = asyncio.create_task(self._run(executor))
+        task.add_done_callback(lambda _: subscription.close())
+        try:
+            async for event in subscription:
+                yield event
+            await task
+        finally:
+            subscription.close()
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+    def _executor(self, graph: Graph) -> Executor:
+        return Executor(
+            graph,
+            self.servicer,
+            self.config.concurrency,
+            self.events,
+            self.metrics,
+            self.config.grace_period,
+            self.allocator,
+            self.config.handoff_limit,
+            self.slots,
+            self.config.pipelined,
+            self.adaptive,
+            self.config.batch_size,
+        )
+
+    async def run_graph(self, graph: Graph) -> int:
+        return await self._run(self._executor(graph))
+
+    async def _run(self, executor: Executor) -> int:
+        if self.config.metrics is not None:
+            await self.start_metrics_server()
+        await self.servicer.db_service.save_graph(executor.graph)
+        try:
+            return await executor.execute()
+        finally:
+            await self.servicer.storage_service.flush(executor.run_info)
+            await self.servicer.db_service.flush()
 
 
-def _cancel_tasks(tasks: list[asyncio.Task[NodeResult]]) -> None:
+def _cancel_tasks(tasks: Iterable[asyncio.Future[Any]]) -> None:
     for task in tasks:
         task.cancel()
@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field, replace
+from typing import TYPE_CHECKING, Any
+from uuid import UUID
+
+if TYPE_CHECKING:
+    from wtflow.infra.nodes import Node
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
+class Event:
+    run_id: UUID
+    timestamp: float = field(default_factory=time.time)
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
+class RunStarted(Event):
+    workflow: str
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
+class RunFinished(Event):
+    exit_code: int
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
+class NodeQueued(Event):
+    node: Node
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
+class NodeStarted(Event):
+    node: Node
+    parameters: dict[str, Any] | None = None
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
+class NodeFinished(Event):
+    node: Node
+    result: int
+    parameters: dict[str, Any] | None = None
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
+class LogChunk(Event):
+    node: Node
+    artifact: str
+    data: bytes
+
+
+class Subscription:
+    """A bounded queue of events for one consumer.
+
+    Publishing never waits. When the queue is full, a log chunk is merged into
+    the newest queued chunk of the same stream (up to ``max_chunk`` bytes) or
+    dropped; any other event evicts the oldest queued log chunk, or is dropped
+    when there is none. Dropped events are counted in ``dropped``.
+
+    A ``lossless`` subscription keeps every event instead, and producers that
+    wait on :meth:`EventBus.drain` are held back while its queue is full.
+    """
+
+    def __init__(
+        self,
+        bus: EventBus,
+        maxsize: int,
+        run_id: UUID | None = None,
+        max_chunk: int = 64 * 1024,
+        lossless: bool = False,
+    ) -> None:
+        self.bus = bus
+        self.maxsize = maxsize
+        self.run_id = run_id
+        self.max_chunk = max_chunk
+        self.lossless = lossless
+        self.dropped = 0
+        self._queue: deque[Event] = deque()
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+        self._space.set()
+        self._closed = False
+
+    def _coalesce(self, chunk: LogChunk) -> bool:
+        last = self._queue[-1] if self._queue else None
+        if (
+            isinstance(last, LogChunk)
+            and last.node is chunk.node
+            and last.artifact == chunk.artifact
+            and len(last.data) + len(chunk.data) <= self.max_chunk
+        ):
+            self._queue[-1] = replace(last, data=last.data + chunk.data)
+            return True
+        return False
+
+    def _evict_log_chunk(self) -> bool:
+        for i, queued in enumerate(self._queue):
+            if isinstance(queued, LogChunk):
+                del self._queue[i]
+                self.dropped += 1
+                return True
+        return False
+
+    def _wants(self, event: Event) -> bool:
+        return not self._closed and (self.run_id is None or event.run_id == self.run_id)
+
+    def put(self, event: Event) -> None:
+        if not self._wants(event):
+            return
+        if self.lossless:
+            if isinstance(event, LogChunk) and self._coalesce(event):
+                return
+        elif len(self._queue) >= self.maxsize:
+            if isinstance(event, LogChunk):
+                if not self._coalesce(event):
+                    self.dropped += 1
+                return
+            if not self._evict_log_chunk():
+                self.dropped += 1
+                return
+        self._queue.append(event)
+        if len(self._queue) >= self.maxsize:
+            self._space.clear()
+        self._ready.set()
+        if self.run_id is not None and isinstance(event, RunFinished):
+            self.close()
+
+    async def drain(self) -> None:
+        """Wait until there is room in the queue, or it is closed."""
+        await self._space.wait()
+
+    def close(self) -> None:
+        self._closed = True
+        self._ready.set()
+        self._space.set()
+        self.bus.unsubscribe(self)
+
+    def __aiter__(self) -> Subscription:
+        return self
+
+    async def __anext__(self) -> Event:
+        while not self._queue:
+            if self._closed:
+                raise StopAsyncIteration
+            self._ready.clear()
+            await self._ready.wait()
+        event = self._queue.popleft()
+        if len(self._queue) < self.maxsize:
+            self._space.set()
+        return event
+
+
+class EventBus:
+    """In-memory publish/subscribe of engine events."""
+
+    def __init__(self) -> None:
+        self._subscriptions: list[Subscription] = []
+
+    def __bool__(self) -> bool:
+        return bool(self._subscriptions)
+
+    def subscribe(self, maxsize: int = 1000, run_id: UUID | None = None, lossless: bool = False) -> Subscription:
+        """Subscribe to all events, or to those of one run (ending with its ``RunFinished``)."""
+        subscription = Subscription(self, maxsize, run_id, lossless=lossless)
+        self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        if subscription in self._subscriptions:
+            self._subscriptions.remove(subscription)
+
+    def publish(self, event: Event) -> None:
+        for subscription in list(self._subscriptions):
+            subscription.put(event)
+
+    async def drain(self, event: Event) -> None:
+        """Wait until the lossless subscriptions that got ``event`` have room for more."""
+        for subscription in list(self._subscriptions):
+            if subscription.lossless and subscription._wants(event):
+                await subscription.drain()
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import os
+import re
+import shutil
+import tempfile
+from collections import defaultdict
+from pathlib import Path
+from typing import Iterable
+
+from wtflow.infra.artifact import Artifact
+from wtflow.infra.nodes import Node
+
+DEFAULT_INLINE_LIMIT = 64 * 1024
+_SHM = Path("/dev/shm")
+
+
+def env_name(node: Node, artifact: Artifact) -> str:
+    """Return the variable a dependent finds ``artifact`` of ``node`` in, e.g. ``WTFLOW_BUILD_STDOUT``."""
+    return "WTFLOW_" + re.sub(r"[^0-9A-Z]+", "_", f"{node.name} {artifact.name}".upper()).strip("_")
+
+
+class Capture:
+    """Keeps a stream in memory for as long as it stays within ``limit`` bytes."""
+
+    __slots__ = ("limit", "buffer", "overflowed")
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.buffer = bytearray()
+        self.overflowed = False
+
+    def write(self, data: bytes) -> None:
+        if self.overflowed:
+            return
+        if len(self.buffer) + len(data) > self.limit:
+            self.overflowed = True
+            self.buffer = bytearray()
+        else:
+            self.buffer += data
+
+
+class Handoff:
+    """Local copies of finished nodes' outputs, handed to the nodes that depend on them.
+
+    Declared artifacts are handed over at the path the node wrote them to.
+    Small captured streams are written to read-only files in shared memory
+    (``/dev/shm`` where it exists), so dependents read them without a round
+    trip through storage; empty ones all share a single empty file. A dependent's process gets one ``env_name``
+    variable per output of each of its direct dependencies; matrix instances
+    each get their own.
+    """
+
+    def __init__(self, inline_limit: int = DEFAULT_INLINE_LIMIT) -> None:
+        self.inline_limit = inline_limit
+        self.outputs = defaultdict[Node, dict[str, str]](dict)
+        self._directory: Path | None = None
+
+    def capture(self) -> Capture | None:
+        return Capture(self.inline_limit) if self.inline_limit > 0 else None
+
+    def _segment_directory(self) -> Path:
+        if self._directory is None:
+            parent = _SHM if _SHM.is_dir() and os.access(_SHM, os.W_OK) else None
+            self._directory = Path(tempfile.mkdtemp(prefix="wtflow-", dir=parent))
+        return self._directory
+
+    def publish_path(self, node: Node, instance: Node, artifact: Artifact, path: Path) -> None:
+        """Hand the file ``path`` written by ``instance`` of ``node`` to the dependents of ``node``."""
+        self.outputs[node][env_name(instance, artifact)] = str(path.resolve())
+
+    def publish_data(self, node: Node, instance: Node, artifact: Artifact, data: bytes) -> None:
+        """Hand ``data`` to the dependents of ``node`` in a read-only shared-memory file."""
+        name = env_name(instance, artifact)
+        path = self._segment_directory() / (name if data else ".empty")
+        if data or not path.exists():
+            path.write_bytes(data)
+            path.chmod(0o444)
+        self.outputs[node][name] = str(path)
+
+    def environment(self, dependencies: Iterable[Node]) -> dict[str, str]:
+        environment: dict[str, str] = {}
+        for dependency in dependencies:
+            environment.update(self.outputs.get(dependency, {}))
+        return environment
+
+    def close(self) -> None:
+        self.outputs.clear()
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Generator, Sequence
+
+import wtflow
+from wtflow.infra.events import EventBus, LogChunk
+from wtflow.infra.info import RunInfo
+from wtflow.services.storage.local.local_storage_service import LocalArtifactWriter, LocalStorageService
+from wtflow.services.storage.storage_service import StorageService
+
+
+def percentile(values: Sequence[float], p: float) -> float:
+    """Return the ``p``-th percentile of ``values`` by the nearest-rank method."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+class SpoolStorageService(LocalStorageService):
+    """Holds the output of a hedge attempt until it is known whether it won."""
+
+    def __init__(self, base_path: Path) -> None:
+        super().__init__(base_path)
+        self.artifacts: list[wtflow.Artifact] = []
+
+    @contextmanager
+    def open_artifact(
+        self,
+        run_info: RunInfo,
+        node: wtflow.Node,
+        artifact: wtflow.Artifact,
+    ) -> Generator[LocalArtifactWriter, None, None]:
+        self.artifacts.append(artifact)
+        with super().open_artifact(run_info, node, artifact) as writer:
+            yield writer
+
+    async def commit(
+        self,
+        storage: StorageService,
+        run_info: RunInfo,
+        node: wtflow.Node,
+        events: EventBus | None = None,
+    ) -> None:
+        """Write the spooled artifacts to ``storage`` and ``events``, as if they were being produced now."""
+        for artifact in self.artifacts:
+            path = self._get_path(run_info, node, artifact.name, artifact.file_type)
+            with storage.open_artifact(run_info, node, artifact) as writer:
+                if not path.exists() or not path.stat().st_size:
+                    continue
+                for line in self.iter_lines(run_info, node, artifact):
+                    writer.write(line)
+                    if writer.congested:
+                        await writer.drain()
+                    if events is not None:
+                        chunk = LogChunk(run_id=run_info.run_id, node=node, artifact=artifact.name, data=line)
+                        events.publish(chunk)
+                        await events.drain(chunk)
+
+
+class Race:
+    """Attempts of one node racing to finish; the first to finish stops the others.
+
+    Every attempt spools its output in a temporary directory, as it does not
+    know yet whether it is to be kept; only the winner's is stored and
+    published.
+    """
+
+    def __init__(self) -> None:
+        self.attempts: dict[int, asyncio.Task[Any]] = {}
+        self.winner: int | None = None
+        self._spools: dict[int, SpoolStorageService] = {}
+        self._directory: Path | None = None
+
+    def spool(self, attempt: int) -> SpoolStorageService:
+        if attempt not in self._spools:
+            if self._directory is None:
+                self._directory = Path(tempfile.mkdtemp(prefix="wtflow-hedge-"))
+            self._spools[attempt] = SpoolStorageService(self._directory / str(attempt))
+        return self._spools[attempt]
+
+    async def finish(self, attempt: int) -> bool:
+        """Claim the win for ``attempt``; return whether it finished first.
+
+        The winner waits here until the other attempts are stopped.
+        """
+        if self.winner is not None:
+            return False
+        self.winner = attempt
+        others = [task for other, task in self.attempts.items() if other != attempt]
+        for task in others:
+            task.cancel()
+        await asyncio.gather(*others, return_exceptions=True)
+        return True
+
+    def close(self) -> None:
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
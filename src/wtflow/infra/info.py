@@ -5,7 +5,7 @@ import os
 import platform
 import socket
 from dataclasses import dataclass, field
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 from uuid import UUID, uuid4
 
 if TYPE_CHECKING:
@@ -13,7 +13,7 @@ if TYPE_CHECKING:
     from wtflow.infra.workflow import Graph
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class SystemInfo:
     hostname: str = field(default_factory=socket.gethostname)
     os_name: str = field(default_factory=platform.system)
@@ -27,7 +27,7 @@ def _utcnow() -> datetime.datetime:
     return datetime.datetime.now(tz=datetime.timezone.utc)
 
 
-@dataclass(kw_only=True)
+@dataclass(kw_only=True, slots=True)
 class Info:
     start_time: datetime.datetime | None = None
     end_time: datetime.datetime | None = None
@@ -39,7 +39,7 @@ class Info:
         self.end_time = _utcnow()
 
 
-@dataclass(kw_only=True)
+@dataclass(kw_only=True, slots=True)
 class RunInfo(Info):
     graph: Graph
     run_id: UUID = field(default_factory=uuid4)
@@ -47,8 +47,25 @@ class RunInfo(Info):
     system_info: SystemInfo = field(default_factory=SystemInfo)
 
 
-@dataclass(kw_only=True)
+@dataclass(kw_only=True, slots=True)
+class ArtifactInfo:
+    """What was stored as an artifact: its size in bytes and lines, SHA-256 and first and last write times."""
+
+    name: str
+    file_type: str = "txt"
+    size: int = 0
+    lines: int = 0
+    checksum: str
+    first_write: datetime.datetime | None = None
+    last_write: datetime.datetime | None = None
+
+
+@dataclass(kw_only=True, slots=True)
 class ExecutionInfo(Info):
     graph: Graph
     node: Node
     execution_id: UUID = field(default_factory=uuid4)
+    parameters: dict[str, Any] | None = None
+    attempt: int = 0
+    result: int | None = None
+    artifacts: list[ArtifactInfo] = field(default_factory=list)
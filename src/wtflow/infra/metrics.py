@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, Generator
+from uuid import UUID
+
+from wtflow.config import MetricsConfig
+from wtflow.infra.info import RunInfo
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    """A cumulative histogram in the Prometheus sense."""
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    @contextmanager
+    def time(self) -> Generator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def render(self, name: str) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum {self.sum}")
+        lines.append(f"{name}_count {self.count}")
+        return lines
+
+
+@dataclass
+class RunStatus:
+    run_id: UUID
+    workflow: str
+    started: float = field(default_factory=time.time)
+    queued: int = 0
+    running: dict[str, float] = field(default_factory=dict)
+    completed: int = 0
+    results: Counter[str] = field(default_factory=Counter)
+    exit_code: int | None = None
+    concurrency_limit: int | None = None
+
+    def snapshot(self) -> dict[str, Any]:
+        now = time.time()
+        return {
+            "run_id": str(self.run_id),
+            "workflow": self.workflow,
+            "elapsed": now - self.started,
+            "queued": self.queued,
+            "running": {name: now - started for name, started in self.running.items()},
+            "completed": self.completed,
+            "results": dict(self.results),
+            "exit_code": self.exit_code,
+            "concurrency_limit": self.concurrency_limit,
+        }
+
+
+class Metrics:
+    """Live counters of the engine, updated in place by the executor."""
+
+    def __init__(self) -> None:
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.results: Counter[str] = Counter()
+        self.captured_bytes = 0
+        self.hedges = 0
+        self.spawn_latency = Histogram()
+        self.db_write_latency = Histogram()
+        self.loop_lag = 0.0
+        self.runs: dict[UUID, RunStatus] = {}
+        self.last_run: RunStatus | None = None
+
+    def run_started(self, run_info: RunInfo) -> RunStatus:
+        status = RunStatus(run_info.run_id, run_info.graph.name)
+        self.runs[status.run_id] = status
+        return status
+
+    def run_finished(self, status: RunStatus, exit_code: int) -> None:
+        status.exit_code = exit_code
+        self.queued -= status.queued
+        status.queued = 0
+        self.runs.pop(status.run_id, None)
+        self.last_run = status
+
+    def nodes_queued(self, status: RunStatus, count: int = 1) -> None:
+        status.queued += count
+        self.queued += count
+
+    def node_started(self, status: RunStatus, name: str) -> None:
+        status.queued -= 1
+        status.running[name] = time.time()
+        self.queued -= 1
+        self.running += 1
+
+    def node_finished(self, status: RunStatus, name: str, result: IntEnum) -> None:
+        label = result.name.lower()
+        status.running.pop(name, None)
+        status.completed += 1
+        status.results[label] += 1
+        self.running -= 1
+        self.completed += 1
+        self.results[label] += 1
+
+    def render(self) -> str:
+        """Return the metrics in the Prometheus text exposition format."""
+        lines = [
+            "# TYPE wtflow_runs_active gauge",
+            f"wtflow_runs_active {len(self.runs)}",
+            "# TYPE wtflow_nodes_queued gauge",
+            f"wtflow_nodes_queued {self.queued}",
+            "# TYPE wtflow_nodes_running gauge",
+            f"wtflow_nodes_running {self.running}",
+            "# TYPE wtflow_nodes_completed_total counter",
+            f"wtflow_nodes_completed_total {self.completed}",
+            "# TYPE wtflow_node_results_total counter",
+            *(
+                f'wtflow_node_results_total{{result="{label}"}} {count}'
+                for label, count in sorted(self.results.items())
+            ),
+            "# TYPE wtflow_captured_bytes_total counter",
+            f"wtflow_captured_bytes_total {self.captured_bytes}",
+            "# TYPE wtflow_hedges_total counter",
+            f"wtflow_hedges_total {self.hedges}",
+            "# TYPE wtflow_spawn_latency_seconds histogram",
+            *self.spawn_latency.render("wtflow_spawn_latency_seconds"),
+            "# TYPE wtflow_db_write_latency_seconds histogram",
+            *self.db_write_latency.render("wtflow_db_write_latency_seconds"),
+            "# TYPE wtflow_event_loop_lag_seconds gauge",
+            f"wtflow_event_loop_lag_seconds {self.loop_lag}",
+            "# TYPE wtflow_concurrency_limit gauge",
+            *(
+                f'wtflow_concurrency_limit{{run_id="{status.run_id}",workflow="{status.workflow}"}} '
+                f"{status.concurrency_limit}"
+                for status in self.runs.values()
+                if status.concurrency_limit is not None
+            ),
+        ]
+        return "\n".join(lines) + "\n"
+
+    def status(self) -> dict[str, Any]:
+        return {
+            "runs": [status.snapshot() for status in self.runs.values()],
+            "last_run": self.last_run.snapshot() if self.last_run else None,
+        }
+
+
+_REASONS = {200: "OK", 404: "Not Found", 405: "Method Not Allowed"}
+
+
+class MetricsServer:
+    """Serves ``/metrics`` (Prometheus) and ``/status`` (JSON) over HTTP on the engine's loop.
+
+    While running it also samples the event loop lag: how late a sleep of
+    ``lag_interval`` seconds wakes up.
+    """
+
+    def __init__(self, metrics: Metrics, config: MetricsConfig) -> None:
+        self.metrics = metrics
+        self.config = config
+        self._server: asyncio.Server | None = None
+        self._lag_task: asyncio.Task[None] | None = None
+
+    @property
+    def address(self) -> Any:
+        assert self._server is not None
+        return self._server.sockets[0].getsockname()
+
+    async def start(self) -> None:
+        if self.config.unix_path is not None:
+            self._server = await asyncio.start_unix_server(self._handle, self.config.unix_path)
+        else:
+            self._server = await asyncio.start_server(self._handle, self.config.host, self.config.port)
+        self._lag_task = asyncio.create_task(self._sample_lag())
+        logger.info("Serving metrics on %s", self.address)
+
+    async def close(self) -> None:
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            await asyncio.gather(self._lag_task, return_exceptions=True)
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _sample_lag(self) -> None:
+        loop = asyncio.get_running_loop()
+        interval = self.config.lag_interval
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            self.metrics.loop_lag = max(0.0, loop.time() - start - interval)
+
+    def _respond(self, path: str) -> tuple[int, str, bytes]:
+        if path == "/metrics":
+            return 200, "text/plain; version=0.0.4", self.metrics.render().encode()
+        if path == "/status":
+            return 200, "application/json", json.dumps(self.metrics.status()).encode()
+        return 404, "text/plain", b"not found\n"
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request = await reader.readline()
+            while (await reader.readline()).strip():
+                pass
+            method, path, *_ = request.decode("latin-1").split() or ("", "")
+            if method != "GET":
+                code, content_type, body = 405, "text/plain", b"method not allowed\n"
+            else:
+                code, content_type, body = self._respond(path.split("?", 1)[0])
+            writer.write(
+                f"HTTP/1.1 {code} {_REASONS[code]}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
@@ -1,19 +1,127 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, field
-from typing import Iterable
+import itertools
+import math
+import re
+from dataclasses import dataclass, field, replace
+from typing import Any, Iterable, Iterator
 
 from wtflow.infra.artifact import Artifact
 
 
-@dataclass(frozen=True)
+def _substitute(template: str, parameters: dict[str, Any]) -> str:
+    """Replace ``{name}`` (or ``{name:spec}``) for each of ``parameters`` in ``template``.
+
+    Other braces are left alone, so that shell syntax such as ``${HOME}`` or
+    ``awk '{print $1}'`` survives.
+    """
+    if not parameters:
+        return template
+    names = "|".join(re.escape(name) for name in parameters)
+    pattern = re.compile(rf"\{{({names})(?::([^{{}}]*))?\}}")
+    return pattern.sub(lambda m: format(parameters[m.group(1)], m.group(2) or ""), template)
+
+
+@dataclass(frozen=True, slots=True)
+class Matrix:
+    """The cartesian product of named parameter values.
+
+    Instances are produced lazily, so the product is never materialised.
+    """
+
+    axes: tuple[tuple[str, tuple[Any, ...]], ...]
+
+    @classmethod
+    def of(cls, **axes: Iterable[Any]) -> Matrix:
+        return cls(tuple((name, tuple(values)) for name, values in axes.items()))
+
+    def __len__(self) -> int:
+        return math.prod(len(values) for _, values in self.axes)
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        names = [name for name, _ in self.axes]
+        for values in itertools.product(*(values for _, values in self.axes)):
+            yield dict(zip(names, values))
+
+
+@dataclass(frozen=True, slots=True)
+class Resources:
+    """Scheduling parameters and limits applied to a node's processes when it is started.
+
+    ``cpus`` pins the node to the given CPUs; ``cores`` instead takes that many
+    CPUs from the engine's allocator for the duration of the node. ``nice`` is
+    the niceness to run at and ``ionice`` a best-effort I/O priority from 0
+    (highest) to 7. ``max_memory`` (bytes of
+    address space) and ``max_open_files`` set ``RLIMIT_AS`` and ``RLIMIT_NOFILE``.
+    """
+
+    cpus: tuple[int, ...] | None = None
+    cores: int | None = None
+    nice: int | None = None
+    ionice: int | None = None
+    max_memory: int | None = None
+    max_open_files: int | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class Hedge:
+    """When to start a second attempt of a node that runs longer than usual.
+
+    The threshold is the ``percentile`` of the node's successful durations in
+    the run database, over its last ``history`` executions. Until
+    ``min_samples`` of them are recorded, ``delay`` seconds is used instead,
+    or the node is not hedged if it is ``None``.
+    """
+
+    percentile: float = 95.0
+    min_samples: int = 10
+    history: int = 100
+    delay: float | None = None
+
+
+@dataclass(frozen=True, slots=True)
 class Node:
     name: str
     command: str | None = None
     timeout: float | None = None
     artifacts: tuple[Artifact, ...] = field(default_factory=tuple)
+    inputs: tuple[str, ...] = field(default_factory=tuple)
+    matrix: Matrix | None = None
+    resources: Resources | None = None
+    idempotent: bool = False
+    hedge: Hedge | None = None
+    batchable: bool = False
+
+    def __post_init__(self) -> None:
+        if self.hedge is not None and not self.idempotent:
+            raise ValueError(f"Node {self.name!r} must be idempotent to be hedged")
+        if self.batchable and (
+            self.matrix is not None or self.hedge is not None or self.resources is not None or self.timeout is not None
+        ):
+            raise ValueError(f"Node {self.name!r} cannot be batched with a matrix, hedge, resources or timeout")
+
+    def instance(self, parameters: dict[str, Any]) -> Node:
+        """Return the node for one set of matrix ``parameters``.
+
+        ``{name}`` placeholders in the command and artifact paths are replaced by
+        the parameter values.
+        """
+        suffix = ",".join(f"{k}={v}" for k, v in parameters.items())
+        return Node(
+            name=f"{self.name}[{suffix}]",
+            command=_substitute(self.command, parameters) if self.command else self.command,
+            timeout=self.timeout,
+            artifacts=tuple(
+                replace(artifact, path=_substitute(artifact.path, parameters)) if artifact.path else artifact
+                for artifact in self.artifacts
+            ),
+            inputs=self.inputs,
+            resources=self.resources,
+            idempotent=self.idempotent,
+            hedge=self.hedge,
+        )
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class TreeNode(Node):
     children: Iterable[TreeNode] = field(default_factory=tuple, hash=False)
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+import platform
+import resource
+from collections import deque
+from typing import Callable, Collection, Iterable
+
+from wtflow.infra.nodes import Resources
+
+logger = logging.getLogger(__name__)
+
+_IOPRIO_SET = {"x86_64": 251, "i686": 289, "aarch64": 30, "armv7l": 314, "ppc64le": 273, "s390x": 282}
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_BE = 2
+_IOPRIO_CLASS_SHIFT = 13
+
+
+def available_cpus() -> tuple[int, ...]:
+    if hasattr(os, "sched_getaffinity"):
+        return tuple(sorted(os.sched_getaffinity(0)))
+    return tuple(range(os.cpu_count() or 1))
+
+
+class CoreAllocator:
+    """Hands out CPUs to nodes that ask for a number of ``cores``.
+
+    Requests are served in order; a request waits while too few CPUs are free,
+    and one for more CPUs than exist gets all of them. With ``reserved`` set,
+    that CPU is kept for the orchestrator and excluded from every node.
+    """
+
+    def __init__(self, cpus: Iterable[int], reserved: int | None = None) -> None:
+        self.cpus = tuple(sorted(set(cpus) - {reserved}))
+        self.reserved = reserved
+        self._free = set(self.cpus)
+        self._waiters: deque[tuple[int, asyncio.Future[tuple[int, ...]]]] = deque()
+
+    @classmethod
+    def for_process(cls, reserve_core: bool = False) -> CoreAllocator:
+        """Allocate the CPUs this process may run on, optionally pinning it to one of them."""
+        cpus = available_cpus()
+        if not reserve_core:
+            return cls(cpus)
+        if len(cpus) < 2 or not hasattr(os, "sched_setaffinity"):
+            logger.warning("Cannot reserve a core for the orchestrator with %d CPU(s)", len(cpus))
+            return cls(cpus)
+        os.sched_setaffinity(0, {cpus[0]})
+        return cls(cpus, reserved=cpus[0])
+
+    @property
+    def free(self) -> int:
+        return len(self._free)
+
+    def _take(self, count: int) -> tuple[int, ...]:
+        cpus = tuple(sorted(self._free)[:count])
+        self._free.difference_update(cpus)
+        return cpus
+
+    async def acquire(self, count: int) -> tuple[int, ...]:
+        count = max(1, min(count, len(self.cpus)))
+        if not self._waiters and len(self._free) >= count:
+            return self._take(count)
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((count, future))
+        try:
+            return await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(future.result())
+            else:
+                self._waiters.remove((count, future))
+            raise
+
+    def release(self, cpus: Collection[int]) -> None:
+        self._free.update(cpus)
+        while self._waiters and len(self._free) >= self._waiters[0][0]:
+            count, future = self._waiters.popleft()
+            future.set_result(self._take(count))
+
+
+def _ionice_setter(level: int) -> Callable[[int], None] | None:
+    number = _IOPRIO_SET.get(platform.machine())
+    if number is None:
+        logger.warning("ionice is not supported on %s", platform.machine())
+        return None
+    syscall = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True).syscall
+    value = (_IOPRIO_CLASS_BE << _IOPRIO_CLASS_SHIFT) | level
+
+    def set_ionice(pid: int) -> None:
+        if syscall(number, _IOPRIO_WHO_PROCESS, pid, value) == -1:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+    return set_ionice
+
+
+def resource_setter(resources: Resources | None, cpus: Collection[int] | None) -> Callable[[int], None] | None:
+    """Return a function applying ``resources`` and ``cpus`` to a started process, if any apply.
+
+    They are applied from the engine by pid, while the node's shell waits to
+    be released, rather than in the child before exec, where running Python
+    can deadlock on locks held by the engine's worker threads. Raises
+    ``OSError`` if one cannot be applied.
+    """
+    steps: list[Callable[[int], object]] = []
+    if cpus:
+        steps.append(lambda pid: os.sched_setaffinity(pid, cpus))
+    if resources is not None:
+        if (nice := resources.nice) is not None:
+            steps.append(lambda pid: os.setpriority(os.PRIO_PROCESS, pid, nice))
+        if resources.ionice is not None and (set_ionice := _ionice_setter(resources.ionice)) is not None:
+            steps.append(set_ionice)
+        if resources.max_memory is not None:
+            limit = (resources.max_memory, resources.max_memory)
+            steps.append(lambda pid: resource.prlimit(pid, resource.RLIMIT_AS, limit))
+        if resources.max_open_files is not None:
+            files = (resources.max_open_files, resources.max_open_files)
+            steps.append(lambda pid: resource.prlimit(pid, resource.RLIMIT_NOFILE, files))
+    if not steps:
+        return None
+
+    def apply(pid: int) -> None:
+        for step in steps:
+            step(pid)
+
+    return apply
@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+from contextlib import aclosing, suppress
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, BinaryIO, Sequence
+
+from wtflow.infra.events import LogChunk, RunFinished
+
+if TYPE_CHECKING:
+    from wtflow.infra.engine import Engine
+    from wtflow.infra.workflow import Graph, Tree
+
+logger = logging.getLogger(__name__)
+
+_LINE_LIMIT = 1024 * 1024
+
+
+def default_socket_path() -> Path:
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return Path(runtime_dir) / "wtflow.sock"
+    return Path(tempfile.gettempdir()) / f"wtflow-{os.getuid()}.sock"
+
+
+async def _send(writer: asyncio.StreamWriter, message: dict[str, Any]) -> None:
+    writer.write(json.dumps(message).encode() + b"\n")
+    await writer.drain()
+
+
+async def _is_serving(path: Path) -> bool:
+    try:
+        _, writer = await asyncio.open_unix_connection(path)
+    except OSError:
+        return False
+    writer.close()
+    return True
+
+
+class RunServer:
+    """Runs workflows submitted over a Unix socket on one long-lived engine.
+
+    A request is a JSON line ``{"workflow": ..., "target": [...], "only": [...]}``.
+    The reply is a stream of JSON lines: ``log`` messages with the run's
+    output, then an ``exit`` message with its exit code, or a single ``error``
+    message when the request cannot be run. No output is lost: a run whose
+    client reads slowly is slowed down with it. Graphs are built once per
+    workflow, and all runs share the engine's services and concurrency
+    budget. A run is cancelled when its client goes away.
+    """
+
+    def __init__(self, engine: Engine, workflows: dict[str, Tree], path: Path, buffer_size: int = 1000) -> None:
+        self.engine = engine
+        self.workflows = workflows
+        self.path = path
+        self.buffer_size = buffer_size
+        self._graphs: dict[str, Graph] = {}
+        self._server: asyncio.AbstractServer | None = None
+
+    def graph(self, workflow: str, targets: Sequence[str] = (), only: Sequence[str] = ()) -> Graph:
+        """Return the graph of ``workflow``, narrowed to ``targets`` and ``only`` if given."""
+        graph = self._graphs.get(workflow)
+        if graph is None:
+            graph = self._graphs[workflow] = self.workflows[workflow].as_graph()
+        return graph.select(targets, only) if targets or only else graph
+
+    async def start(self) -> None:
+        if await _is_serving(self.path):
+            raise RuntimeError(f"Another server is listening on {self.path}")
+        self.path.unlink(missing_ok=True)
+        self._server = await asyncio.start_unix_server(self._handle, self.path)
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        assert self._server is not None
+        await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            self.path.unlink(missing_ok=True)
+
+    def _parse(self, line: bytes) -> Graph | str:
+        try:
+            request = json.loads(line)
+            workflow = request["workflow"]
+        except (ValueError, KeyError, TypeError):
+            return "Malformed request"
+        if workflow not in self.workflows:
+            return f"Workflow '{workflow}' not found."
+        try:
+            return self.graph(workflow, request.get("target", ()), request.get("only", ()))
+        except KeyError as e:
+            return f"Node {e} not found in workflow '{workflow}'."
+
+    async def _relay(self, graph: Graph, writer: asyncio.StreamWriter) -> None:
+        """Run ``graph`` and send its output to ``writer``; the run is cancelled if this is."""
+        async with aclosing(self.engine.run_graph_events(graph, self.buffer_size, lossless=True)) as events:
+            async for event in events:
+                if isinstance(event, LogChunk):
+                    data = event.data.decode(errors="surrogateescape")
+                    await _send(
+                        writer, {"type": "log", "node": event.node.name, "artifact": event.artifact, "data": data}
+                    )
+                elif isinstance(event, RunFinished):
+                    await _send(writer, {"type": "exit", "exit_code": int(event.exit_code)})
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            graph = self._parse(await reader.readline())
+            if isinstance(graph, str):
+                await _send(writer, {"type": "error", "message": graph})
+                return
+            # The client sends nothing after its request, so the end of its stream means it went away,
+            # even while the run has nothing to send.
+            relay = asyncio.create_task(self._relay(graph, writer))
+            hangup = asyncio.create_task(reader.read())
+            try:
+                await asyncio.wait([relay, hangup], return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for task in (relay, hangup):
+                    task.cancel()
+                await asyncio.gather(relay, hangup, return_exceptions=True)
+            if relay.cancelled():
+                raise ConnectionResetError("Client disconnected")
+            relay.result()
+        except ConnectionError:
+            logger.info("Client disconnected, run cancelled")
+        except Exception as e:
+            logger.exception("Run failed")
+            with suppress(ConnectionError):
+                await _send(writer, {"type": "error", "message": str(e)})
+        finally:
+            writer.close()
+            with suppress(ConnectionError):
+                await writer.wait_closed()
+
+
+async def submit(
+    path: Path,
+    workflow: str,
+    targets: Sequence[str] = (),
+    only: Sequence[str] = (),
+    stdout: BinaryIO | None = None,
+    stderr: BinaryIO | None = None,
+) -> int:
+    """Run ``workflow`` on the server at ``path``, copying its output to ``stdout``/``stderr``.
+
+    Return the exit code of the run, or 1 if it could not be run.
+    """
+    reader, writer = await asyncio.open_unix_connection(path, limit=_LINE_LIMIT)
+    streams = {"stdout": stdout or sys.stdout.buffer, "stderr": stderr or sys.stderr.buffer}
+    exit_code = 1
+    try:
+        await _send(writer, {"workflow": workflow, "target": list(targets), "only": list(only)})
+        while line := await reader.readline():
+            message = json.loads(line)
+            if message["type"] == "log":
+                stream = streams.get(message["artifact"])
+                if stream is not None:
+                    stream.write(message["data"].encode(errors="surrogateescape"))
+                    stream.flush()
+            elif message["type"] == "exit":
+                exit_code = message["exit_code"]
+            elif message["type"] == "error":
+                streams["stderr"].write(f"Error: {message['message']}\n".encode())
+                streams["stderr"].flush()
+    finally:
+        writer.close()
+        with suppress(ConnectionError):
+            await writer.wait_closed()
+    return exit_code
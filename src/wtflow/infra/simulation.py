@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import random
+import selectors
+from dataclasses import dataclass
+from typing import Any, Callable, Mapping, Sequence
+
+from wtflow.infra.engine import Executor, NodeResult
+from wtflow.infra.nodes import Node
+from wtflow.infra.state import RunState
+from wtflow.infra.workflow import Graph
+from wtflow.services.db.db_service import DBService, NoDBService
+from wtflow.services.servicer import Servicer
+from wtflow.services.storage.storage_service import NoStorageService
+
+_ARITY = {"fixed": 1, "uniform": 2, "exponential": 1, "lognormal": 2}
+
+
+class _VirtualSelector(selectors.BaseSelector):
+    """Polls the real selector without blocking, and advances the loop's clock instead of sleeping."""
+
+    def __init__(self, loop: VirtualTimeLoop) -> None:
+        self._loop = loop
+        self._selector = selectors.DefaultSelector()
+
+    def register(self, fileobj: Any, events: int, data: Any = None) -> selectors.SelectorKey:
+        return self._selector.register(fileobj, events, data)
+
+    def unregister(self, fileobj: Any) -> selectors.SelectorKey:
+        return self._selector.unregister(fileobj)
+
+    def modify(self, fileobj: Any, events: int, data: Any = None) -> selectors.SelectorKey:
+        return self._selector.modify(fileobj, events, data)
+
+    def select(self, timeout: float | None = None) -> list[tuple[selectors.SelectorKey, int]]:
+        events = self._selector.select(0)
+        if events or timeout == 0:
+            return events
+        if timeout is None:
+            raise RuntimeError("The simulation is waiting for an event that is never going to happen")
+        self._loop.now += timeout
+        return []
+
+    def get_map(self) -> Mapping[Any, selectors.SelectorKey]:
+        return self._selector.get_map()
+
+    def close(self) -> None:
+        self._selector.close()
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    """An event loop whose clock jumps to the next timer instead of waiting for it.
+
+    Only timers advance the clock, so code that sleeps runs as fast as the CPU
+    allows, and waiting on anything else is an error.
+    """
+
+    def __init__(self) -> None:
+        self.now = 0.0
+        super().__init__(_VirtualSelector(self))
+
+    def time(self) -> float:
+        return self.now
+
+
+@dataclass(frozen=True, slots=True)
+class Distribution:
+    """A distribution of node durations in seconds.
+
+    Written ``fixed:S``, ``uniform:LOW,HIGH``, ``exponential:MEAN`` or ``lognormal:MEDIAN,SIGMA``.
+    """
+
+    kind: str
+    params: tuple[float, ...]
+
+    @classmethod
+    def parse(cls, spec: str) -> Distribution:
+        kind, _, params = spec.partition(":")
+        if kind not in _ARITY:
+            raise ValueError(f"Unknown distribution {kind!r}, expected one of {', '.join(_ARITY)}")
+        values = tuple(float(value) for value in params.split(",")) if params else ()
+        if len(values) != _ARITY[kind]:
+            raise ValueError(f"Distribution {kind!r} takes {_ARITY[kind]} parameter(s), got {spec!r}")
+        return cls(kind, values)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.params)
+        if self.kind == "exponential":
+            return rng.expovariate(1 / self.params[0])
+        median, sigma = self.params
+        return rng.lognormvariate(math.log(median), sigma)
+
+
+class Durations:
+    """Draws the durations of simulated executions.
+
+    A node with recorded ``history`` takes one of its recorded durations,
+    others a sample of ``default``; nodes without a command take no time and
+    none takes longer than its timeout. Draws come from a generator seeded
+    with ``seed``, so simulations are repeatable.
+    """
+
+    def __init__(self, default: Distribution, history: dict[Node, list[float]] | None = None, seed: int = 0) -> None:
+        self.default = default
+        self.history = history or {}
+        self.rng = random.Random(seed)
+
+    @classmethod
+    async def from_history(
+        cls,
+        db_service: DBService,
+        graph: Graph,
+        default: Distribution,
+        seed: int = 0,
+        limit: int = 100,
+    ) -> Durations:
+        """Use the last ``limit`` successful durations of each node of ``graph`` in ``db_service``."""
+        history = {}
+        for node in graph.nodes:
+            if node.command and (durations := await db_service.durations(node, limit)):
+                history[node] = durations
+        return cls(default, history, seed)
+
+    def sample(self, node: Node) -> float:
+        if not node.command:
+            return 0.0
+        recorded = self.history.get(node)
+        duration = self.rng.choice(recorded) if recorded else self.default.sample(self.rng)
+        return duration if node.timeout is None else min(duration, node.timeout)
+
+
+class SimulatedExecutor(Executor):
+    """The executor's scheduling, with executions that only sleep for their simulated duration."""
+
+    def __init__(
+        self, graph: Graph, slots: int | None, durations: Durations, clock: Callable[[], float] | None = None
+    ) -> None:
+        super().__init__(graph, Servicer(NoDBService(), NoStorageService()), concurrency=slots)
+        if clock is not None:
+            self.state = RunState(graph.nodes, clock)
+        self.durations = durations
+        self.busy = 0.0
+        self.executions = 0
+
+    async def execute_node(
+        self,
+        node: Node,
+        parameters: dict[str, Any] | None = None,
+        released: asyncio.Future[None] | None = None,
+    ) -> NodeResult:
+        duration = self.durations.sample(node)
+        self.busy += duration
+        self.executions += 1
+        await asyncio.sleep(duration)
+        return NodeResult.SUCCESS
+
+    async def execute_batch(self, nodes: Sequence[Node]) -> NodeResult:
+        # A batch runs its nodes one after another.
+        for node in nodes:
+            await self.execute_node(node)
+        return NodeResult.SUCCESS
+
+
+@dataclass(frozen=True, slots=True)
+class SimulationResult:
+    makespan: float
+    slots: int
+    busy: float
+    executions: int
+    critical_path: tuple[tuple[Node, float, float], ...]
+
+    @property
+    def utilisation(self) -> float:
+        """The fraction of slot time spent running nodes."""
+        return self.busy / (self.slots * self.makespan) if self.makespan else 0.0
+
+
+def _canonical(graph: Graph) -> Graph:
+    """Return ``graph`` with its nodes and edges in an order that does not depend on hashing."""
+
+    def key(node: Node) -> tuple[str, str]:
+        return node.name, node.command or ""
+
+    nodes = tuple(sorted(graph.nodes, key=key))
+    edges = tuple(sorted(graph.edges, key=lambda edge: (key(edge[0]), key(edge[1]))))
+    return Graph(graph.name, nodes=nodes, edges=edges)
+
+
+def _critical_path(graph: Graph, state: RunState) -> tuple[tuple[Node, float, float], ...]:
+    """Follow the last node to finish back through the dependency that finished last."""
+    if not graph.nodes:
+        return ()
+    ids = {node: i for i, node in enumerate(graph.nodes)}
+    end_time = state.end_time.__getitem__
+    path = [max(range(len(graph.nodes)), key=end_time)]
+    while predecessors := graph.predecessors(graph.nodes[path[-1]]):
+        path.append(max((ids[node] for node in predecessors), key=end_time))
+    return tuple((graph.nodes[i], state.start_time[i], state.end_time[i]) for i in reversed(path))
+
+
+def simulate(graph: Graph, slots: int, durations: Durations) -> SimulationResult:
+    """Predict how ``graph`` runs with ``slots`` concurrent executions, in virtual time."""
+    graph = _canonical(graph)
+    loop = VirtualTimeLoop()
+    try:
+        executor = SimulatedExecutor(graph, slots, durations, loop.time)
+        loop.run_until_complete(executor.execute())
+    finally:
+        loop.close()
+    return SimulationResult(
+        makespan=loop.time(),
+        slots=slots,
+        busy=executor.busy,
+        executions=executor.executions,
+        critical_path=_critical_path(graph, executor.state),
+    )
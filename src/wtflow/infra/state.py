@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import math
+import time
+from array import array
+from enum import IntEnum
+from typing import Callable, Sequence
+
+from wtflow.infra.nodes import Node
+
+
+class NodeState(IntEnum):
+    PENDING = 0
+    QUEUED = 1
+    RUNNING = 2
+    DONE = 3
+    FAILED = 4
+
+
+class RunState:
+    """Runtime state of every node of a run, kept in columns indexed by node id.
+
+    A node's id is its position in ``nodes``. Times are the ``clock`` readings
+    of the first start and last finish of a node, NaN until set; ``in_flight``
+    counts running executions (several for matrix nodes).
+    """
+
+    __slots__ = ("nodes", "state", "in_flight", "start_time", "end_time", "clock")
+
+    def __init__(self, nodes: Sequence[Node], clock: Callable[[], float] = time.time) -> None:
+        self.nodes = nodes
+        self.clock = clock
+        self.state = bytearray(len(nodes))
+        self.in_flight = array("l", bytes(array("l").itemsize * len(nodes)))
+        self.start_time = array("d", [math.nan]) * len(nodes)
+        self.end_time = array("d", [math.nan]) * len(nodes)
+
+    def __len__(self) -> int:
+        return len(self.state)
+
+    def count(self, state: NodeState) -> int:
+        return self.state.count(state)
+
+    def queued(self, i: int) -> None:
+        self.state[i] = NodeState.QUEUED
+
+    def started(self, i: int) -> None:
+        self.state[i] = NodeState.RUNNING
+        self.in_flight[i] += 1
+        if math.isnan(self.start_time[i]):
+            self.start_time[i] = self.clock()
+
+    def finished(self, i: int, failed: bool = False) -> int:
+        """Record the end of an execution of node ``i``; return how many are still running."""
+        self.in_flight[i] -= 1
+        self.end_time[i] = self.clock()
+        if failed:
+            self.failed(i)
+        return self.in_flight[i]
+
+    def failed(self, i: int) -> None:
+        self.state[i] = NodeState.FAILED
+
+    def done(self, i: int) -> None:
+        self.state[i] = NodeState.DONE
+
+    def get(self, i: int) -> NodeState:
+        return NodeState(self.state[i])
@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import asyncio
+import ctypes
+import ctypes.util
+import glob
+import hashlib
+import logging
+import os
+import struct
+import sys
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable
+
+from wtflow.infra.engine import Engine
+from wtflow.infra.nodes import Node
+from wtflow.infra.workflow import Graph
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Fingerprint:
+    mtime_ns: int
+    size: int
+    digest: str
+
+
+def _hash_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(1024 * 1024):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class FingerprintCache:
+    """Remembers the mtime, size and content hash of input files.
+
+    A file is only re-hashed when its mtime or size changed, and is only
+    reported as changed when its content did.
+    """
+
+    def __init__(self) -> None:
+        self._entries: dict[Path, Fingerprint] = {}
+
+    def changed(self, paths: Iterable[Path]) -> set[Path]:
+        changed = set()
+        for path in paths:
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                if self._entries.pop(path, None) is not None:
+                    changed.add(path)
+                continue
+            old = self._entries.get(path)
+            if old is not None and old.mtime_ns == st.st_mtime_ns and old.size == st.st_size:
+                continue
+            new = Fingerprint(st.st_mtime_ns, st.st_size, _hash_file(path))
+            self._entries[path] = new
+            if old is None or old.digest != new.digest:
+                changed.add(path)
+        return changed
+
+
+class ChangeWatcher(ABC):
+    """Wakes up the watch loop when input files may have changed."""
+
+    @abstractmethod
+    async def wait(self) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class PollingWatcher(ChangeWatcher):
+    def __init__(self, interval: float = 0.5) -> None:
+        self.interval = interval
+
+    async def wait(self) -> None:
+        await asyncio.sleep(self.interval)
+
+
+_IN_MODIFY = 0x002
+_IN_ATTRIB = 0x004
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = os.O_CLOEXEC
+_IN_MASK = _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+_EVENT = struct.Struct("iIII")
+
+
+class InotifyWatcher(ChangeWatcher):
+    """Linux inotify watcher over a set of directory trees.
+
+    Events only serve as wake-ups; the caller re-checks fingerprints to find
+    what actually changed. Bursts of events are coalesced for ``debounce``
+    seconds.
+    """
+
+    def __init__(self, directories: Iterable[Path], debounce: float = 0.05) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self.fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.debounce = debounce
+        self._dirs: dict[int, Path] = {}
+        for directory in directories:
+            for root, dirs, _ in os.walk(directory):
+                dirs[:] = [d for d in dirs if not d.startswith(".")]
+                self._watch(Path(root))
+
+    def _watch(self, directory: Path) -> None:
+        wd = self._add_watch(self.fd, os.fsencode(directory), _IN_MASK)
+        if wd >= 0:
+            self._dirs[wd] = directory
+
+    def _drain(self) -> bool:
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return False
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size : offset + _EVENT.size + length].rstrip(b"\0")
+            offset += _EVENT.size + length
+            if mask & _IN_ISDIR and mask & (_IN_CREATE | _IN_MOVED_TO) and wd in self._dirs:
+                self._watch(self._dirs[wd] / os.fsdecode(name))
+        return True
+
+    async def wait(self) -> None:
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+        loop.add_reader(self.fd, ready.set)
+        try:
+            while not self._drain():
+                ready.clear()
+                await ready.wait()
+            await asyncio.sleep(self.debounce)
+            while self._drain():
+                pass
+        finally:
+            loop.remove_reader(self.fd)
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def _glob_base(root: Path, pattern: str) -> Path:
+    parts = []
+    for part in Path(pattern).parts:
+        if any(c in part for c in "*?["):
+            break
+        parts.append(part)
+    base = root.joinpath(*parts)
+    return base if base.is_dir() else base.parent
+
+
+def create_watcher(root: Path, patterns: Iterable[str], poll_interval: float = 0.5) -> ChangeWatcher:
+    """Use inotify where available and fall back to polling."""
+    if sys.platform.startswith("linux"):
+        bases = {_glob_base(root, pattern) for pattern in patterns}
+        try:
+            return InotifyWatcher(base for base in bases if base.is_dir())
+        except (OSError, AttributeError) as e:
+            logger.debug("inotify unavailable, falling back to polling: %s", e)
+    return PollingWatcher(poll_interval)
+
+
+class WorkflowWatcher:
+    """Keeps a compiled graph resident and re-runs the nodes affected by input changes.
+
+    Each node's ``inputs`` globs are expanded relative to ``root``. When files
+    matched by a node change, that node and every node depending on it are run.
+    """
+
+    def __init__(self, engine: Engine, graph: Graph, root: Path, watcher: ChangeWatcher | None = None) -> None:
+        self.engine = engine
+        self.graph = graph
+        self.root = root
+        self.patterns = {node: node.inputs for node in graph.nodes if node.inputs}
+        self.watcher = watcher or create_watcher(root, {p for ps in self.patterns.values() for p in ps})
+        self.fingerprints = FingerprintCache()
+        self._files: dict[Node, set[Path]] = {}
+
+    def _expand(self) -> dict[Node, set[Path]]:
+        files = {}
+        for node, patterns in self.patterns.items():
+            matched: set[Path] = set()
+            for pattern in patterns:
+                matched.update(Path(p) for p in glob.glob(str(self.root / pattern), recursive=True))
+            files[node] = {p for p in matched if p.is_file()}
+        return files
+
+    def affected_nodes(self) -> set[Node]:
+        """Return the nodes whose inputs changed since the previous call."""
+        previous, self._files = self._files, self._expand()
+        all_files = set().union(*previous.values(), *self._files.values())
+        changed = self.fingerprints.changed(all_files)
+        return {node for node in self.patterns if (self._files.get(node, set()) | previous.get(node, set())) & changed}
+
+    async def run_affected(self) -> int | None:
+        """Run the subgraph affected by changes; return ``None`` when nothing changed."""
+        nodes = self.affected_nodes()
+        if not nodes:
+            return None
+        subgraph = self.graph.subgraph(self.graph.dependents(nodes))
+        logger.info("Re-running %d node(s) of %r", len(subgraph.nodes), self.graph.name)
+        return await self.engine.run_graph(subgraph)
+
+    async def run(self) -> None:
+        self.affected_nodes()
+        await self.engine.run_graph(self.graph)
+        try:
+            while True:
+                await self.watcher.wait()
+                await self.run_affected()
+        finally:
+            self.watcher.close()
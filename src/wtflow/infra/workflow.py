@@ -2,6 +2,8 @@ from __future__ import annotations
 
 from collections import defaultdict
 from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Iterable
 
 from wtflow.infra.nodes import Node, TreeNode
 
@@ -18,6 +20,74 @@ class Graph:
             predecessors[child].add(parent)
         return {(node, tuple(predecessors[node])) for node in self.nodes}
 
+    @cached_property
+    def _successors(self) -> dict[Node, tuple[Node, ...]]:
+        successors = defaultdict[Node, list[Node]](list)
+        for before, after in self.edges:
+            successors[before].append(after)
+        return {node: tuple(nodes) for node, nodes in successors.items()}
+
+    @cached_property
+    def _predecessors(self) -> dict[Node, tuple[Node, ...]]:
+        predecessors = defaultdict[Node, list[Node]](list)
+        for before, after in self.edges:
+            predecessors[after].append(before)
+        return {node: tuple(nodes) for node, nodes in predecessors.items()}
+
+    @cached_property
+    def _by_name(self) -> dict[str, tuple[Node, ...]]:
+        by_name = defaultdict[str, list[Node]](list)
+        for node in self.nodes:
+            by_name[node.name].append(node)
+        return {name: tuple(nodes) for name, nodes in by_name.items()}
+
+    def successors(self, node: Node) -> tuple[Node, ...]:
+        """Return the nodes that directly depend on ``node``."""
+        return self._successors.get(node, ())
+
+    def predecessors(self, node: Node) -> tuple[Node, ...]:
+        """Return the nodes ``node`` directly depends on."""
+        return self._predecessors.get(node, ())
+
+    @staticmethod
+    def _closure(nodes: Iterable[Node], adjacency: dict[Node, tuple[Node, ...]]) -> set[Node]:
+        result = set(nodes)
+        stack = list(result)
+        while stack:
+            for neighbour in adjacency.get(stack.pop(), ()):
+                if neighbour not in result:
+                    result.add(neighbour)
+                    stack.append(neighbour)
+        return result
+
+    def dependents(self, nodes: Iterable[Node]) -> set[Node]:
+        """Return ``nodes`` and every node that transitively depends on them."""
+        return self._closure(nodes, self._successors)
+
+    def dependencies(self, nodes: Iterable[Node]) -> set[Node]:
+        """Return ``nodes`` and every node they transitively depend on."""
+        return self._closure(nodes, self._predecessors)
+
+    def find(self, name: str) -> tuple[Node, ...]:
+        """Return the nodes called ``name``; raise ``KeyError`` if there are none."""
+        return self._by_name[name]
+
+    def select(self, targets: Iterable[str] = (), only: Iterable[str] = ()) -> Graph:
+        """Return the subgraph needed to run ``targets`` (with their dependencies) and ``only`` (without)."""
+        nodes = self.dependencies(node for name in targets for node in self.find(name))
+        nodes.update(node for name in only for node in self.find(name))
+        return self.subgraph(nodes)
+
+    def subgraph(self, nodes: Iterable[Node]) -> Graph:
+        keep = set(nodes)
+        return Graph(
+            self.name,
+            nodes=tuple(keep),
+            edges=tuple(
+                (before, node) for node in keep for before in self._predecessors.get(node, ()) if before in keep
+            ),
+        )
+
 
 @dataclass(frozen=True)
 class Tree:
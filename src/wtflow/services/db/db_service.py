@@ -1,13 +1,33 @@
 from __future__ import annotations
 
+import hashlib
+import json
 from abc import abstractmethod
+from dataclasses import asdict
+from typing import Any, ClassVar, Protocol
 
 import wtflow
 from wtflow.infra.info import ExecutionInfo, RunInfo
 from wtflow.services.base_service import BaseService
 
 
+class Dataclass(Protocol):
+    __dataclass_fields__: ClassVar[dict[str, Any]]
+
+
+def digest(node: Dataclass) -> str:
+    data = json.dumps(
+        asdict(node),
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
 class DBService(BaseService):
+    # Whether ``ExecutionInfo.artifacts`` is persisted, and so worth computing.
+    records_artifacts: ClassVar[bool] = True
+
     @abstractmethod
     async def save_graph(self, graph: wtflow.Graph) -> None:
         raise NotImplementedError
@@ -28,8 +48,17 @@ class DBService(BaseService):
     async def finish_execution(self, run_info: RunInfo, execution_info: ExecutionInfo) -> None:
         raise NotImplementedError
 
+    async def durations(self, node: wtflow.Node, limit: int) -> list[float]:
+        """Return the durations in seconds of the last ``limit`` successful executions of ``node``."""
+        return []
+
+    async def flush(self) -> None:
+        """Wait until everything recorded so far is persisted."""
+
 
 class NoDBService(DBService):
+    records_artifacts = False
+
     async def save_graph(self, graph: wtflow.Graph) -> None:
         pass
 
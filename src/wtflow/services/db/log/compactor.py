@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import functools
+import json
+import logging
+import sqlite3
+from pathlib import Path
+from typing import Any
+
+SEGMENT_SUFFIX = ".jsonl"
+
+logger = logging.getLogger(__name__)
+
+
+class LogCompactor:
+    """Bulk-loads the segments written by ``LogDBService`` into an SQLite database.
+
+    The schema is the one of ``Sqlite3DBService``. How far each segment has been
+    loaded is tracked in ``log_segments``, so compaction can run repeatedly while
+    segments are still being appended to. Each segment is loaded in one write
+    transaction, so several compactors may share a database. Malformed records,
+    such as those cut short by a crash, are skipped with a warning.
+    """
+
+    def __init__(self, directory: str | Path, database_path: str | Path) -> None:
+        from wtflow.services.db.sqlite.sqlite_db_service import Sqlite3DBService
+
+        self.directory = Path(directory)
+        self.db_service = Sqlite3DBService(database_path)
+        self.db_service.write_blocking(
+            lambda conn: conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS log_segments (
+                    name TEXT PRIMARY KEY,
+                    offset INTEGER NOT NULL
+                )
+                """
+            )
+        )
+
+    def compact(self) -> int:
+        """Load every record not loaded yet and return how many were loaded."""
+        return sum(
+            self.db_service.write_blocking(functools.partial(_load_segment, segment))
+            for segment in sorted(self.directory.glob(f"*{SEGMENT_SUFFIX}"))
+        )
+
+
+def _load_segment(segment: Path, conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT offset FROM log_segments WHERE name = ?", (segment.name,)).fetchone()
+    offset = row[0] if row else 0
+    lines, new_offset = _read_lines(segment, offset)
+    if new_offset == offset:
+        return 0
+    loaded = 0
+    for position, line in lines:
+        # A record that fails to load leaves nothing behind.
+        conn.execute("SAVEPOINT record")
+        try:
+            record = json.loads(line)
+            _LOADERS[record["type"]](conn, record)
+        except (ValueError, KeyError, TypeError, IndexError, sqlite3.IntegrityError, sqlite3.ProgrammingError) as e:
+            conn.execute("ROLLBACK TO record")
+            logger.warning("Skipping malformed record at byte %d of %s: %r", position, segment.name, e)
+        else:
+            loaded += 1
+        conn.execute("RELEASE record")
+    conn.execute(
+        """
+        INSERT INTO log_segments (name, offset) VALUES (?, ?)
+        ON CONFLICT(name) DO UPDATE SET offset = excluded.offset
+        """,
+        (segment.name, new_offset),
+    )
+    return loaded
+
+
+def _read_lines(segment: Path, offset: int) -> tuple[list[tuple[int, bytes]], int]:
+    """Return the complete lines after ``offset`` with the offsets they start at, and where they end."""
+    with segment.open("rb") as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    lines = []
+    position = offset
+    for line in data[:end].splitlines(keepends=True):
+        lines.append((position, line))
+        position += len(line)
+    return lines, offset + end
+
+
+def _load_graph(conn: sqlite3.Connection, record: dict[str, Any]) -> None:
+    graph_digest = record["digest"]
+    conn.execute(
+        "INSERT INTO graphs (digest, name) VALUES (?, ?) ON CONFLICT(digest) DO NOTHING",
+        (graph_digest, record["name"]),
+    )
+    conn.executemany(
+        "INSERT INTO nodes (digest, name, command, timeout) VALUES (?, ?, ?, ?) ON CONFLICT(digest) DO NOTHING",
+        record["nodes"],
+    )
+    conn.executemany(
+        """
+        INSERT INTO graph_nodes (graph_digest, node_digest) VALUES (?, ?)
+        ON CONFLICT(graph_digest, node_digest) DO NOTHING
+        """,
+        [(graph_digest, node[0]) for node in record["nodes"]],
+    )
+    conn.executemany(
+        """
+        INSERT INTO graph_edges (graph_digest, from_node_digest, to_node_digest) VALUES (?, ?, ?)
+        ON CONFLICT(graph_digest, from_node_digest, to_node_digest) DO NOTHING
+        """,
+        [(graph_digest, a, b) for a, b in record["edges"]],
+    )
+    conn.executemany(
+        """
+        INSERT INTO node_matrix (node_digest, position, name, parameter_values) VALUES (?, ?, ?, ?)
+        ON CONFLICT(node_digest, position) DO NOTHING
+        """,
+        [(node, position, name, json.dumps(values)) for node, position, name, values in record.get("matrices", ())],
+    )
+
+
+def _load_run_start(conn: sqlite3.Connection, record: dict[str, Any]) -> None:
+    conn.execute(
+        """
+        INSERT INTO runs (
+            uuid, graph_digest, created_at, start_time, end_time,
+            hostname, os_name, os_release, os_version, machine, cpu_count
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            record["run_id"],
+            record["graph"],
+            record["created_at"],
+            record["start_time"],
+            record["end_time"],
+            record["hostname"],
+            record["os_name"],
+            record["os_release"],
+            record["os_version"],
+            record["machine"],
+            record["cpu_count"],
+        ),
+    )
+
+
+def _load_run_finish(conn: sqlite3.Connection, record: dict[str, Any]) -> None:
+    conn.execute(
+        "UPDATE runs SET start_time = ?, end_time = ? WHERE uuid = ?",
+        (record["start_time"], record["end_time"], record["run_id"]),
+    )
+
+
+def _load_execution_start(conn: sqlite3.Connection, record: dict[str, Any]) -> None:
+    cursor = conn.execute(
+        """
+        INSERT INTO executions (uuid, run_id, node_digest, start_time, end_time, attempt)
+        VALUES (?, (SELECT id FROM runs WHERE uuid = ?), ?, ?, ?, ?)
+        """,
+        (
+            record["execution_id"],
+            record["run_id"],
+            record["node"],
+            record["start_time"],
+            record["end_time"],
+            record.get("attempt", 0),
+        ),
+    )
+    if record.get("parameters") is not None:
+        conn.execute(
+            "INSERT INTO execution_parameters (execution_id, parameters) VALUES (?, ?)",
+            (cursor.lastrowid, json.dumps(record["parameters"])),
+        )
+
+
+def _load_execution_finish(conn: sqlite3.Connection, record: dict[str, Any]) -> None:
+    conn.execute(
+        "UPDATE executions SET start_time = ?, end_time = ?, result = ? WHERE uuid = ?",
+        (record["start_time"], record["end_time"], record.get("result"), record["execution_id"]),
+    )
+    conn.executemany(
+        """
+        INSERT INTO artifacts (execution_id, name, file_type, size, lines, checksum, first_write, last_write)
+        VALUES ((SELECT id FROM executions WHERE uuid = ?), ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(execution_id, name) DO NOTHING
+        """,
+        [(record["execution_id"], *artifact) for artifact in record.get("artifacts", ())],
+    )
+
+
+_LOADERS = {
+    "graph": _load_graph,
+    "run_start": _load_run_start,
+    "run_finish": _load_run_finish,
+    "execution_start": _load_execution_start,
+    "execution_finish": _load_execution_finish,
+}
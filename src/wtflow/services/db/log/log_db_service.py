@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+import json
+import os
+import time
+from io import BufferedWriter
+from pathlib import Path
+from typing import Any
+
+import wtflow
+from wtflow.infra.info import ExecutionInfo, RunInfo
+from wtflow.services.db.db_service import DBService, digest
+from wtflow.services.db.log.compactor import SEGMENT_SUFFIX, LogCompactor
+
+_SECONDS_PER_DAY = 86400
+
+
+def _isoformat(dt: datetime.datetime | None) -> str | None:
+    return dt.isoformat() if dt is not None else None
+
+
+class LogDBService(DBService):
+    """Records run history as JSON lines appended to one segment file per UTC day and process.
+
+    Every event is a single buffered append; the buffer is flushed when a run
+    finishes. As no two processes append to the same segment, a flush never
+    splits the records of another. With ``compact_to`` set, segments are bulk-loaded into that SQLite
+    database in the background after each run.
+    """
+
+    def __init__(self, directory: str | Path, compact_to: str | Path | None = None) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.compactor = LogCompactor(self.directory, compact_to) if compact_to is not None else None
+
+        self._segment: BufferedWriter | None = None
+        self._segment_day = -1
+        self._graph_digests: dict[wtflow.Graph, str] = {}
+        self._node_digests: dict[wtflow.Node, str] = {}
+        self._compaction: asyncio.Future[int] | None = None
+
+    def _append(self, record: dict[str, Any]) -> None:
+        day = int(time.time()) // _SECONDS_PER_DAY
+        if day != self._segment_day or self._segment is None:
+            self._close_segment()
+            date = datetime.datetime.fromtimestamp(day * _SECONDS_PER_DAY, tz=datetime.timezone.utc).date()
+            self._segment = (self.directory / f"{date.isoformat()}.{os.getpid()}{SEGMENT_SUFFIX}").open("ab")
+            self._segment_day = day
+        self._segment.write(json.dumps(record, separators=(",", ":")).encode() + b"\n")
+
+    def _close_segment(self) -> None:
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+
+    def _graph_digest(self, graph: wtflow.Graph) -> str:
+        if graph not in self._graph_digests:
+            self._graph_digests[graph] = digest(graph)
+        return self._graph_digests[graph]
+
+    def _node_digest(self, node: wtflow.Node) -> str:
+        if node not in self._node_digests:
+            self._node_digests[node] = digest(node)
+        return self._node_digests[node]
+
+    async def save_graph(self, graph: wtflow.Graph) -> None:
+        self._append(
+            {
+                "type": "graph",
+                "digest": self._graph_digest(graph),
+                "name": graph.name,
+                "nodes": [[self._node_digest(n), n.name, n.command, n.timeout] for n in graph.nodes],
+                "edges": [[self._node_digest(a), self._node_digest(b)] for a, b in graph.edges],
+                "matrices": [
+                    [self._node_digest(n), position, name, list(values)]
+                    for n in graph.nodes
+                    if n.matrix is not None
+                    for position, (name, values) in enumerate(n.matrix.axes)
+                ],
+            }
+        )
+
+    async def start_run(self, run_info: RunInfo) -> None:
+        system_info = run_info.system_info
+        self._append(
+            {
+                "type": "run_start",
+                "run_id": str(run_info.run_id),
+                "graph": self._graph_digest(run_info.graph),
+                "created_at": _isoformat(run_info.created_at),
+                "start_time": _isoformat(run_info.start_time),
+                "end_time": _isoformat(run_info.end_time),
+                "hostname": system_info.hostname,
+                "os_name": system_info.os_name,
+                "os_release": system_info.os_release,
+                "os_version": system_info.os_version,
+                "machine": system_info.machine,
+                "cpu_count": system_info.cpu_count,
+            }
+        )
+
+    async def finish_run(self, run_info: RunInfo) -> None:
+        self._append(
+            {
+                "type": "run_finish",
+                "run_id": str(run_info.run_id),
+                "start_time": _isoformat(run_info.start_time),
+                "end_time": _isoformat(run_info.end_time),
+            }
+        )
+        self._flush_segment()
+        self._start_compaction()
+
+    async def start_execution(self, run_info: RunInfo, execution_info: ExecutionInfo) -> None:
+        self._append(
+            {
+                "type": "execution_start",
+                "run_id": str(run_info.run_id),
+                "execution_id": str(execution_info.execution_id),
+                "node": self._node_digest(execution_info.node),
+                "parameters": execution_info.parameters,
+                "attempt": execution_info.attempt,
+                "start_time": _isoformat(execution_info.start_time),
+                "end_time": _isoformat(execution_info.end_time),
+            }
+        )
+
+    async def finish_execution(self, run_info: RunInfo, execution_info: ExecutionInfo) -> None:
+        self._append(
+            {
+                "type": "execution_finish",
+                "run_id": str(run_info.run_id),
+                "execution_id": str(execution_info.execution_id),
+                "start_time": _isoformat(execution_info.start_time),
+                "end_time": _isoformat(execution_info.end_time),
+                "result": execution_info.result,
+                "artifacts": [
+                    [
+                        artifact.name,
+                        artifact.file_type,
+                        artifact.size,
+                        artifact.lines,
+                        artifact.checksum,
+                        _isoformat(artifact.first_write),
+                        _isoformat(artifact.last_write),
+                    ]
+                    for artifact in execution_info.artifacts
+                ],
+            }
+        )
+
+    async def durations(self, node: wtflow.Node, limit: int) -> list[float]:
+        """Durations are read from the compacted database, so runs not compacted yet are left out."""
+        if self.compactor is None:
+            return []
+        return await self.compactor.db_service.durations(node, limit)
+
+    def _flush_segment(self) -> None:
+        if self._segment is not None:
+            self._segment.flush()
+
+    def _start_compaction(self) -> None:
+        if self.compactor is None:
+            return
+        if self._compaction is None or self._compaction.done():
+            self._compaction = asyncio.get_running_loop().run_in_executor(None, self.compactor.compact)
+
+    async def flush(self) -> None:
+        self._flush_segment()
+        self._start_compaction()
+        if self._compaction is not None:
+            await asyncio.shield(self._compaction)
@@ -1,60 +1,133 @@
 from __future__ import annotations
 
-import hashlib
+import asyncio
+import itertools
 import json
+import random
 import sqlite3
+import time
 from contextlib import closing, contextmanager
-from dataclasses import asdict
 from datetime import datetime
 from pathlib import Path
-from typing import Any, ClassVar, Generator, Protocol
-from uuid import UUID
+from typing import Callable, Generator, TypeVar
 
 import wtflow
 from wtflow.infra.info import ExecutionInfo, RunInfo
-from wtflow.services.db.db_service import DBService
+from wtflow.services.db.db_service import DBService, digest
 
+T = TypeVar("T")
 
-class Dataclass(Protocol):
-    __dataclass_fields__: ClassVar[dict[str, Any]]
+SCHEMA_VERSION = 4
 
+_BACKOFF_BASE = 0.01
+_BACKOFF_MAX = 1.0
 
-def _digest(node: Dataclass) -> str:
-    data = json.dumps(
-        asdict(node),
-        sort_keys=True,
-        separators=(",", ":"),
-    )
-    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+# Columns added after the first release, created on databases that predate them.
+_ADDED_COLUMNS = (
+    ("runs", "uuid", "TEXT"),
+    ("executions", "uuid", "TEXT"),
+    ("executions", "attempt", "INTEGER NOT NULL DEFAULT 0"),
+    ("executions", "result", "INTEGER"),
+)
+
+
+def _is_busy(error: sqlite3.OperationalError) -> bool:
+    message = str(error)
+    return "locked" in message or "busy" in message
+
+
+def _transaction(fn: Callable[[sqlite3.Connection], T]) -> Callable[[sqlite3.Connection], T]:
+    def transaction(conn: sqlite3.Connection) -> T:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        return result
+
+    return transaction
 
 
 class Sqlite3DBService(DBService):
-    def __init__(self, database_path: str | Path) -> None:
+    """Run database in an SQLite file that many processes may write to at once.
+
+    The database is in WAL mode and every write is a short ``BEGIN IMMEDIATE``
+    transaction. A writer waits up to ``busy_timeout`` seconds for the lock and
+    then retries up to ``max_retries`` times with jittered exponential backoff.
+    Queries run in a worker thread, so that waiting for the lock does not
+    block the event loop.
+    Runs and executions are addressed by their UUIDs, so nothing about them is
+    kept in memory between calls. The schema is only created or upgraded when
+    ``PRAGMA user_version`` is behind ``SCHEMA_VERSION``.
+    """
+
+    def __init__(self, database_path: str | Path, busy_timeout: float = 30.0, max_retries: int = 8) -> None:
         self.database_path = Path(database_path)
         self.database_path.parent.mkdir(parents=True, exist_ok=True)
-        self._create_tables()
-
-        self._execution_ids: dict[UUID, int] = {}
-        self._run_ids: dict[UUID, int] = {}
+        self.busy_timeout = busy_timeout
+        self.max_retries = max_retries
+        self._migrate()
 
     @contextmanager
     def _get_connection(self) -> Generator[sqlite3.Connection]:
         sqlite3.register_adapter(datetime, self._adapt_datetime)
 
-        with closing(sqlite3.connect(self.database_path)) as cx:
+        with closing(sqlite3.connect(self.database_path, timeout=self.busy_timeout, isolation_level=None)) as cx:
             cx.execute("PRAGMA foreign_keys = ON")
+            cx.execute("PRAGMA synchronous = NORMAL")
             yield cx
 
     @staticmethod
     def _adapt_datetime(dt: datetime) -> str:
         return dt.isoformat()
 
+    def _run(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        with self._get_connection() as conn:
+            return fn(conn)
+
+    def _backoff(self, attempt: int, error: sqlite3.OperationalError) -> float:
+        """Return how long to wait before retrying after ``error``; raise it if that is not worth it."""
+        if not _is_busy(error) or attempt >= self.max_retries:
+            raise error
+        return random.uniform(0, min(_BACKOFF_MAX, _BACKOFF_BASE * 2**attempt))
+
+    def _retry(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        """Run ``fn`` on a new connection, again while the database is busy, blocking the caller."""
+        for attempt in itertools.count():
+            try:
+                return self._run(fn)
+            except sqlite3.OperationalError as e:
+                time.sleep(self._backoff(attempt, e))
+        raise AssertionError("unreachable")
+
+    async def _retry_async(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        """Run ``fn`` like ``_retry``, in a worker thread."""
+        for attempt in itertools.count():
+            try:
+                return await asyncio.to_thread(self._run, fn)
+            except sqlite3.OperationalError as e:
+                await asyncio.sleep(self._backoff(attempt, e))
+        raise AssertionError("unreachable")
+
+    async def _write(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        """Run ``fn`` in a write transaction, from the start again if the database was busy."""
+        return await self._retry_async(_transaction(fn))
+
+    def write_blocking(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        """Run ``fn`` in a write transaction in the calling thread, from the start again if the database was busy.
+
+        For callers outside the event loop, such as the compactor of ``LogDBService``.
+        """
+        return self._retry(_transaction(fn))
+
     async def save_graph(self, graph: wtflow.Graph) -> None:
-        graph_digest = _digest(graph)
+        graph_digest = digest(graph)
 
-        node_digests = {node: _digest(node) for node in graph.nodes}
+        node_digests = {node: digest(node) for node in graph.nodes}
 
-        with self._get_connection() as conn:
+        def insert(conn: sqlite3.Connection) -> None:
             conn.execute(
                 """
                 INSERT INTO graphs (digest, name)
@@ -84,6 +157,24 @@ class Sqlite3DBService(DBService):
                     ),
                 )
 
+                if node.matrix is not None:
+                    conn.executemany(
+                        """
+                        INSERT INTO node_matrix (
+                            node_digest,
+                            position,
+                            name,
+                            parameter_values
+                        )
+                        VALUES (?, ?, ?, ?)
+                        ON CONFLICT(node_digest, position) DO NOTHING
+                        """,
+                        [
+                            (node_digest, position, name, json.dumps(values))
+                            for position, (name, values) in enumerate(node.matrix.axes)
+                        ],
+                    )
+
                 conn.execute(
                     """
                     INSERT INTO graph_nodes (
@@ -121,16 +212,17 @@ class Sqlite3DBService(DBService):
                     ),
                 )
 
-            conn.commit()
+        await self._write(insert)
 
     async def start_run(self, run_info: RunInfo) -> None:
-        graph_digest = _digest(run_info.graph)
+        graph_digest = digest(run_info.graph)
         system_info = run_info.system_info
 
-        with self._get_connection() as conn:
-            cursor = conn.execute(
+        await self._write(
+            lambda conn: conn.execute(
                 """
                 INSERT INTO runs (
+                    uuid,
                     graph_digest,
                     created_at,
                     start_time,
@@ -142,9 +234,10 @@ class Sqlite3DBService(DBService):
                     machine,
                     cpu_count
                 )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """,
                 (
+                    str(run_info.run_id),
                     graph_digest,
                     run_info.created_at,
                     run_info.start_time,
@@ -157,171 +250,304 @@ class Sqlite3DBService(DBService):
                     system_info.cpu_count,
                 ),
             )
-            conn.commit()
-            assert cursor.lastrowid
-            self._run_ids[run_info.run_id] = cursor.lastrowid
+        )
 
     async def finish_run(self, run_info: RunInfo) -> None:
-        _id = self._run_ids.pop(run_info.run_id)
-        with self._get_connection() as conn:
-            conn.execute(
+        await self._write(
+            lambda conn: conn.execute(
                 """
                 UPDATE runs
                 SET
                     start_time = ?,
                     end_time = ?
-                WHERE id = ?
+                WHERE uuid = ?
                 """,
                 (
                     run_info.start_time,
                     run_info.end_time,
-                    _id,
+                    str(run_info.run_id),
                 ),
             )
-
-            conn.commit()
+        )
 
     async def start_execution(self, run_info: RunInfo, execution_info: ExecutionInfo) -> None:
-        node_digest = _digest(execution_info.node)
-        _run_id = self._run_ids[run_info.run_id]
+        node_digest = digest(execution_info.node)
 
-        with self._get_connection() as conn:
-            curser = conn.execute(
+        def insert(conn: sqlite3.Connection) -> None:
+            cursor = conn.execute(
                 """
                 INSERT INTO executions (
+                    uuid,
                     run_id,
                     node_digest,
                     start_time,
-                    end_time
+                    end_time,
+                    attempt
                 )
-                VALUES (?, ?, ?, ?)
+                VALUES (?, (SELECT id FROM runs WHERE uuid = ?), ?, ?, ?, ?)
                 """,
                 (
-                    _run_id,
+                    str(execution_info.execution_id),
+                    str(run_info.run_id),
                     node_digest,
                     execution_info.start_time,
                     execution_info.end_time,
+                    execution_info.attempt,
                 ),
             )
-            conn.commit()
-            assert curser.lastrowid
-            self._execution_ids[execution_info.execution_id] = curser.lastrowid
+            if execution_info.parameters is not None:
+                conn.execute(
+                    """
+                    INSERT INTO execution_parameters (
+                        execution_id,
+                        parameters
+                    )
+                    VALUES (?, ?)
+                    """,
+                    (
+                        cursor.lastrowid,
+                        json.dumps(execution_info.parameters),
+                    ),
+                )
+
+        await self._write(insert)
 
     async def finish_execution(self, run_info: RunInfo, execution_info: ExecutionInfo) -> None:
-        _id = self._execution_ids.pop(execution_info.execution_id)
-        _run_id = self._run_ids[run_info.run_id]
+        execution_id = str(execution_info.execution_id)
 
-        with self._get_connection() as conn:
+        def update(conn: sqlite3.Connection) -> None:
             conn.execute(
                 """
                 UPDATE executions
                 SET
                     start_time = ?,
-                    end_time = ?
-                WHERE id = ? AND run_id = ?
+                    end_time = ?,
+                    result = ?
+                WHERE uuid = ?
                 """,
                 (
                     execution_info.start_time,
                     execution_info.end_time,
-                    _id,
-                    _run_id,
+                    execution_info.result,
+                    execution_id,
                 ),
             )
-
-            conn.commit()
-
-    def _create_tables(self) -> None:
-        with self._get_connection() as conn:
-            conn.executescript(
+            conn.executemany(
                 """
-                CREATE TABLE IF NOT EXISTS nodes (
-                    digest TEXT PRIMARY KEY,
-                    name TEXT NOT NULL,
-                    command TEXT,
-                    timeout REAL
-                );
-
-                CREATE TABLE IF NOT EXISTS graphs (
-                    digest TEXT PRIMARY KEY,
-                    name TEXT NOT NULL
-                );
-
-                CREATE TABLE IF NOT EXISTS graph_nodes (
-                    graph_digest TEXT NOT NULL,
-                    node_digest TEXT NOT NULL,
-
-                    PRIMARY KEY (graph_digest, node_digest),
-
-                    FOREIGN KEY (graph_digest)
-                        REFERENCES graphs(digest)
-                        ON DELETE CASCADE,
-
-                    FOREIGN KEY (node_digest)
-                        REFERENCES nodes(digest)
-                        ON DELETE RESTRICT
-                );
-
-                CREATE TABLE IF NOT EXISTS graph_edges (
-                    graph_digest TEXT NOT NULL,
-                    from_node_digest TEXT NOT NULL,
-                    to_node_digest TEXT NOT NULL,
-
-                    PRIMARY KEY (
-                        graph_digest,
-                        from_node_digest,
-                        to_node_digest
-                    ),
+                INSERT INTO artifacts (
+                    execution_id,
+                    name,
+                    file_type,
+                    size,
+                    lines,
+                    checksum,
+                    first_write,
+                    last_write
+                )
+                VALUES ((SELECT id FROM executions WHERE uuid = ?), ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(execution_id, name) DO UPDATE SET
+                    file_type = excluded.file_type,
+                    size = excluded.size,
+                    lines = excluded.lines,
+                    checksum = excluded.checksum,
+                    first_write = excluded.first_write,
+                    last_write = excluded.last_write
+                """,
+                [
+                    (
+                        execution_id,
+                        artifact.name,
+                        artifact.file_type,
+                        artifact.size,
+                        artifact.lines,
+                        artifact.checksum,
+                        artifact.first_write,
+                        artifact.last_write,
+                    )
+                    for artifact in execution_info.artifacts
+                ],
+            )
+
+        await self._write(update)
 
-                    FOREIGN KEY (graph_digest)
-                        REFERENCES graphs(digest)
-                        ON DELETE CASCADE,
-
-                    FOREIGN KEY (from_node_digest)
-                        REFERENCES nodes(digest)
-                        ON DELETE RESTRICT,
-
-                    FOREIGN KEY (to_node_digest)
-                        REFERENCES nodes(digest)
-                        ON DELETE RESTRICT
-                );
-
-                CREATE TABLE IF NOT EXISTS runs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    graph_digest TEXT NOT NULL,
-                    created_at TEXT NOT NULL,
-                    start_time TEXT,
-                    end_time TEXT,
-
-                    hostname TEXT NOT NULL,
-                    os_name TEXT NOT NULL,
-                    os_release TEXT NOT NULL,
-                    os_version TEXT NOT NULL,
-                    machine TEXT NOT NULL,
-                    cpu_count INTEGER,
-
-                    FOREIGN KEY (graph_digest)
-                        REFERENCES graphs(digest)
-                        ON DELETE RESTRICT
-                );
-
-                CREATE TABLE IF NOT EXISTS executions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    run_id INTEGER NOT NULL,
-                    node_digest TEXT NOT NULL,
-                    start_time TEXT,
-                    end_time TEXT,
-
-                    FOREIGN KEY (run_id)
-                        REFERENCES runs(id)
-                        ON DELETE CASCADE,
-
-                    FOREIGN KEY (node_digest)
-                        REFERENCES nodes(digest)
-                        ON DELETE RESTRICT
-                );
-
-                CREATE INDEX IF NOT EXISTS executions_run_id_idx
-                    ON executions(run_id);
+    async def durations(self, node: wtflow.Node, limit: int) -> list[float]:
+        node_digest = digest(node)
+        rows = await self._retry_async(
+            lambda conn: conn.execute(
                 """
-            )
-            conn.commit()
+                SELECT (julianday(end_time) - julianday(start_time)) * 86400.0
+                FROM executions
+                WHERE node_digest = ? AND result = 0 AND end_time IS NOT NULL
+                ORDER BY id DESC
+                LIMIT ?
+                """,
+                (node_digest, limit),
+            ).fetchall()
+        )
+        return [row[0] for row in rows]
+
+    def _migrate(self) -> None:
+        def user_version(conn: sqlite3.Connection) -> int:
+            return int(conn.execute("PRAGMA user_version").fetchone()[0])
+
+        if self._retry(user_version) >= SCHEMA_VERSION:
+            return
+        self._retry(lambda conn: conn.execute("PRAGMA journal_mode = WAL"))
+
+        def create_tables(conn: sqlite3.Connection) -> None:
+            if user_version(conn) >= SCHEMA_VERSION:
+                return
+            for statement in _SCHEMA.split(";"):
+                if statement.strip():
+                    conn.execute(statement)
+            for table, column, definition in _ADDED_COLUMNS:
+                columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            for table in ("runs", "executions"):
+                conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {table}_uuid_idx ON {table}(uuid)")
+            if "node_digest" in {row[1] for row in conn.execute("PRAGMA table_info(executions)")}:
+                conn.execute("CREATE INDEX IF NOT EXISTS executions_node_digest_idx ON executions(node_digest)")
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+        self.write_blocking(create_tables)
+
+
+_SCHEMA = """CREATE TABLE IF NOT EXISTS nodes (
+    digest TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    command TEXT,
+    timeout REAL
+);
+
+CREATE TABLE IF NOT EXISTS graphs (
+    digest TEXT PRIMARY KEY,
+    name TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS graph_nodes (
+    graph_digest TEXT NOT NULL,
+    node_digest TEXT NOT NULL,
+
+    PRIMARY KEY (graph_digest, node_digest),
+
+    FOREIGN KEY (graph_digest)
+        REFERENCES graphs(digest)
+        ON DELETE CASCADE,
+
+    FOREIGN KEY (node_digest)
+        REFERENCES nodes(digest)
+        ON DELETE RESTRICT
+);
+
+CREATE TABLE IF NOT EXISTS graph_edges (
+    graph_digest TEXT NOT NULL,
+    from_node_digest TEXT NOT NULL,
+    to_node_digest TEXT NOT NULL,
+
+    PRIMARY KEY (
+        graph_digest,
+        from_node_digest,
+        to_node_digest
+    ),
+
+    FOREIGN KEY (graph_digest)
+        REFERENCES graphs(digest)
+        ON DELETE CASCADE,
+
+    FOREIGN KEY (from_node_digest)
+        REFERENCES nodes(digest)
+        ON DELETE RESTRICT,
+
+    FOREIGN KEY (to_node_digest)
+        REFERENCES nodes(digest)
+        ON DELETE RESTRICT
+);
+
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    uuid TEXT,
+    graph_digest TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    start_time TEXT,
+    end_time TEXT,
+
+    hostname TEXT NOT NULL,
+    os_name TEXT NOT NULL,
+    os_release TEXT NOT NULL,
+    os_version TEXT NOT NULL,
+    machine TEXT NOT NULL,
+    cpu_count INTEGER,
+
+    FOREIGN KEY (graph_digest)
+        REFERENCES graphs(digest)
+        ON DELETE RESTRICT
+);
+
+CREATE TABLE IF NOT EXISTS executions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    uuid TEXT,
+    run_id INTEGER NOT NULL,
+    node_digest TEXT NOT NULL,
+    start_time TEXT,
+    end_time TEXT,
+    attempt INTEGER NOT NULL DEFAULT 0,
+    result INTEGER,
+
+    FOREIGN KEY (run_id)
+        REFERENCES runs(id)
+        ON DELETE CASCADE,
+
+    FOREIGN KEY (node_digest)
+        REFERENCES nodes(digest)
+        ON DELETE RESTRICT
+);
+
+CREATE INDEX IF NOT EXISTS executions_run_id_idx
+    ON executions(run_id);
+
+CREATE TABLE IF NOT EXISTS node_matrix (
+    node_digest TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    parameter_values TEXT NOT NULL,
+
+    PRIMARY KEY (node_digest, position),
+
+    FOREIGN KEY (node_digest)
+        REFERENCES nodes(digest)
+        ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS artifacts (
+    execution_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    file_type TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    lines INTEGER NOT NULL,
+    checksum TEXT NOT NULL,
+    first_write TEXT,
+    last_write TEXT,
+
+    PRIMARY KEY (execution_id, name),
+
+    FOREIGN KEY (execution_id)
+        REFERENCES executions(id)
+        ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS artifacts_size_idx
+    ON artifacts(size);
+
+CREATE INDEX IF NOT EXISTS artifacts_checksum_idx
+    ON artifacts(checksum);
+
+CREATE TABLE IF NOT EXISTS execution_parameters (
+    execution_id INTEGER PRIMARY KEY,
+    parameters TEXT NOT NULL,
+
+    FOREIGN KEY (execution_id)
+        REFERENCES executions(id)
+        ON DELETE CASCADE
+);
+"""
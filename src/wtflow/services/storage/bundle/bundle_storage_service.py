@@ -0,0 +1,346 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import pathlib
+import threading
+from contextlib import closing, contextmanager
+from dataclasses import dataclass
+from io import BufferedWriter
+from typing import Callable, Generator, Iterator
+
+import wtflow
+from wtflow.infra.info import RunInfo
+from wtflow.services.storage.local.line_index import index_path
+from wtflow.services.storage.local.local_storage_service import (
+    DEFAULT_MAX_OPEN_FILES,
+    HandlePool,
+    LocalArtifactWriter,
+    LocalStorageService,
+)
+from wtflow.services.storage.storage_service import ArtifactWriter, StorageService
+
+DEFAULT_SPILL_THRESHOLD = 64 * 1024
+DEFAULT_BUNDLE_SIZE = 1024 * 1024 * 1024
+
+_BUNDLE_DIR = ".bundles"
+_INDEX_NAME = "index.jsonl"
+
+
+@dataclass(frozen=True, slots=True)
+class BundleEntry:
+    """Where an artifact is packed: ``length`` bytes at ``offset`` of bundle number ``bundle``."""
+
+    bundle: int
+    offset: int
+    length: int
+
+
+class RunBundles:
+    """The bundle files of one run and the index of the artifacts packed in them.
+
+    Artifacts are appended whole to the current bundle, which is rolled over
+    once it holds ``bundle_size`` bytes. Every append adds a line to the
+    index; an artifact stored again gets a new line, and the last line of an
+    artifact wins. A line without a bundle records that the artifact spilled
+    to a standalone file. Appends may come from several threads.
+    """
+
+    def __init__(self, directory: pathlib.Path, bundle_size: int = DEFAULT_BUNDLE_SIZE) -> None:
+        self.directory = directory
+        self.bundle_size = bundle_size
+        self._lock = threading.Lock()
+        self._bundle = -1
+        self._offset = 0
+        self._data: BufferedWriter | None = None
+        self._index: BufferedWriter | None = None
+        self._entries: dict[tuple[str, str], BundleEntry | None] = {}
+        self._indexed = 0
+
+    @property
+    def index_path(self) -> pathlib.Path:
+        return self.directory / _INDEX_NAME
+
+    def bundle_path(self, bundle: int) -> pathlib.Path:
+        return self.directory / f"{bundle}.dat"
+
+    def _open(self, length: int) -> BufferedWriter:
+        if self._bundle < 0:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            bundles = [int(path.stem) for path in self.directory.glob("*.dat") if path.stem.isdigit()]
+            self._bundle = max(bundles, default=0)
+        if self._data is None:
+            self._data = self.bundle_path(self._bundle).open("ab")
+            self._offset = self._data.tell()
+        if self._offset and self._offset + length > self.bundle_size:
+            self._data.close()
+            self._bundle += 1
+            self._data = self.bundle_path(self._bundle).open("ab")
+            self._offset = 0
+        if self._index is None:
+            self._index = self.index_path.open("ab")
+        return self._data
+
+    def _record(self, key: tuple[str, str], entry: BundleEntry | None) -> None:
+        assert self._index is not None
+        location = [] if entry is None else [entry.bundle, entry.offset, entry.length]
+        self._index.write(json.dumps([*key, *location]).encode() + b"\n")
+
+    def append(self, key: tuple[str, str], data: bytes) -> BundleEntry:
+        with self._lock:
+            bundle = self._open(len(data))
+            entry = BundleEntry(self._bundle, self._offset, len(data))
+            bundle.write(data)
+            self._offset += len(data)
+            self._record(key, entry)
+            return entry
+
+    def spilled(self, key: tuple[str, str]) -> None:
+        """Record that the artifact ``key`` is now in its standalone file."""
+        with self._lock:
+            self._open(0)
+            self._record(key, None)
+
+    def lookup(self, key: tuple[str, str]) -> BundleEntry | None:
+        """Return where ``key`` is packed, or ``None`` if it is not in a bundle."""
+        with self._lock:
+            for handle in (self._data, self._index):
+                if handle is not None:
+                    handle.flush()
+            self._load()
+            return self._entries.get(key)
+
+    def _load(self) -> None:
+        # Reads what was appended to the index since the last lookup.
+        try:
+            f = self.index_path.open("rb")
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(self._indexed)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Still being written.
+                self._indexed += len(line)
+                try:
+                    node, artifact, *location = json.loads(line)
+                except ValueError:
+                    continue
+                self._entries[node, artifact] = BundleEntry(*location) if location else None
+
+    def read(self, entry: BundleEntry) -> bytes:
+        with self.bundle_path(entry.bundle).open("rb") as f:
+            return os.pread(f.fileno(), entry.length, entry.offset)
+
+    def close(self) -> None:
+        """Close the files; they are reopened by the next append."""
+        with self._lock:
+            for handle in (self._data, self._index):
+                if handle is not None:
+                    handle.close()
+            self._data = self._index = None
+            self._bundle = -1
+            self._entries.clear()
+            self._indexed = 0
+
+
+class BundleArtifactWriter(ArtifactWriter):
+    """Buffers an artifact in memory to pack it into a bundle when it is closed.
+
+    Once more than ``threshold`` bytes are written, the artifact spills to a
+    standalone file at ``path`` and the rest of it is streamed there.
+    """
+
+    def __init__(
+        self,
+        path: pathlib.Path,
+        threshold: int,
+        on_close: Callable[[bytes | None], None],
+        pool: HandlePool | None = None,
+    ) -> None:
+        self.path = path
+        self.threshold = threshold
+        self.pool = pool
+        self._on_close = on_close
+        self._buffer = bytearray()
+        self._written = False
+        self._spill: LocalArtifactWriter | None = None
+
+    def write(self, data: bytes) -> int:
+        self._written = True
+        if self._spill is not None:
+            return self._spill.write(data)
+        if len(self._buffer) + len(data) <= self.threshold:
+            self._buffer += data
+            return len(data)
+        # Replaces what an earlier write of the artifact left there.
+        self.path.unlink(missing_ok=True)
+        index_path(self.path).unlink(missing_ok=True)
+        self._spill = LocalArtifactWriter(self.path, self.pool)
+        self._spill.write(bytes(self._buffer))
+        self._buffer.clear()
+        return self._spill.write(data)
+
+    def close(self) -> None:
+        if self._spill is not None:
+            self._spill.close()
+        if self._written:
+            self._written = False
+            self._on_close(None if self._spill is not None else bytes(self._buffer))
+            self._buffer.clear()
+
+
+class BundleStorageService(StorageService):
+    """Stores artifacts under ``base_path``, packing the small ones of a run into a few files.
+
+    Artifacts of up to ``spill_threshold`` bytes are appended to the bundles
+    of their run under ``<workflow>/<run>/.bundles``, found through an
+    offset/length index; larger ones spill to the standalone files of
+    :class:`LocalStorageService`. A packed artifact is only readable once its
+    writer is closed. Storing an artifact again replaces it. :meth:`flush`
+    forgets the runs no artifact is being written for.
+    """
+
+    def __init__(
+        self,
+        base_path: pathlib.Path | str,
+        max_open_files: int = DEFAULT_MAX_OPEN_FILES,
+        spill_threshold: int = DEFAULT_SPILL_THRESHOLD,
+        bundle_size: int = DEFAULT_BUNDLE_SIZE,
+    ) -> None:
+        super().__init__()
+        self.base_path = pathlib.Path(base_path)
+        self.files = LocalStorageService(base_path, max_open_files)
+        self.spill_threshold = spill_threshold
+        self.bundle_size = bundle_size
+        self._runs: dict[pathlib.Path, RunBundles] = {}
+        # How many artifacts are being written for each run.
+        self._writing: dict[pathlib.Path, int] = {}
+        self._runs_lock = threading.Lock()
+
+    def _bundles(self, run_info: RunInfo, writing: int = 0) -> RunBundles:
+        directory = self.base_path / run_info.graph.name / str(run_info.run_id) / _BUNDLE_DIR
+        with self._runs_lock:
+            bundles = self._runs.get(directory)
+            if bundles is None:
+                bundles = self._runs[directory] = RunBundles(directory, self.bundle_size)
+            if writing:
+                self._writing[directory] = self._writing.get(directory, 0) + writing
+                if not self._writing[directory]:
+                    del self._writing[directory]
+            return bundles
+
+    @contextmanager
+    def _writing_to(self, run_info: RunInfo) -> Generator[RunBundles, None, None]:
+        bundles = self._bundles(run_info, writing=1)
+        try:
+            yield bundles
+        finally:
+            self._bundles(run_info, writing=-1)
+
+    @staticmethod
+    def _key(node: wtflow.Node, artifact: wtflow.Artifact) -> tuple[str, str]:
+        return node.name, f"{artifact.name}.{artifact.file_type}"
+
+    def _path(self, run_info: RunInfo, node: wtflow.Node, artifact: wtflow.Artifact) -> pathlib.Path:
+        return self.files._get_path(run_info, node, artifact.name, artifact.file_type)
+
+    @contextmanager
+    def open_artifact(
+        self,
+        run_info: RunInfo,
+        node: wtflow.Node,
+        artifact: wtflow.Artifact,
+    ) -> Generator[BundleArtifactWriter, None, None]:
+        key = self._key(node, artifact)
+        with self._writing_to(run_info) as bundles:
+
+            def _on_close(data: bytes | None) -> None:
+                if data is None:
+                    bundles.spilled(key)
+                else:
+                    bundles.append(key, data)
+
+            path = self._path(run_info, node, artifact)
+            with closing(BundleArtifactWriter(path, self.spill_threshold, _on_close, self.files.pool)) as writer:
+                yield writer
+
+    async def store_file(
+        self,
+        run_info: RunInfo,
+        node: wtflow.Node,
+        artifact: wtflow.Artifact,
+        source: pathlib.Path,
+    ) -> None:
+        key = self._key(node, artifact)
+        with self._writing_to(run_info) as bundles:
+
+            def _pack() -> bool:
+                with source.open("rb") as f:
+                    data = f.read(self.spill_threshold + 1)
+                if len(data) > self.spill_threshold:
+                    return False
+                bundles.append(key, data)
+                return True
+
+            if not await asyncio.to_thread(_pack):
+                await self.files.store_file(run_info, node, artifact, source)
+                bundles.spilled(key)
+
+    def _entry(self, run_info: RunInfo, node: wtflow.Node, artifact: wtflow.Artifact) -> BundleEntry | None:
+        return self._bundles(run_info).lookup(self._key(node, artifact))
+
+    def read_artifact(
+        self,
+        run_info: RunInfo,
+        node: wtflow.Node,
+        artifact: wtflow.Artifact,
+    ) -> bytes:
+        entry = self._entry(run_info, node, artifact)
+        if entry is None:
+            return self.files.read_artifact(run_info, node, artifact)
+        return self._bundles(run_info).read(entry)
+
+    def local_path(
+        self,
+        run_info: RunInfo,
+        node: wtflow.Node,
+        artifact: wtflow.Artifact,
+    ) -> pathlib.Path | None:
+        # Only spilled artifacts have a file of their own.
+        if self._entry(run_info, node, artifact) is not None:
+            return None
+        return self.files.local_path(run_info, node, artifact)
+
+    def tail_artifact(
+        self,
+        run_info: RunInfo,
+        node: wtflow.Node,
+        artifact: wtflow.Artifact,
+        n: int,
+    ) -> list[bytes]:
+        # Packed artifacts are small enough to be split whole.
+        if self._entry(run_info, node, artifact) is None:
+            return self.files.tail_artifact(run_info, node, artifact, n)
+        return super().tail_artifact(run_info, node, artifact, n)
+
+    def iter_lines(
+        self,
+        run_info: RunInfo,
+        node: wtflow.Node,
+        artifact: wtflow.Artifact,
+        start: int = 0,
+        end: int | None = None,
+    ) -> Iterator[bytes]:
+        if self._entry(run_info, node, artifact) is None:
+            return self.files.iter_lines(run_info, node, artifact, start, end)
+        return super().iter_lines(run_info, node, artifact, start, end)
+
+    async def flush(self, run_info: RunInfo | None = None) -> None:
+        with self._runs_lock:
+            runs = list(self._runs.values())
+            # Closed bundles reopen on demand, so only those still being written to need to be kept.
+            self._runs = {directory: self._runs[directory] for directory in self._writing}
+        for bundles in runs:
+            bundles.close()
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import pathlib
+import sqlite3
+import threading
+import uuid
+from contextlib import closing, contextmanager
+from typing import Callable, Generator
+
+import wtflow
+from wtflow.infra.info import RunInfo
+from wtflow.services.storage.local.file_copy import copy_file
+from wtflow.services.storage.local.line_index import index_path
+from wtflow.services.storage.local.local_storage_service import (
+    DEFAULT_MAX_OPEN_FILES,
+    HandlePool,
+    LocalArtifactWriter,
+    LocalStorageService,
+)
+
+
+def _hash_file(path: pathlib.Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(1024 * 1024):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class CASArtifactWriter(LocalArtifactWriter):
+    """Streams an artifact into a temporary file while hashing it.
+
+    On close the file is handed to ``on_commit`` together with its digest, which
+    moves it into the blob store (or drops it when the blob already exists).
+    """
+
+    def __init__(
+        self,
+        path: pathlib.Path,
+        on_commit: Callable[[pathlib.Path, str], None],
+        pool: HandlePool | None = None,
+    ) -> None:
+        super().__init__(path, pool)
+        self._hash = hashlib.sha256()
+        self._on_commit = on_commit
+        self._written = False
+
+    def write(self, data: bytes) -> int:
+        self._hash.update(data)
+        self._written = True
+        return super().write(data)
+
+    def close(self) -> None:
+        super().close()
+        if self._written:
+            self._written = False
+            self._on_commit(self.path, self._hash.hexdigest())
+
+
+class CASStorageService(LocalStorageService):
+    """Content-addressed variant of :class:`LocalStorageService`.
+
+    Every artifact is stored once under ``blobs/<digest>`` no matter how many
+    runs or nodes produced it; ``index.db`` maps run/workflow/node/artifact to
+    its blob. The mappings are kept in memory until :meth:`flush` writes them
+    in one transaction. Opening an artifact that is already indexed replaces
+    its content.
+    """
+
+    def __init__(self, base_path: pathlib.Path | str, max_open_files: int = DEFAULT_MAX_OPEN_FILES) -> None:
+        super().__init__(base_path, max_open_files)
+        self.blobs_path = self.base_path / "blobs"
+        self.tmp_path = self.base_path / "tmp"
+        self.index_path = self.base_path / "index.db"
+        self.base_path.mkdir(parents=True, exist_ok=True)
+        self._create_tables()
+        # Refs not written to the index yet.
+        self._refs: dict[tuple[str, str, str, str], str] = {}
+        self._refs_lock = threading.Lock()
+
+    @contextmanager
+    def _get_connection(self) -> Generator[sqlite3.Connection]:
+        with closing(sqlite3.connect(self.index_path)) as cx:
+            yield cx
+
+    def _create_tables(self) -> None:
+        with self._get_connection() as conn:
+            # Indexes from before the workflow was part of the key are rebuilt.
+            key = {row[1] for row in conn.execute("PRAGMA table_info(refs)") if row[5]}
+            if key and "workflow" not in key:
+                conn.execute("ALTER TABLE refs RENAME TO refs_old")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS refs (
+                    run_id TEXT NOT NULL,
+                    workflow TEXT NOT NULL,
+                    node TEXT NOT NULL,
+                    artifact TEXT NOT NULL,
+                    digest TEXT NOT NULL,
+
+                    PRIMARY KEY (run_id, workflow, node, artifact)
+                )
+                """
+            )
+            if key and "workflow" not in key:
+                conn.execute(
+                    """
+                    INSERT INTO refs (run_id, workflow, node, artifact, digest)
+                    SELECT run_id, workflow, node, artifact, digest FROM refs_old
+                    """
+                )
+                conn.execute("DROP TABLE refs_old")
+            conn.commit()
+
+    def _blob_path(self, digest: str) -> pathlib.Path:
+        return self.blobs_path / digest[:2] / digest
+
+    def _commit_blob(self, key: tuple[str, str, str, str], tmp: pathlib.Path, digest: str) -> None:
+        blob = self._blob_path(digest)
+        if blob.exists():
+            tmp.unlink()
+            index_path(tmp).unlink(missing_ok=True)
+        else:
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            if index_path(tmp).exists():
+                os.replace(index_path(tmp), index_path(blob))
+            os.replace(tmp, blob)
+        with self._refs_lock:
+            self._refs[key] = digest
+
+    def _write_refs(self, refs: dict[tuple[str, str, str, str], str]) -> None:
+        with self._get_connection() as conn:
+            conn.executemany(
+                """
+                INSERT INTO refs (run_id, workflow, node, artifact, digest)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(run_id, workflow, node, artifact) DO UPDATE SET digest = excluded.digest
+                """,
+                [(*key, digest) for key, digest in refs.items()],
+            )
+            conn.commit()
+
+    async def flush(self, run_info: RunInfo | None = None) -> None:
+        with self._refs_lock:
+            refs = dict(self._refs)
+        if not refs:
+            return
+        await asyncio.to_thread(self._write_refs, refs)
+        with self._refs_lock:
+            for key, digest in refs.items():
+                # Unless it was replaced in the meantime.
+                if self._refs.get(key) == digest:
+                    del self._refs[key]
+
+    @staticmethod
+    def _key(run_info: RunInfo, node: wtflow.Node, artifact: wtflow.Artifact) -> tuple[str, str, str, str]:
+        return str(run_info.run_id), run_info.graph.name, node.name, f"{artifact.name}.{artifact.file_type}"
+
+    @contextmanager
+    def open_artifact(
+        self,
+        run_info: RunInfo,
+        node: wtflow.Node,
+        artifact: wtflow.Artifact,
+    ) -> Generator[CASArtifactWriter, None, None]:
+        key = self._key(run_info, node, artifact)
+        tmp = self.tmp_path / uuid.uuid4().hex
+
+        def _on_commit(path: pathlib.Path, digest: str) -> None:
+            self._commit_blob(key, path, digest)
+
+        with closing(CASArtifactWriter(tmp, _on_commit, self.pool)) as writer:
+            yield writer
+
+    async def store_file(
+        self,
+        run_info: RunInfo,
+        node: wtflow.Node,
+        artifact: wtflow.Artifact,
+        source: pathlib.Path,
+    ) -> None:
+        key = self._key(run_info, node, artifact)
+        tmp = self.tmp_path / uuid.uuid4().hex
+
+        def _store() -> None:
+            tmp.parent.mkdir(parents=True, exist_ok=True)
+            copy_file(source, tmp)
+            self._commit_blob(key, tmp, _hash_file(tmp))
+
+        await asyncio.to_thread(_store)
+
+    def _resolve_path(
+        self,
+        run_info: RunInfo,
+        node: wtflow.Node,
+        artifact: wtflow.Artifact,
+    ) -> pathlib.Path:
+        key = self._key(run_info, node, artifact)
+        with self._refs_lock:
+            digest = self._refs.get(key)
+        if digest is None:
+            with self._get_connection() as conn:
+                row = conn.execute(
+                    "SELECT digest FROM refs WHERE run_id = ? AND workflow = ? AND node = ? AND artifact = ?",
+                    key,
+                ).fetchone()
+            if row is None:
+                raise FileNotFoundError(f"Artifact {artifact.name} of node {node.name!r} is not stored")
+            digest = row[0]
+        return self._blob_path(digest)
+
+    def local_path(
+        self,
+        run_info: RunInfo,
+        node: wtflow.Node,
+        artifact: wtflow.Artifact,
+    ) -> pathlib.Path | None:
+        try:
+            return super().local_path(run_info, node, artifact)
+        except FileNotFoundError:
+            return None
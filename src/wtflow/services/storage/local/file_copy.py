@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import errno
+import fcntl
+import os
+import pathlib
+import shutil
+
+FICLONE = 0x40049409
+_CHUNK = 1 << 30
+_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EOPNOTSUPP, errno.EINVAL, errno.ENOTTY, errno.EBADF, errno.EPERM}
+
+
+class ShortCopyError(OSError):
+    """Fewer bytes were copied than the source had when the copy started."""
+
+
+def _reflink(src: int, dst: int, size: int) -> None:
+    fcntl.ioctl(dst, FICLONE, src)
+
+
+def _copy_file_range(src: int, dst: int, size: int) -> None:
+    offset = 0
+    while offset < size:
+        copied = os.copy_file_range(src, dst, min(_CHUNK, size - offset), offset, offset)
+        if copied == 0:
+            raise ShortCopyError(f"copy_file_range stopped after {offset} of {size} bytes")
+        offset += copied
+
+
+def _sendfile(src: int, dst: int, size: int) -> None:
+    offset = 0
+    while offset < size:
+        sent = os.sendfile(dst, src, offset, min(_CHUNK, size - offset))
+        if sent == 0:
+            raise ShortCopyError(f"sendfile stopped after {offset} of {size} bytes")
+        offset += sent
+
+
+_METHODS = [("reflink", _reflink)]
+if hasattr(os, "copy_file_range"):
+    _METHODS.append(("copy_file_range", _copy_file_range))
+if hasattr(os, "sendfile"):
+    _METHODS.append(("sendfile", _sendfile))
+
+
+def copy_file(source: pathlib.Path, destination: pathlib.Path, link: bool = False) -> str:
+    """Copy ``source`` to ``destination`` without reading it into Python; return the method used.
+
+    The cheapest method available is used: a hardlink if ``link`` is set (the
+    source must then not be modified afterwards), a reflink on copy-on-write
+    filesystems, then ``copy_file_range`` and ``sendfile``, which copy inside
+    the kernel, and ``shutil.copyfile`` last. A method that stops short of
+    the source's size gives way to the next one; if even the last one does,
+    the source was truncated while it was copied and ``ShortCopyError`` is
+    raised.
+    """
+    destination.unlink(missing_ok=True)
+    if link:
+        try:
+            os.link(source, destination)
+            return "hardlink"
+        except OSError:
+            pass
+
+    with source.open("rb") as src, destination.open("wb") as dst:
+        size = os.fstat(src.fileno()).st_size
+        for name, method in _METHODS:
+            try:
+                method(src.fileno(), dst.fileno(), size)
+                return name
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED and not isinstance(e, ShortCopyError):
+                    raise
+                dst.seek(0)
+                dst.truncate()
+                src.seek(0)
+
+    shutil.copyfile(source, destination)
+    if (copied := destination.stat().st_size) < size:
+        raise ShortCopyError(f"Only {copied} of {size} bytes of {source} could be copied")
+    return "copy"
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import mmap
+import pathlib
+from array import array
+from contextlib import contextmanager
+from typing import Generator, Iterator
+
+INDEX_SUFFIX = ".idx"
+_TYPECODE = "Q"
+_ITEMSIZE = array(_TYPECODE).itemsize
+_FLUSH_THRESHOLD = 4096
+
+
+def index_path(path: pathlib.Path) -> pathlib.Path:
+    return path.with_name(path.name + INDEX_SUFFIX)
+
+
+def _line_ends(data: bytes | mmap.mmap, offset: int = 0, start: int = 0, end: int | None = None) -> array[int]:
+    ends = array(_TYPECODE)
+    end = len(data) if end is None else end
+    pos = data.find(b"\n", start, end)
+    while pos != -1:
+        ends.append(offset + pos + 1)
+        pos = data.find(b"\n", pos + 1, end)
+    return ends
+
+
+def _last_offset(path: pathlib.Path) -> int | None:
+    """Return the last recorded line end, ``0`` for an empty index or ``None`` if the index is unusable."""
+    try:
+        with index_path(path).open("rb") as f:
+            size = f.seek(0, 2)
+            if size % _ITEMSIZE:
+                return None
+            if size == 0:
+                return 0
+            f.seek(size - _ITEMSIZE)
+            return array(_TYPECODE, f.read(_ITEMSIZE))[0]
+    except FileNotFoundError:
+        return None
+
+
+def _is_valid(path: pathlib.Path, size: int) -> bool:
+    last = _last_offset(path)
+    return last is not None and last <= size
+
+
+def rebuild_index(path: pathlib.Path) -> None:
+    size = path.stat().st_size
+    if size == 0:
+        offsets = array(_TYPECODE)
+    else:
+        with path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offsets = _line_ends(data)
+    with index_path(path).open("wb") as out:
+        offsets.tofile(out)
+
+
+def ensure_index(path: pathlib.Path) -> None:
+    """Bring the sidecar index of ``path`` up to date with the data file.
+
+    A missing or corrupt index is rebuilt; lines appended after the last
+    indexed offset are added to it.
+    """
+    size = path.stat().st_size
+    last = _last_offset(path)
+    if last is None or last > size:
+        rebuild_index(path)
+    elif last < size:
+        with path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            tail = _line_ends(data, start=last)
+        if tail:
+            with index_path(path).open("ab") as out:
+                tail.tofile(out)
+
+
+class LineIndexWriter:
+    """Records the end offset of every line written to an append-only file.
+
+    Offsets are buffered in memory and appended to the sidecar index in batches,
+    so no file descriptor is held between flushes.
+    """
+
+    def __init__(self, path: pathlib.Path, offset: int = 0) -> None:
+        self.path = index_path(path)
+        self._offset = offset
+        self._pending = array(_TYPECODE)
+
+    @classmethod
+    def open(cls, path: pathlib.Path) -> LineIndexWriter:
+        ensure_index(path)
+        return cls(path, offset=path.stat().st_size)
+
+    def update(self, data: bytes) -> None:
+        self._pending.extend(_line_ends(data, offset=self._offset))
+        self._offset += len(data)
+        if len(self._pending) >= _FLUSH_THRESHOLD:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        with self.path.open("ab") as f:
+            self._pending.tofile(f)
+        del self._pending[:]
+
+    def close(self) -> None:
+        self.flush()
+
+
+class MappedLines:
+    """Random access to the lines of a file through its sidecar index.
+
+    The data file and the index are memory-mapped, so looking up any line range
+    costs the same regardless of the file size. Lines written after the last
+    flushed index entry (e.g. by a writer that is still running) are indexed in
+    memory.
+    """
+
+    def __init__(
+        self,
+        data: mmap.mmap | bytes,
+        indexed: memoryview | array[int],
+        unindexed: array[int],
+        size: int,
+    ) -> None:
+        self._data = data
+        self._indexed = indexed
+        self._unindexed = unindexed
+        self._size = size
+        self._complete = len(indexed) + len(unindexed)
+
+    def _end(self, i: int) -> int:
+        if i < len(self._indexed):
+            return self._indexed[i]
+        return self._unindexed[i - len(self._indexed)]
+
+    def __len__(self) -> int:
+        last = self._end(self._complete - 1) if self._complete else 0
+        return self._complete + (1 if last < self._size else 0)
+
+    def __getitem__(self, i: int) -> bytes:
+        start = self._end(i - 1) if i > 0 else 0
+        end = self._end(i) if i < self._complete else self._size
+        return self._data[start:end]
+
+    def lines(self, start: int = 0, end: int | None = None) -> Iterator[bytes]:
+        start, end, _ = slice(start, end).indices(len(self))
+        for i in range(start, end):
+            yield self[i]
+
+
+@contextmanager
+def map_lines(path: pathlib.Path) -> Generator[MappedLines, None, None]:
+    size = path.stat().st_size
+    if size == 0:
+        yield MappedLines(b"", array(_TYPECODE), array(_TYPECODE), 0)
+        return
+
+    if not _is_valid(path, size):
+        rebuild_index(path)
+    with (
+        path.open("rb") as f,
+        mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data,
+        index_path(path).open("rb") as idx,
+    ):
+        indexed_size = idx.seek(0, 2) // _ITEMSIZE * _ITEMSIZE
+        if indexed_size == 0:
+            yield MappedLines(data, array(_TYPECODE), _line_ends(data, end=size), size)
+            return
+        with mmap.mmap(idx.fileno(), indexed_size, access=mmap.ACCESS_READ) as index:
+            indexed = memoryview(index).cast("Q")
+            try:
+                unindexed = _line_ends(data, start=indexed[-1], end=size)
+                yield MappedLines(data, indexed, unindexed, size)
+            finally:
+                indexed.release()
@@ -1,52 +1,190 @@
+from __future__ import annotations
+
+import asyncio
 import pathlib
+from collections import OrderedDict
 from contextlib import closing, contextmanager
 from io import BufferedWriter
-from typing import Generator
+from typing import Generator, Iterator
 
 import wtflow
+from wtflow.infra.info import RunInfo
+from wtflow.services.storage.local.file_copy import copy_file
+from wtflow.services.storage.local.line_index import LineIndexWriter, index_path, map_lines
 from wtflow.services.storage.storage_service import ArtifactWriter, StorageService
 
+DEFAULT_MAX_OPEN_FILES = 256
+
+
+class HandlePool:
+    """Bounds the number of artifact files held open at the same time.
+
+    When the budget is exhausted the least recently written writer has its file
+    closed; it is reopened in append mode on its next write.
+    """
+
+    def __init__(self, max_open: int = DEFAULT_MAX_OPEN_FILES) -> None:
+        if max_open < 1:
+            raise ValueError(f"max_open must be positive, got {max_open}")
+        self.max_open = max_open
+        self._open: OrderedDict[LocalArtifactWriter, None] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._open)
+
+    def acquire(self, writer: "LocalArtifactWriter") -> None:
+        while len(self._open) >= self.max_open:
+            lru, _ = self._open.popitem(last=False)
+            lru.suspend()
+        self._open[writer] = None
+
+    def touch(self, writer: "LocalArtifactWriter") -> None:
+        self._open.move_to_end(writer)
+
+    def release(self, writer: "LocalArtifactWriter") -> None:
+        self._open.pop(writer, None)
+
 
 class LocalArtifactWriter(ArtifactWriter):
-    def __init__(self, path: pathlib.Path) -> None:
+    def __init__(self, path: pathlib.Path, pool: HandlePool | None = None) -> None:
         self.path = path
+        self.pool = pool
         self._handle: BufferedWriter | None = None
+        self._index: LineIndexWriter | None = None
 
     def write(self, data: bytes) -> int:
         if self._handle is None:
-            self.path.parent.mkdir(parents=True, exist_ok=True)
-            self._handle = self.path.open("ab")
+            self._open()
+        elif self.pool is not None:
+            self.pool.touch(self)
+        assert self._handle is not None and self._index is not None
+        self._index.update(data)
         return self._handle.write(data)
 
-    def close(self) -> None:
+    def _open(self) -> None:
+        if self.pool is not None:
+            self.pool.acquire(self)
+        if self._index is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.touch()
+            self._index = LineIndexWriter.open(self.path)
+        self._handle = self.path.open("ab")
+
+    def suspend(self) -> None:
+        """Close the underlying file, keeping the writer usable."""
         if self._handle is not None:
             self._handle.close()
             self._handle = None
+        if self._index is not None:
+            self._index.flush()
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.release(self)
+        self.suspend()
+        self._index = None
 
 
 class LocalStorageService(StorageService):
-    def __init__(self, base_path: pathlib.Path | str) -> None:
+    """Stores artifacts as files under ``base_path``.
+
+    Collected files are copied without passing through Python; with
+    ``link_artifacts`` they are hardlinked where possible, so the node must
+    not modify them afterwards.
+    """
+
+    def __init__(
+        self,
+        base_path: pathlib.Path | str,
+        max_open_files: int = DEFAULT_MAX_OPEN_FILES,
+        link_artifacts: bool = False,
+    ) -> None:
         super().__init__()
         self.base_path = pathlib.Path(base_path)
+        self.pool = HandlePool(max_open_files)
+        self.link_artifacts = link_artifacts
 
     def _get_path(
         self,
-        workflow: wtflow.Graph,
+        run_info: RunInfo,
         node: wtflow.Node,
         name: str,
         file_type: str,
     ) -> pathlib.Path:
-        workflow_id = workflow.name
+        workflow_id = run_info.graph.name
+        run_id = run_info.run_id
         node_id = node.name
-        return self.base_path / str(workflow_id) / str(node_id) / f"{name}.{file_type}"
+        return self.base_path / str(workflow_id) / str(run_id) / str(node_id) / f"{name}.{file_type}"
 
     @contextmanager
     def open_artifact(
         self,
-        workflow: wtflow.Graph,
+        run_info: RunInfo,
         node: wtflow.Node,
         artifact: wtflow.Artifact,
     ) -> Generator[LocalArtifactWriter, None, None]:
-        path = self._get_path(workflow, node, artifact.name, artifact.file_type)
-        with closing(LocalArtifactWriter(path)) as writer:
+        path = self._get_path(run_info, node, artifact.name, artifact.file_type)
+        with closing(LocalArtifactWriter(path, self.pool)) as writer:
             yield writer
+
+    async def store_file(
+        self,
+        run_info: RunInfo,
+        node: wtflow.Node,
+        artifact: wtflow.Artifact,
+        source: pathlib.Path,
+    ) -> None:
+        path = self._get_path(run_info, node, artifact.name, artifact.file_type)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        index_path(path).unlink(missing_ok=True)
+        await asyncio.to_thread(copy_file, source, path, self.link_artifacts)
+
+    def _resolve_path(
+        self,
+        run_info: RunInfo,
+        node: wtflow.Node,
+        artifact: wtflow.Artifact,
+    ) -> pathlib.Path:
+        return self._get_path(run_info, node, artifact.name, artifact.file_type)
+
+    def read_artifact(
+        self,
+        run_info: RunInfo,
+        node: wtflow.Node,
+        artifact: wtflow.Artifact,
+    ) -> bytes:
+        return self._resolve_path(run_info, node, artifact).read_bytes()
+
+    def local_path(
+        self,
+        run_info: RunInfo,
+        node: wtflow.Node,
+        artifact: wtflow.Artifact,
+    ) -> pathlib.Path | None:
+        path = self._resolve_path(run_info, node, artifact)
+        return path if path.exists() else None
+
+    def tail_artifact(
+        self,
+        run_info: RunInfo,
+        node: wtflow.Node,
+        artifact: wtflow.Artifact,
+        n: int,
+    ) -> list[bytes]:
+        if n <= 0:
+            return []
+        path = self._resolve_path(run_info, node, artifact)
+        with map_lines(path) as lines:
+            return list(lines.lines(max(len(lines) - n, 0)))
+
+    def iter_lines(
+        self,
+        run_info: RunInfo,
+        node: wtflow.Node,
+        artifact: wtflow.Artifact,
+        start: int = 0,
+        end: int | None = None,
+    ) -> Iterator[bytes]:
+        path = self._resolve_path(run_info, node, artifact)
+        with map_lines(path) as lines:
+            yield from lines.lines(start, end)
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import datetime
+import hashlib
+import hmac
+import http.client
+import queue
+import urllib.parse
+from contextlib import contextmanager
+from typing import Generator
+from xml.etree import ElementTree
+
+_EMPTY_SHA256 = hashlib.sha256(b"").hexdigest()
+_S3_NS = "{http://s3.amazonaws.com/doc/2006-03-01/}"
+
+
+class S3Error(Exception):
+    def __init__(self, status: int, reason: str, body: bytes) -> None:
+        super().__init__(f"S3 request failed with {status} {reason}: {body[:200]!r}")
+        self.status = status
+
+
+def _quote(value: str, safe: str = "-_.~") -> str:
+    return urllib.parse.quote(value, safe=safe)
+
+
+def _hmac(key: bytes, msg: str) -> bytes:
+    return hmac.new(key, msg.encode(), hashlib.sha256).digest()
+
+
+class S3Client:
+    """Minimal, thread-safe client for the S3 multipart upload API.
+
+    Requests are signed with AWS Signature Version 4 and sent with path-style
+    addressing over a pool of keep-alive connections.
+    """
+
+    def __init__(
+        self,
+        endpoint_url: str,
+        bucket: str,
+        access_key: str,
+        secret_key: str,
+        region: str = "us-east-1",
+        timeout: float = 60.0,
+    ) -> None:
+        url = urllib.parse.urlsplit(endpoint_url)
+        if url.scheme not in ("http", "https") or not url.hostname:
+            raise ValueError(f"Invalid endpoint URL: {endpoint_url}")
+        self.scheme = url.scheme
+        self.host = url.netloc
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.timeout = timeout
+        self._connections: queue.LifoQueue[http.client.HTTPConnection] = queue.LifoQueue()
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, timeout=self.timeout)
+
+    @contextmanager
+    def _connection(self) -> Generator[http.client.HTTPConnection, None, None]:
+        try:
+            conn = self._connections.get_nowait()
+        except queue.Empty:
+            conn = self._new_connection()
+        try:
+            yield conn
+        except BaseException:
+            conn.close()
+            raise
+        else:
+            self._connections.put(conn)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._connections.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def _sign(
+        self,
+        method: str,
+        path: str,
+        query: dict[str, str],
+        payload_hash: str,
+        now: datetime.datetime,
+    ) -> dict[str, str]:
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        date = amz_date[:8]
+        headers = {
+            "host": self.host,
+            "x-amz-content-sha256": payload_hash,
+            "x-amz-date": amz_date,
+        }
+        signed_headers = ";".join(sorted(headers))
+        canonical_headers = "".join(f"{k}:{headers[k]}\n" for k in sorted(headers))
+        canonical_query = "&".join(f"{_quote(k)}={_quote(v)}" for k, v in sorted(query.items()))
+        canonical_request = "\n".join(
+            [method, path, canonical_query, canonical_headers, signed_headers, payload_hash],
+        )
+        scope = f"{date}/{self.region}/s3/aws4_request"
+        string_to_sign = "\n".join(
+            ["AWS4-HMAC-SHA256", amz_date, scope, hashlib.sha256(canonical_request.encode()).hexdigest()],
+        )
+        key = _hmac(f"AWS4{self.secret_key}".encode(), date)
+        for part in (self.region, "s3", "aws4_request"):
+            key = _hmac(key, part)
+        signature = hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+        headers["authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+            f"SignedHeaders={signed_headers}, Signature={signature}"
+        )
+        return headers
+
+    def request(
+        self,
+        method: str,
+        key: str,
+        query: dict[str, str] | None = None,
+        body: bytes = b"",
+    ) -> tuple[http.client.HTTPResponse, bytes]:
+        query = query or {}
+        path = f"/{_quote(self.bucket)}/{_quote(key, safe='/-_.~')}"
+        payload_hash = hashlib.sha256(body).hexdigest() if body else _EMPTY_SHA256
+        headers = self._sign(method, path, query, payload_hash, datetime.datetime.now(tz=datetime.timezone.utc))
+        headers["content-length"] = str(len(body))
+        url = path + ("?" + "&".join(f"{_quote(k)}={_quote(v)}" for k, v in query.items()) if query else "")
+        with self._connection() as conn:
+            conn.request(method, url, body=body, headers=headers)
+            response = conn.getresponse()
+            data = response.read()
+        if response.status >= 300:
+            raise S3Error(response.status, response.reason, data)
+        return response, data
+
+    def put_object(self, key: str, body: bytes) -> None:
+        self.request("PUT", key, body=body)
+
+    def get_object(self, key: str) -> bytes:
+        _, data = self.request("GET", key)
+        return data
+
+    def create_multipart_upload(self, key: str) -> str:
+        _, data = self.request("POST", key, {"uploads": ""})
+        root = ElementTree.fromstring(data)
+        upload_id = root.findtext(f"{_S3_NS}UploadId") or root.findtext("UploadId")
+        if not upload_id:
+            raise S3Error(200, "OK", data)
+        return upload_id
+
+    def upload_part(self, key: str, upload_id: str, part_number: int, body: bytes) -> str:
+        response, _ = self.request("PUT", key, {"partNumber": str(part_number), "uploadId": upload_id}, body)
+        return response.getheader("ETag", "")
+
+    def complete_multipart_upload(self, key: str, upload_id: str, etags: list[str]) -> None:
+        parts = "".join(
+            f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>"
+            for number, etag in enumerate(etags, start=1)
+        )
+        body = f"<CompleteMultipartUpload>{parts}</CompleteMultipartUpload>".encode()
+        self.request("POST", key, {"uploadId": upload_id}, body)
+
+    def abort_multipart_upload(self, key: str, upload_id: str) -> None:
+        self.request("DELETE", key, {"uploadId": upload_id})
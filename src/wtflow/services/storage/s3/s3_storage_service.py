@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from typing import Any, Callable, Generator
+from uuid import UUID
+
+import wtflow
+from wtflow.infra.info import RunInfo
+from wtflow.services.storage.s3.s3_client import S3Client
+from wtflow.services.storage.storage_service import ArtifactWriter, StorageService
+
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+# S3 rejects smaller parts, except for the last one, when the upload is completed.
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+def _copy_result(source: Future[Any], target: Future[None]) -> None:
+    error = source.exception()
+    if error is not None:
+        target.set_exception(error)
+    else:
+        target.set_result(None)
+
+
+def _when_all(futures: list[Future[str]], then: Future[None]) -> None:
+    """Resolve ``then`` once all ``futures`` are done, failing with the first error among them."""
+    remaining = len(futures)
+    lock = threading.Lock()
+
+    def _done(_: Future[str]) -> None:
+        nonlocal remaining
+        with lock:
+            remaining -= 1
+            if remaining:
+                return
+        for future in futures:
+            if future.exception() is not None:
+                _copy_result(future, then)
+                return
+        then.set_result(None)
+
+    for future in futures:
+        future.add_done_callback(_done)
+
+
+def _resolve(future: asyncio.Future[None]) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class PartBudget:
+    """Counts the parts waiting for or in upload, and lets the event loop wait while there are ``limit`` of them.
+
+    Parts finish on worker threads, which wake the waiters on their loops.
+    """
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.count = 0
+        self._lock = threading.Lock()
+        self._waiters: list[tuple[asyncio.AbstractEventLoop, asyncio.Future[None]]] = []
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.limit
+
+    def add(self) -> None:
+        with self._lock:
+            self.count += 1
+
+    def remove(self) -> None:
+        with self._lock:
+            self.count -= 1
+            if self.count >= self.limit:
+                return
+            waiters, self._waiters = self._waiters, []
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(_resolve, waiter)
+
+    async def wait(self) -> None:
+        """Wait until fewer than ``limit`` parts are pending."""
+        loop = asyncio.get_running_loop()
+        while True:
+            waiter = loop.create_future()
+            with self._lock:
+                if self.count < self.limit:
+                    return
+                self._waiters.append((loop, waiter))
+            await waiter
+
+
+class S3ArtifactWriter(ArtifactWriter):
+    """Uploads an artifact as a multipart upload while it is being written.
+
+    Output is cut into ``part_size`` parts that are uploaded on the service's
+    thread pool, so ``write`` and ``close`` never wait for the network. The
+    writer is ``congested`` while ``budget`` is full, and its reader should
+    wait for ``drain`` then; this bounds the memory held by parts waiting for
+    upload. ``close`` schedules the completion of the upload and returns a
+    future for it through ``on_close``.
+    """
+
+    def __init__(
+        self,
+        client: S3Client,
+        executor: ThreadPoolExecutor,
+        key: str,
+        part_size: int,
+        on_close: Callable[[Future[None]], None],
+        budget: PartBudget | None = None,
+    ) -> None:
+        self.client = client
+        self.executor = executor
+        self.key = key
+        self.part_size = part_size
+        self.budget = budget
+        self._on_close = on_close
+        self._buffer = bytearray()
+        self._upload_id: Future[str] | None = None
+        self._parts: list[Future[str]] = []
+
+    def write(self, data: bytes) -> int:
+        self._buffer += data
+        while len(self._buffer) >= self.part_size:
+            self._submit_part(bytes(self._buffer[: self.part_size]))
+            del self._buffer[: self.part_size]
+        return len(data)
+
+    @property
+    def congested(self) -> bool:
+        return self.budget is not None and self.budget.full
+
+    async def drain(self) -> None:
+        if self.budget is not None:
+            await self.budget.wait()
+
+    def _submit_part(self, body: bytes) -> None:
+        if self._upload_id is None:
+            self._upload_id = self.executor.submit(self.client.create_multipart_upload, self.key)
+        upload_id = self._upload_id
+        part_number = len(self._parts) + 1
+
+        def _upload() -> str:
+            return self.client.upload_part(self.key, upload_id.result(), part_number, body)
+
+        budget = self.budget
+        if budget is not None:
+            budget.add()
+        part = self.executor.submit(_upload)
+        if budget is not None:
+            part.add_done_callback(lambda _: budget.remove())
+        self._parts.append(part)
+
+    def close(self) -> None:
+        if self._upload_id is None:
+            body = bytes(self._buffer)
+            self._buffer.clear()
+            self._on_close(self.executor.submit(self.client.put_object, self.key, body))
+            return
+
+        if self._buffer:
+            self._submit_part(bytes(self._buffer))
+            self._buffer.clear()
+
+        upload_id = self._upload_id
+        parts = list(self._parts)
+        uploaded: Future[None] = Future()
+        completed: Future[None] = Future()
+
+        def _complete() -> None:
+            error = uploaded.exception()
+            if error is not None:
+                if upload_id.exception() is None:
+                    self.client.abort_multipart_upload(self.key, upload_id.result())
+                raise error
+            self.client.complete_multipart_upload(self.key, upload_id.result(), [part.result() for part in parts])
+
+        uploaded.add_done_callback(
+            lambda _: self.executor.submit(_complete).add_done_callback(lambda f: _copy_result(f, completed))
+        )
+        _when_all(parts, uploaded)
+        self._on_close(completed)
+
+
+class S3StorageService(StorageService):
+    """Stores artifacts in an S3-compatible bucket.
+
+    Objects are keyed ``<prefix><workflow>/<run_id>/<node>/<artifact>``. Uploads
+    run in the background; :meth:`flush` waits for those of a run, or all of
+    them, and raises the first of their errors. Once twice ``max_concurrency``
+    parts are waiting for or in upload, writers are congested until some
+    finish. Once no artifact is open, :meth:`flush` also releases the thread
+    pool and connections, which are set up again for the next artifact.
+    """
+
+    def __init__(
+        self,
+        client: S3Client,
+        prefix: str = "",
+        part_size: int = DEFAULT_PART_SIZE,
+        max_concurrency: int = 4,
+    ) -> None:
+        super().__init__()
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(f"S3 parts must be at least {MIN_PART_SIZE} bytes, not {part_size}")
+        self.client = client
+        self.prefix = prefix
+        self.part_size = part_size
+        self.max_concurrency = max_concurrency
+        self.budget = PartBudget(2 * max_concurrency)
+        self._executor: ThreadPoolExecutor | None = None
+        self._open = 0
+        self._pending: dict[UUID, set[Future[None]]] = {}
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="wtflow-s3")
+        return self._executor
+
+    def _get_key(self, run_info: RunInfo, node: wtflow.Node, artifact: wtflow.Artifact) -> str:
+        return f"{self.prefix}{run_info.graph.name}/{run_info.run_id}/{node.name}/{artifact.name}.{artifact.file_type}"
+
+    def _track(self, run_info: RunInfo, future: Future[None]) -> None:
+        self._pending.setdefault(run_info.run_id, set()).add(future)
+
+    @contextmanager
+    def open_artifact(
+        self,
+        run_info: RunInfo,
+        node: wtflow.Node,
+        artifact: wtflow.Artifact,
+    ) -> Generator[S3ArtifactWriter, None, None]:
+        key = self._get_key(run_info, node, artifact)
+        writer = S3ArtifactWriter(
+            self.client, self.executor, key, self.part_size, lambda f: self._track(run_info, f), self.budget
+        )
+        self._open += 1
+        try:
+            with closing(writer):
+                yield writer
+        finally:
+            self._open -= 1
+
+    def read_artifact(
+        self,
+        run_info: RunInfo,
+        node: wtflow.Node,
+        artifact: wtflow.Artifact,
+    ) -> bytes:
+        return self.client.get_object(self._get_key(run_info, node, artifact))
+
+    async def flush(self, run_info: RunInfo | None = None) -> None:
+        if run_info is None:
+            pending = [future for futures in self._pending.values() for future in futures]
+            self._pending = {}
+        else:
+            pending = list(self._pending.pop(run_info.run_id, ()))
+        results = await asyncio.gather(*(asyncio.wrap_future(f) for f in pending), return_exceptions=True)
+        if not self._open and not self._pending and self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+            self.client.close()
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
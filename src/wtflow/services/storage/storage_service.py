@@ -1,15 +1,29 @@
 from __future__ import annotations
 
+import asyncio
+import datetime
+import hashlib
+import pathlib
 import sys
+import time
+import zlib
 from abc import ABC, abstractmethod
 from contextlib import AbstractContextManager, contextmanager
-from typing import BinaryIO, Generator
+from typing import BinaryIO, Callable, Generator, Iterator
 
 import wtflow
+from wtflow.infra.info import ArtifactInfo, RunInfo
 from wtflow.services.base_service import BaseService
 
+STORE_CHUNK_SIZE = 1024 * 1024
+
 
 class ArtifactWriter(ABC):
+    @property
+    def congested(self) -> bool:
+        """Whether the writer has more on its hands than it should take; wait for ``drain`` then."""
+        return False
+
     @abstractmethod
     def write(self, data: bytes) -> int:
         raise NotImplementedError
@@ -18,44 +32,300 @@ class ArtifactWriter(ABC):
     def close(self) -> None:
         raise NotImplementedError
 
+    async def drain(self) -> None:
+        """Wait until the writer is no longer ``congested``."""
+
+
+class ArtifactStats:
+    """Accumulates the size, line count, checksum and write times of an artifact as it is written."""
+
+    def __init__(self) -> None:
+        self.size = 0
+        self.newlines = 0
+        self.first_write: float | None = None
+        self.last_write: float | None = None
+        self._hash = hashlib.sha256()
+        self._last_byte = b""
+
+    def update(self, data: bytes) -> None:
+        if not data:
+            return
+        now = time.time()
+        if self.first_write is None:
+            self.first_write = now
+        self.last_write = now
+        self.size += len(data)
+        self.newlines += data.count(b"\n")
+        self._hash.update(data)
+        self._last_byte = data[-1:]
+
+    @property
+    def lines(self) -> int:
+        """The number of lines, counting an unterminated last line."""
+        return self.newlines + (1 if self._last_byte not in (b"", b"\n") else 0)
+
+    @classmethod
+    def of_file(cls, path: pathlib.Path) -> ArtifactStats:
+        """Scan ``path``; its modification time stands for both write times."""
+        stats = cls()
+        with path.open("rb") as f:
+            while chunk := f.read(STORE_CHUNK_SIZE):
+                stats.update(chunk)
+        stats.first_write = stats.last_write = path.stat().st_mtime
+        return stats
+
+    def info(self, artifact: wtflow.Artifact) -> ArtifactInfo:
+        def _datetime(timestamp: float | None) -> datetime.datetime | None:
+            if timestamp is None:
+                return None
+            return datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc)
+
+        return ArtifactInfo(
+            name=artifact.name,
+            file_type=artifact.file_type,
+            size=self.size,
+            lines=self.lines,
+            checksum=self._hash.hexdigest(),
+            first_write=_datetime(self.first_write),
+            last_write=_datetime(self.last_write),
+        )
+
 
 class StorageService(BaseService):
     @abstractmethod
     def open_artifact(
         self,
-        workflow: wtflow.Graph,
+        run_info: RunInfo,
         node: wtflow.Node,
         artifact: wtflow.Artifact,
     ) -> AbstractContextManager[ArtifactWriter]:
         raise NotImplementedError
 
+    @abstractmethod
+    def read_artifact(
+        self,
+        run_info: RunInfo,
+        node: wtflow.Node,
+        artifact: wtflow.Artifact,
+    ) -> bytes:
+        raise NotImplementedError
+
+    def tail_artifact(
+        self,
+        run_info: RunInfo,
+        node: wtflow.Node,
+        artifact: wtflow.Artifact,
+        n: int,
+    ) -> list[bytes]:
+        if n <= 0:
+            return []
+        return self.read_artifact(run_info, node, artifact).splitlines(keepends=True)[-n:]
+
+    def iter_lines(
+        self,
+        run_info: RunInfo,
+        node: wtflow.Node,
+        artifact: wtflow.Artifact,
+        start: int = 0,
+        end: int | None = None,
+    ) -> Iterator[bytes]:
+        yield from self.read_artifact(run_info, node, artifact).splitlines(keepends=True)[start:end]
+
+    def local_path(
+        self,
+        run_info: RunInfo,
+        node: wtflow.Node,
+        artifact: wtflow.Artifact,
+    ) -> pathlib.Path | None:
+        """Return the local file a stored ``artifact`` can be read from, or ``None`` if there is none."""
+        return None
+
+    async def store_file(
+        self,
+        run_info: RunInfo,
+        node: wtflow.Node,
+        artifact: wtflow.Artifact,
+        source: pathlib.Path,
+    ) -> None:
+        """Store the file ``source`` as ``artifact``.
+
+        By default the file is read in chunks on a worker thread and written
+        through ``open_artifact``; backends with a faster path override this.
+        """
+        loop = asyncio.get_running_loop()
+        with source.open("rb") as f, self.open_artifact(run_info, node, artifact) as writer:
+            while chunk := await loop.run_in_executor(None, f.read, STORE_CHUNK_SIZE):
+                writer.write(chunk)
+                if writer.congested:
+                    await writer.drain()
+
+    async def flush(self, run_info: RunInfo | None = None) -> None:
+        """Wait until everything written so far has reached its destination.
 
-class StreamArtifactWriter(ArtifactWriter):
-    def __init__(self, stream: BinaryIO) -> None:
-        self.stream = stream
+        With ``run_info``, only what that run wrote has to be waited for.
+        """
+
+
+class ConsoleSink:
+    """Batches console output of all running nodes into a single stream.
+
+    Writes are buffered and flushed once ``buffer_size`` bytes are pending or
+    ``flush_interval`` seconds after the first pending write, so the event loop
+    does not issue a syscall per line.
+    """
+
+    def __init__(
+        self,
+        get_stream: Callable[[], BinaryIO],
+        flush_interval: float = 0.05,
+        buffer_size: int = 64 * 1024,
+    ) -> None:
+        self.get_stream = get_stream
+        self.flush_interval = flush_interval
+        self.buffer_size = buffer_size
+        self._buffer = bytearray()
+        self._timer: asyncio.TimerHandle | None = None
+
+    def write(self, data: bytes) -> None:
+        self._buffer += data
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+        elif self._timer is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self.flush()
+            else:
+                self._timer = loop.call_later(self.flush_interval, self.flush)
+
+    def flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._buffer:
+            return
+        stream = self.get_stream()
+        stream.write(self._buffer)
+        stream.flush()
+        self._buffer.clear()
+
+
+_COLORS = (31, 32, 33, 34, 35, 36, 91, 92, 93, 94, 95, 96)
+
+
+class ConsoleArtifactWriter(ArtifactWriter):
+    """Writes a node's output to a :class:`ConsoleSink`, decorating every line."""
+
+    def __init__(self, sink: ConsoleSink, prefix: bytes = b"", timestamps: bool = False) -> None:
+        self.sink = sink
+        self.prefix = prefix
+        self.timestamps = timestamps
+        self._partial = b""
+
+    def _decoration(self) -> bytes:
+        if not self.timestamps:
+            return self.prefix
+        now = datetime.datetime.now().strftime("%H:%M:%S.%f")[:-3]
+        return f"{now} ".encode() + self.prefix
 
     def write(self, data: bytes) -> int:
-        return self.stream.write(data)
+        if not data or (not self.prefix and not self.timestamps):
+            self.sink.write(data)
+            return len(data)
+
+        lines = (self._partial + data).splitlines(keepends=True)
+        self._partial = lines.pop() if not lines[-1].endswith(b"\n") else b""
+        if lines:
+            decoration = self._decoration()
+            self.sink.write(b"".join(decoration + line for line in lines))
+        return len(data)
+
+    def close(self) -> None:
+        if self._partial:
+            self.sink.write(self._decoration() + self._partial + b"\n")
+            self._partial = b""
+
+
+class _DiscardArtifactWriter(ArtifactWriter):
+    def write(self, data: bytes) -> int:
+        return len(data)
 
     def close(self) -> None:
         pass
 
 
 class NoStorageService(StorageService):
+    """Sends ``stdout``/``stderr`` of every node to the console.
+
+    With ``prefix`` each line is tagged with the node name (in a per-node colour
+    when ``color`` is set), and with ``timestamps`` with the time it was read.
+    Without ``echo`` the output is discarded, for when it is only consumed as
+    events.
+    """
+
+    def __init__(
+        self,
+        prefix: bool = False,
+        timestamps: bool = False,
+        color: bool = False,
+        flush_interval: float = 0.05,
+        buffer_size: int = 64 * 1024,
+        echo: bool = True,
+    ) -> None:
+        super().__init__()
+        self.prefix = prefix
+        self.timestamps = timestamps
+        self.color = color
+        self.echo = echo
+        self.sinks = {
+            "stdout": ConsoleSink(lambda: sys.stdout.buffer, flush_interval, buffer_size),
+            "stderr": ConsoleSink(lambda: sys.stderr.buffer, flush_interval, buffer_size),
+        }
+
+    def _prefix(self, node: wtflow.Node) -> bytes:
+        if not self.prefix:
+            return b""
+        prefix = f"[{node.name}]"
+        if self.color:
+            color = _COLORS[zlib.crc32(node.name.encode()) % len(_COLORS)]
+            prefix = f"\x1b[{color}m{prefix}\x1b[0m"
+        return f"{prefix} ".encode()
+
     @contextmanager
     def open_artifact(
         self,
-        workflow: wtflow.Graph,
+        run_info: RunInfo,
         node: wtflow.Node,
         artifact: wtflow.Artifact,
-    ) -> Generator[StreamArtifactWriter, None, None]:
-        if artifact.name == "stdout":
-            writer = StreamArtifactWriter(sys.stdout.buffer)
-        elif artifact.name == "stderr":
-            writer = StreamArtifactWriter(sys.stderr.buffer)
-        else:
+    ) -> Generator[ArtifactWriter, None, None]:
+        if artifact.name not in self.sinks:
             raise NotImplementedError(f"Artifact {artifact.name} is not supported in {self.__class__.__name__}")
+        if not self.echo:
+            yield _DiscardArtifactWriter()
+            return
+        writer = ConsoleArtifactWriter(self.sinks[artifact.name], self._prefix(node), self.timestamps)
         try:
             yield writer
         finally:
             writer.close()
+
+    def read_artifact(
+        self,
+        run_info: RunInfo,
+        node: wtflow.Node,
+        artifact: wtflow.Artifact,
+    ) -> bytes:
+        raise NotImplementedError(f"Reading artifacts is not supported in {self.__class__.__name__}")
+
+    async def store_file(
+        self,
+        run_info: RunInfo,
+        node: wtflow.Node,
+        artifact: wtflow.Artifact,
+        source: pathlib.Path,
+    ) -> None:
+        """Files are left where the node wrote them; there is nowhere to keep them."""
+
+    async def flush(self, run_info: RunInfo | None = None) -> None:
+        for sink in self.sinks.values():
+            sink.flush()
@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+
+from wtflow.config import AdaptiveConfig, Config
+from wtflow.infra.adaptive import AdaptiveLimit, Pressure, Slots, read_load, read_pressure
+from wtflow.infra.engine import Engine, Executor, ExitCode
+from wtflow.infra.nodes import TreeNode
+from wtflow.infra.workflow import Tree
+
+CALM = Pressure()
+LOADED = Pressure(cpu=80.0)
+
+
+def test_read_pressure(tmp_path):
+    for resource, avg10 in (("cpu", "12.50"), ("memory", "0.00"), ("io", "3.10")):
+        (tmp_path / resource).write_text(
+            f"some avg10={avg10} avg60=0.00 avg300=0.00 total=100\nfull avg10=0.00 avg60=0.00 avg300=0.00 total=0\n"
+        )
+    assert read_pressure(tmp_path) == Pressure(cpu=12.5, memory=0.0, io=3.1)
+    with pytest.raises(OSError):
+        read_pressure(tmp_path / "missing")
+
+
+def test_read_load(tmp_path):
+    loadavg, meminfo = tmp_path / "loadavg", tmp_path / "meminfo"
+    loadavg.write_text("6.00 3.00 1.00 2/300 12345\n")
+    meminfo.write_text("MemTotal:       1000000 kB\nMemFree:          10000 kB\nMemAvailable:     50000 kB\n")
+    pressure = read_load(loadavg, meminfo, cpus=4)
+    assert (pressure.cpu, pressure.memory, pressure.io) == pytest.approx((100 / 3, 50.0, 0.0))
+
+    loadavg.write_text("2.00 3.00 1.00 2/300 12345\n")
+    meminfo.write_text("MemTotal:       1000000 kB\nMemAvailable:    500000 kB\n")
+    assert read_load(loadavg, meminfo, cpus=4) == Pressure()
+
+
+def test_additive_increase_multiplicative_decrease():
+    now = [0.0]
+    limit = AdaptiveLimit(AdaptiveConfig(min_concurrency=2, max_concurrency=64, cooldown=10.0), clock=lambda: now[0])
+    limit._limit = 8.0
+
+    assert limit.update(CALM, running=3) == 8  # Not using the limit, no reason to raise it.
+    assert limit.update(CALM, running=8) == 9
+    assert limit.update(LOADED, running=9) == 4
+    now[0] = 5.0
+    assert limit.update(LOADED, running=9) == 4  # Still within the cooldown.
+    now[0] = 10.0
+    assert limit.update(LOADED, running=4) == 2
+    now[0] = 20.0
+    assert limit.update(LOADED, running=2) == 2  # Never below the minimum.
+    for _ in range(100):
+        limit.update(CALM, running=limit.limit)
+    assert limit.limit == 64
+
+
+@pytest.mark.asyncio
+async def test_raised_wakes_waiters():
+    limit = AdaptiveLimit(AdaptiveConfig(min_concurrency=1, max_concurrency=2))
+    limit._limit = 1.0
+    raised = limit.raised
+    limit.update(LOADED, running=1)
+    assert not raised.done()
+    limit.update(CALM, running=1)
+    assert raised.done()
+    assert not limit.raised.done()
+
+
+@pytest.mark.asyncio
+async def test_run_follows_limit(tmp_path):
+    log = tmp_path / "log"
+    children = [
+        TreeNode(name=f"child {i}", command=f"echo start >> {log}; sleep 0.1; echo end >> {log}") for i in range(3)
+    ]
+    wf = Tree(name="test adaptive", root=TreeNode(name="root", children=children))
+    engine = Engine(Config())
+    limit = AdaptiveLimit(AdaptiveConfig(min_concurrency=1, max_concurrency=1, interval=0.01), sampler=lambda: LOADED)
+    executor = Executor(wf.as_graph(), engine.servicer, metrics=engine.metrics, adaptive=limit)
+
+    assert await executor.execute() == ExitCode.SUCCESS
+    assert log.read_text() == "start\nend\n" * 3
+    assert executor.status.snapshot()["concurrency_limit"] == 1
+
+
+@pytest.mark.asyncio
+async def test_raised_limit_starts_queued_nodes(tmp_path):
+    children = [TreeNode(name=f"child {i}", command="sleep 0.5") for i in range(4)]
+    wf = Tree(name="test adaptive raise", root=TreeNode(name="root", children=children))
+    engine = Engine(Config())
+    limit = AdaptiveLimit(AdaptiveConfig(min_concurrency=1, max_concurrency=4, interval=0.01), sampler=lambda: CALM)
+    limit._limit = 1.0
+    executor = Executor(wf.as_graph(), engine.servicer, metrics=engine.metrics, adaptive=limit)
+
+    run = asyncio.create_task(executor.execute())
+    await asyncio.sleep(0.3)
+    assert len(executor.status.running) == 4
+    assert "wtflow_concurrency_limit{" in engine.metrics.render()
+    assert await run == ExitCode.SUCCESS
+
+
+@pytest.mark.asyncio
+async def test_shared_limit_counts_every_run():
+    limit = AdaptiveLimit(AdaptiveConfig(min_concurrency=1, max_concurrency=8, interval=0.01), sampler=lambda: CALM)
+    limit._limit = 2.0
+    async with limit.control(lambda: 1), limit.control(lambda: 1):
+        assert limit._controller is not None
+        await asyncio.sleep(0.05)
+    # Only grows while the runs together use it all, and stops with the last run.
+    assert limit.limit > 2
+    assert limit._controller is None
+
+
+@pytest.mark.asyncio
+async def test_slots_follow_limit():
+    limit = AdaptiveLimit(AdaptiveConfig(min_concurrency=1, max_concurrency=2))
+    limit._limit = 1.0
+    slots = Slots(None, limit)
+    await slots.__aenter__()
+    waiter = asyncio.create_task(slots.__aenter__())
+    await asyncio.sleep(0.01)
+    assert not waiter.done()
+    limit.update(CALM, running=1)
+    await asyncio.wait_for(waiter, 1)
+    assert slots.held == 2
+
+
+@pytest.mark.asyncio
+async def test_overlapping_runs_share_limit(tmp_path):
+    log = tmp_path / "log"
+    config = Config(adaptive=AdaptiveConfig(min_concurrency=1, max_concurrency=1))
+    engine = Engine(config)
+    workflows = [
+        Tree(
+            name=f"test adaptive shared {i}",
+            root=TreeNode(name="root", command=f"echo start >> {log}; sleep 0.1; echo end >> {log}"),
+        )
+        for i in range(3)
+    ]
+    assert await asyncio.gather(*(engine.run_workflow(wf) for wf in workflows)) == [ExitCode.SUCCESS] * 3
+    assert log.read_text() == "start\nend\n" * 3
@@ -0,0 +1,116 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from wtflow.config import Config, LocalStorageConfig
+from wtflow.infra.batch import Batch
+from wtflow.infra.engine import Engine, Executor, ExitCode, NodeResult
+from wtflow.infra.nodes import Node, TreeNode
+from wtflow.infra.workflow import Tree
+
+
+def test_batchable_restrictions():
+    with pytest.raises(ValueError):
+        Node(name="node", command="true", timeout=1.0, batchable=True)
+    assert Node(name="node", command="true", batchable=True).batchable
+
+
+@pytest.mark.asyncio
+async def test_split():
+    batch = Batch([Node(name="a", command="printf one"), Node(name="b", command="echo two; echo err >&2; exit 3")])
+    process = await asyncio.create_subprocess_shell(
+        batch.script, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    assert process.stdout is not None and process.stderr is not None
+    await asyncio.gather(batch.split("stdout", process.stdout), batch.split("stderr", process.stderr), process.wait())
+
+    assert [await output.read() for output in batch.outputs["stdout"]] == [b"one", b"two\n"]
+    assert [await output.read() for output in batch.outputs["stderr"]] == [b"", b"err\n"]
+    first, second = await batch.end(0), await batch.end(1)
+    assert first is not None and second is not None
+    assert (first.status, second.status) == (0, 3)
+    assert batch.start_time(1) == first.time
+    assert process.returncode == 3
+
+
+@pytest.mark.asyncio
+async def test_siblings_share_a_process(tmp_path, db_config):
+    big = 100_000
+    size = len("".join(f"{i}\n" for i in range(1, big + 1)))
+    children = [TreeNode(name=f"child {i}", command=f"echo $$; echo {i} >&2", batchable=True) for i in range(5)]
+    children.append(TreeNode(name="big", command=f"seq {big}", batchable=True))
+    wf = Tree(
+        name="test batch",
+        root=TreeNode(name="root", command='cat "$WTFLOW_CHILD_3_STDOUT"', children=children),
+    )
+    data_dir = tmp_path / "data"
+    config = Config(database=db_config, storage=LocalStorageConfig(base_path=data_dir), concurrency=2, batch_size=4)
+    engine = Engine(config)
+
+    assert await engine.run_workflow(wf) == ExitCode.SUCCESS
+    [run_dir] = (data_dir / "test batch").iterdir()
+    pids = [(run_dir / f"child {i}" / "stdout.txt").read_text() for i in range(5)]
+    assert len(set(pids)) <= 2
+    assert engine.metrics.spawn_latency.count == 3  # Two batches and the root.
+    assert [(run_dir / f"child {i}" / "stderr.txt").read_text() for i in range(5)] == [f"{i}\n" for i in range(5)]
+    assert (run_dir / "big" / "stdout.txt").stat().st_size == size
+    assert (run_dir / "root" / "stdout.txt").read_text() == pids[3]
+
+    with sqlite3.connect(db_config.database_path) as conn:
+        executions = conn.execute("SELECT COUNT(*), COUNT(end_time), SUM(result) FROM executions").fetchone()
+        artifacts = conn.execute("SELECT COUNT(*) FROM artifacts").fetchone()
+    assert executions == (7, 7, 0)
+    assert artifacts == (14,)
+
+
+@pytest.mark.asyncio
+async def test_failure_stops_batch(tmp_path):
+    log = tmp_path / "log"
+    children = [TreeNode(name=f"child {i}", command=f"echo {i} >> {log}", batchable=True) for i in range(3)]
+    children.insert(1, TreeNode(name="fails", command="exit 1", batchable=True))
+    wf = Tree(name="test batch failure", root=TreeNode(name="root", children=children))
+    engine = Engine(Config())
+    executor = Executor(wf.as_graph(), engine.servicer, metrics=engine.metrics)
+
+    assert await executor.execute_batch(children) == NodeResult.FAIL
+    assert log.read_text() == "0\n"
+    assert executor.status.snapshot()["results"] == {"success": 1, "fail": 1}
+    assert await Engine(Config()).run_workflow(wf) == ExitCode.FAIL
+
+
+@pytest.mark.asyncio
+async def test_batch_cancelled_on_failure(tmp_path):
+    log = tmp_path / "log"
+    children = [TreeNode(name=f"sleep {i}", command=f"sleep 10; echo {i} >> {log}", batchable=True) for i in range(2)]
+    children.append(TreeNode(name="fails", command="sleep 0.2; exit 1"))
+    wf = Tree(name="test batch cancel", root=TreeNode(name="root", children=children))
+    engine = Engine(Config(grace_period=0.5, concurrency=2))
+
+    assert await asyncio.wait_for(engine.run_workflow(wf), 5) == ExitCode.FAIL
+    assert not log.exists()
+    assert engine.metrics.results == {"cancel": 1, "fail": 1}
+
+
+@pytest.mark.parametrize("concurrency", [None, 8])
+@pytest.mark.asyncio
+async def test_no_batching_with_free_slots(concurrency):
+    children = [TreeNode(name=f"child {i}", command="sleep 0.5", batchable=True) for i in range(8)]
+    wf = Tree(name="test batch free slots", root=TreeNode(name="root", children=children))
+    engine = Engine(Config(concurrency=concurrency))
+
+    start = time.monotonic()
+    assert await engine.run_workflow(wf) == ExitCode.SUCCESS
+    assert time.monotonic() - start < 1.5
+    assert engine.metrics.spawn_latency.count == 8
+
+
+@pytest.mark.asyncio
+async def test_batches_fill_free_slots():
+    children = [TreeNode(name=f"child {i}", command="true", batchable=True) for i in range(10)]
+    wf = Tree(name="test batch sizes", root=TreeNode(name="root", children=children))
+    engine = Engine(Config(concurrency=4))
+
+    assert await engine.run_workflow(wf) == ExitCode.SUCCESS
+    assert engine.metrics.spawn_latency.count == 4  # Batches of 3, 3, 3 and 1.
@@ -0,0 +1,114 @@
+from uuid import UUID
+
+import pytest
+
+from wtflow.config import Config
+from wtflow.infra.artifact import Artifact
+from wtflow.infra.engine import Engine, ExitCode
+from wtflow.infra.info import RunInfo
+from wtflow.infra.nodes import Node, TreeNode
+from wtflow.infra.workflow import Graph, Tree
+from wtflow.services.storage.bundle.bundle_storage_service import BundleStorageService
+
+NODE = Node(name="node")
+RUN = RunInfo(graph=Graph(name="graph", nodes=(NODE,)))
+STDOUT = Artifact("stdout")
+STDERR = Artifact("stderr")
+
+
+def _write(storage, node, artifact, data):
+    with storage.open_artifact(RUN, node, artifact) as f:
+        f.write(data)
+
+
+def test_small_artifacts_are_packed(data_dir):
+    storage = BundleStorageService(data_dir, spill_threshold=100)
+    nodes = [Node(name=f"node {i}") for i in range(100)]
+    for node in nodes:
+        _write(storage, node, STDOUT, f"{node.name}\n".encode())
+
+    run_dir = data_dir / "graph" / str(RUN.run_id)
+    assert [path.name for path in run_dir.iterdir()] == [".bundles"]
+    assert sorted(path.name for path in (run_dir / ".bundles").iterdir()) == ["0.dat", "index.jsonl"]
+    assert storage.read_artifact(RUN, nodes[42], STDOUT) == b"node 42\n"
+
+    # Another service reads through the index on disk.
+    reader = BundleStorageService(data_dir)
+    assert reader.read_artifact(RUN, nodes[99], STDOUT) == b"node 99\n"
+    with pytest.raises(FileNotFoundError):
+        reader.read_artifact(RUN, nodes[0], STDERR)
+
+
+def test_large_artifact_spills(data_dir):
+    storage = BundleStorageService(data_dir, spill_threshold=100)
+    with storage.open_artifact(RUN, NODE, STDOUT) as f:
+        for i in range(100):
+            f.write(f"line {i}\n".encode())
+
+    path = data_dir / "graph" / str(RUN.run_id) / "node" / "stdout.txt"
+    assert path.read_bytes().startswith(b"line 0\nline 1\n")
+    assert storage.tail_artifact(RUN, NODE, STDOUT, 2) == [b"line 98\n", b"line 99\n"]
+    assert list(storage.iter_lines(RUN, NODE, STDOUT, 5, 7)) == [b"line 5\n", b"line 6\n"]
+
+    # Storing it again replaces it, whichever way it is stored.
+    _write(storage, NODE, STDOUT, b"short\nagain\n")
+    assert storage.read_artifact(RUN, NODE, STDOUT) == b"short\nagain\n"
+    assert storage.tail_artifact(RUN, NODE, STDOUT, 1) == [b"again\n"]
+    _write(storage, NODE, STDOUT, b"long\n" * 100)
+    assert storage.read_artifact(RUN, NODE, STDOUT) == b"long\n" * 100
+
+
+def test_bundles_roll_over(data_dir):
+    storage = BundleStorageService(data_dir, bundle_size=10)
+    for i in range(3):
+        _write(storage, Node(name=f"node {i}"), STDOUT, b"12345678\n")
+    bundles = sorted(path.name for path in (data_dir / "graph" / str(RUN.run_id) / ".bundles").glob("*.dat"))
+    assert bundles == ["0.dat", "1.dat", "2.dat"]
+    assert storage.read_artifact(RUN, Node(name="node 2"), STDOUT) == b"12345678\n"
+
+
+@pytest.mark.asyncio
+async def test_store_file(data_dir, tmp_path):
+    storage = BundleStorageService(data_dir, spill_threshold=100)
+    small, large = tmp_path / "small", tmp_path / "large"
+    small.write_bytes(b"small\n")
+    large.write_bytes(b"large\n" * 100)
+    await storage.store_file(RUN, NODE, Artifact("small"), small)
+    await storage.store_file(RUN, NODE, Artifact("large"), large)
+    await storage.flush()
+
+    assert storage.read_artifact(RUN, NODE, Artifact("small")) == b"small\n"
+    assert storage.read_artifact(RUN, NODE, Artifact("large")) == b"large\n" * 100
+    assert not (data_dir / "graph" / str(RUN.run_id) / "node" / "small.txt").exists()
+
+
+@pytest.mark.asyncio
+async def test_run(bundle_storage_config, data_dir):
+    children = [TreeNode(name=f"child {i}", command=f"echo {i}; echo error {i} >&2") for i in range(20)]
+    wf = Tree(name="test bundle", root=TreeNode(name="root", command="echo root", children=children))
+    engine = Engine(Config(storage=bundle_storage_config))
+    assert await engine.run_workflow(wf) == ExitCode.SUCCESS
+
+    [run_dir] = (data_dir / "test bundle").iterdir()
+    assert [path.name for path in run_dir.iterdir()] == [".bundles"]
+    storage = bundle_storage_config.create_storage_service()
+    run_info = RunInfo(graph=wf.as_graph(), run_id=UUID(run_dir.name))
+    assert storage.read_artifact(run_info, Node(name="child 7"), STDERR) == b"error 7\n"
+    assert storage.tail_artifact(run_info, Node(name="root"), STDOUT, 1) == [b"root\n"]
+
+
+@pytest.mark.asyncio
+async def test_flush_forgets_finished_runs(data_dir):
+    storage = BundleStorageService(data_dir)
+    runs = [RunInfo(graph=Graph(name="graph", nodes=(NODE,))) for _ in range(3)]
+    for run in runs[:2]:
+        with storage.open_artifact(run, NODE, STDOUT) as f:
+            f.write(b"done\n")
+    with storage.open_artifact(runs[2], NODE, STDOUT) as f:
+        f.write(b"still ")
+        await storage.flush()
+        assert len(storage._runs) == 1
+        f.write(b"writing\n")
+    await storage.flush()
+    assert not storage._runs
+    assert [storage.read_artifact(run, NODE, STDOUT) for run in runs] == [b"done\n", b"done\n", b"still writing\n"]
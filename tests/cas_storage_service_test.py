@@ -0,0 +1,132 @@
+import sqlite3
+from uuid import UUID, uuid4
+
+import pytest
+
+from wtflow.config import Config
+from wtflow.infra.artifact import Artifact
+from wtflow.infra.engine import Engine
+from wtflow.infra.info import RunInfo
+from wtflow.infra.nodes import TreeNode
+from wtflow.infra.workflow import Tree
+
+STDOUT = Artifact("stdout")
+
+
+@pytest.mark.asyncio
+async def test_identical_outputs_share_a_blob(cas_storage_config, data_dir):
+    config = Config(storage=cas_storage_config)
+    wf = Tree(
+        name="test cas",
+        root=TreeNode(
+            name="Root Node",
+            children=[
+                TreeNode(name="Node 1", command="echo '0 warnings'"),
+                TreeNode(name="Node 2", command="echo '0 warnings'"),
+                TreeNode(name="Node 3", command="echo '1 warning'"),
+            ],
+        ),
+    )
+    engine = Engine(config=config)
+    assert await engine.run_workflow(wf) == 0
+    assert await engine.run_workflow(wf) == 0
+    assert await engine.run_workflow(wf) == 0
+
+    blobs = [p for p in (data_dir / "blobs").glob("*/*") if p.suffix != ".idx"]
+    assert len(blobs) == 2
+    assert not any((data_dir / "tmp").iterdir())
+
+    with sqlite3.connect(data_dir / "index.db") as conn:
+        (run_id,) = conn.execute("SELECT run_id FROM refs LIMIT 1").fetchone()
+        assert conn.execute("SELECT COUNT(*) FROM refs").fetchone() == (9,)
+
+    storage = engine.servicer.storage_service
+    run_info = RunInfo(graph=wf.as_graph(), run_id=UUID(run_id))
+    nodes = {node.name: node for node in run_info.graph.nodes}
+    assert storage.read_artifact(run_info, nodes["Node 1"], STDOUT) == b"0 warnings\n"
+    assert storage.tail_artifact(run_info, nodes["Node 3"], STDOUT, 1) == [b"1 warning\n"]
+
+
+def test_missing_artifact(cas_storage_config):
+    storage = cas_storage_config.create_storage_service()
+    node = TreeNode(name="node")
+    with pytest.raises(FileNotFoundError):
+        storage.read_artifact(RunInfo(graph=Tree(name="wf", root=node).as_graph()), node, STDOUT)
+
+
+def test_missing_artifact_has_no_local_path(cas_storage_config):
+    storage = cas_storage_config.create_storage_service()
+    node = TreeNode(name="node")
+    assert storage.local_path(RunInfo(graph=Tree(name="wf", root=node).as_graph()), node, STDOUT) is None
+
+
+@pytest.mark.asyncio
+async def test_collected_artifacts_share_a_blob(cas_storage_config, data_dir, tmp_path):
+    wf = Tree(
+        name="test cas collect",
+        root=TreeNode(
+            name="Root Node",
+            children=[
+                TreeNode(
+                    name=f"Node {i}",
+                    command=f"echo same > {tmp_path}/{i}.bin",
+                    artifacts=(Artifact("binary", "bin", path=str(tmp_path / f"{i}.bin")),),
+                )
+                for i in range(3)
+            ],
+        ),
+    )
+    engine = Engine(Config(storage=cas_storage_config))
+    assert await engine.run_workflow(wf) == 0
+
+    with sqlite3.connect(data_dir / "index.db") as conn:
+        digests = conn.execute("SELECT DISTINCT digest FROM refs WHERE artifact = 'binary.bin'").fetchall()
+        (run_id,) = conn.execute("SELECT run_id FROM refs LIMIT 1").fetchone()
+    assert len(digests) == 1
+    assert not any((data_dir / "tmp").iterdir())
+
+    run_info = RunInfo(graph=wf.as_graph(), run_id=UUID(run_id))
+    node = next(node for node in run_info.graph.nodes if node.name == "Node 0")
+    assert engine.servicer.storage_service.read_artifact(run_info, node, node.artifacts[0]) == b"same\n"
+
+
+@pytest.mark.asyncio
+async def test_refs_written_at_flush(cas_storage_config, data_dir):
+    storage = cas_storage_config.create_storage_service()
+    node = TreeNode(name="node")
+    run_id = uuid4()
+    runs = [RunInfo(graph=Tree(name=name, root=node).as_graph(), run_id=run_id) for name in ("first", "second")]
+    for run_info in runs:
+        with storage.open_artifact(run_info, node, STDOUT) as f:
+            f.write(f"{run_info.graph.name}\n".encode())
+
+    with sqlite3.connect(data_dir / "index.db") as conn:
+        assert conn.execute("SELECT COUNT(*) FROM refs").fetchone() == (0,)
+    assert storage.read_artifact(runs[0], node, STDOUT) == b"first\n"
+
+    await storage.flush()
+    with sqlite3.connect(data_dir / "index.db") as conn:
+        assert conn.execute("SELECT COUNT(*) FROM refs").fetchone() == (2,)
+    assert not storage._refs
+    assert [storage.read_artifact(run_info, node, STDOUT) for run_info in runs] == [b"first\n", b"second\n"]
+
+
+def test_old_index_migrated(cas_storage_config, data_dir):
+    data_dir.mkdir(parents=True, exist_ok=True)
+    with sqlite3.connect(data_dir / "index.db") as conn:
+        conn.execute(
+            """
+            CREATE TABLE refs (
+                run_id TEXT NOT NULL, workflow TEXT NOT NULL, node TEXT NOT NULL, artifact TEXT NOT NULL,
+                digest TEXT NOT NULL, PRIMARY KEY (run_id, node, artifact)
+            )
+            """
+        )
+        conn.execute("INSERT INTO refs VALUES ('run', 'wf', 'node', 'stdout.txt', 'abc')")
+    cas_storage_config.create_storage_service()
+    with sqlite3.connect(data_dir / "index.db") as conn:
+        conn.execute("INSERT INTO refs VALUES ('run', 'other', 'node', 'stdout.txt', 'def')")
+        assert conn.execute("SELECT workflow, digest FROM refs ORDER BY workflow").fetchall() == [
+            ("other", "def"),
+            ("wf", "abc"),
+        ]
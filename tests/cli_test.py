@@ -121,3 +121,60 @@ def test_dry_run(wtfile, capsys, tmp_path, monkeypatch):
 ]
 """
     assert out == expected_out
+
+
+def test_run_prefix(wtfile, capfd, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    main(["run", "--workflow", "hello-world", "--prefix", str(wtfile)])
+    out, _ = capfd.readouterr()
+    assert out == "[Root Node] Hello, World!\n"
+
+
+@pytest.fixture()
+def wtfile_tree(tmp_path):
+    p = tmp_path / "wtfile.py"
+    p.write_text("""\
+import wtflow
+
+
+@wtflow.wf
+def build():
+    return wtflow.TreeNode(
+        name="release",
+        command="echo release",
+        children=[
+            wtflow.TreeNode(name="lib", command="echo lib", children=[wtflow.TreeNode(name="gen", command="echo gen")]),
+            wtflow.TreeNode(name="docs", command="echo docs"),
+        ],
+    )
+""")
+    return p
+
+
+def test_run_target(wtfile_tree, capfd):
+    assert main(["run", str(wtfile_tree), "--workflow", "build", "--target", "lib"]) == 0
+    out, _ = capfd.readouterr()
+    assert out == "gen\nlib\n"
+
+
+def test_run_only(wtfile_tree, capfd):
+    assert main(["run", str(wtfile_tree), "--workflow", "build", "--only", "lib", "--only", "docs"]) == 0
+    out, _ = capfd.readouterr()
+    assert sorted(out.splitlines()) == ["docs", "lib"]
+
+
+def test_run_target_not_found(wtfile_tree, capsys):
+    assert main(["run", str(wtfile_tree), "--workflow", "build", "--target", "nope"]) == 1
+    _, err = capsys.readouterr()
+    assert err == "Error: Node 'nope' not found in workflow 'build'.\n"
+
+
+def test_run_target_requires_workflow(wtfile_tree, capsys):
+    assert main(["run", str(wtfile_tree), "--target", "lib"]) == 1
+    _, err = capsys.readouterr()
+    assert err == "Error: --target and --only require --workflow.\n"
+
+
+def test_submit_without_daemon(tmp_path, capsys):
+    assert main(["submit", "--socket", str(tmp_path / "missing.sock"), "--workflow", "wf"]) == 1
+    assert "Could not reach the daemon" in capsys.readouterr().err
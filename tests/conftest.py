@@ -1,6 +1,6 @@
 import pytest
 
-from wtflow.config import LocalStorageConfig, Sqlite3Config
+from wtflow.config import BundleStorageConfig, CASStorageConfig, LocalStorageConfig, Sqlite3Config
 from wtflow.services.db.sqlite.sqlite_db_service import Sqlite3DBService
 
 
@@ -22,3 +22,13 @@ def db_config(data_dir):
     db_service = config.create_db_service()
     assert isinstance(db_service, Sqlite3DBService)
     return config
+
+
+@pytest.fixture()
+def cas_storage_config(data_dir):
+    return CASStorageConfig(base_path=data_dir)
+
+
+@pytest.fixture()
+def bundle_storage_config(data_dir):
+    return BundleStorageConfig(base_path=data_dir)
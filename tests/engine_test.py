@@ -1,11 +1,17 @@
+import asyncio
 import time
 
 import pytest
 
-from wtflow.config import Config
-from wtflow.infra.engine import Engine, ExitCode
-from wtflow.infra.nodes import TreeNode
+from wtflow.config import Config, LocalStorageConfig
+from wtflow.infra.artifact import Artifact
+from wtflow.infra.engine import Engine, Executor, ExitCode
+from wtflow.infra.info import ExecutionInfo, RunInfo
+from wtflow.infra.nodes import Matrix, TreeNode
 from wtflow.infra.workflow import Tree
+from wtflow.services.db.db_service import NoDBService
+from wtflow.services.servicer import Servicer
+from wtflow.services.storage.storage_service import NoStorageService
 
 
 @pytest.mark.asyncio
@@ -57,7 +63,7 @@ async def test_stop_on_failure(capfdbinary):
                     name="Node 2",
                     children=[
                         TreeNode(name="Node 2.1", command='echo "World 2.1"'),
-                        TreeNode(name="Node 2.2", command="command-not-exist"),
+                        TreeNode(name="Node 2.2", command="sleep 0.2 && command-not-exist"),
                         TreeNode(name="Node 2.3", command='echo "EXISTS" && sleep 1 && echo "NOPE"'),
                     ],
                 ),
@@ -72,6 +78,35 @@ async def test_stop_on_failure(capfdbinary):
     assert b"NOPE" not in out
 
 
+@pytest.mark.asyncio
+async def test_teardown_escalates_to_sigkill():
+    wf = Tree(
+        name="test teardown escalates",
+        root=TreeNode(
+            name="Root Node",
+            children=[TreeNode(name=f"Stubborn {i}", command="trap '' TERM; sleep 30") for i in range(5)]
+            + [TreeNode(name="Fail", command="sleep 0.2 && exit 1")],
+        ),
+    )
+    engine = Engine(Config(grace_period=0.3))
+    start_time = time.perf_counter()
+    assert await engine.run_workflow(wf) == ExitCode.FAIL
+    # All groups are signalled together, so teardown takes one grace period, not five.
+    assert time.perf_counter() - start_time < 1.5
+
+
+@pytest.mark.asyncio
+async def test_timeout_escalates_to_sigkill():
+    wf = Tree(
+        name="test timeout escalates",
+        root=TreeNode(name="Stubborn", command="trap '' TERM; sleep 30", timeout=0.1),
+    )
+    engine = Engine(Config(grace_period=0.2))
+    start_time = time.perf_counter()
+    assert await engine.run_workflow(wf) == ExitCode.FAIL
+    assert time.perf_counter() - start_time < 1.0
+
+
 @pytest.mark.asyncio
 async def test_timeout_node(capfdbinary):
     wf = Tree(
@@ -106,6 +141,121 @@ async def test_with_storage_config(local_storage_config, data_dir):
     )
     engine = Engine(config=config)
     assert await engine.run_workflow(wf) == 0
-    log_path = data_dir / "test no db" / "Node 1" / "stdout.txt"
-    assert log_path.exists()
+    (log_path,) = data_dir.glob("test no db/*/Node 1/stdout.txt")
     assert log_path.read_text() == "Hello\nworld\n"
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limit():
+    wf = Tree(
+        name="test concurrency",
+        root=TreeNode(
+            name="Root Node",
+            children=[TreeNode(name=f"Node {i}", command="sleep 0.1") for i in range(4)],
+        ),
+    )
+    engine = Engine(Config(concurrency=2))
+    start_time = time.perf_counter()
+    assert await engine.run_workflow(wf) == ExitCode.SUCCESS
+    assert time.perf_counter() - start_time >= 0.2
+
+
+@pytest.mark.asyncio
+async def test_matrix_node(capfd):
+    wf = Tree(
+        name="test matrix",
+        root=TreeNode(
+            name="Root Node",
+            command="echo done",
+            children=[
+                TreeNode(
+                    name="test",
+                    command="echo {python}-{shard}",
+                    matrix=Matrix.of(python=["3.10", "3.11"], shard=range(3)),
+                ),
+            ],
+        ),
+    )
+    engine = Engine(Config(concurrency=2))
+    assert await engine.run_workflow(wf) == ExitCode.SUCCESS
+    out, _ = capfd.readouterr()
+    *instances, last = out.splitlines()
+    assert sorted(instances) == [f"{py}-{shard}" for py in ("3.10", "3.11") for shard in range(3)]
+    assert last == "done"
+
+
+def test_matrix_instance_leaves_shell_braces():
+    node = TreeNode(
+        name="test",
+        command="echo ${HOME} {shard:02} | awk '{print $1}' {unknown}",
+        artifacts=(Artifact("report", path="out/{shard}.txt"),),
+        matrix=Matrix.of(shard=[3]),
+    )
+    instance = node.instance({"shard": 3})
+    assert instance.command == "echo ${HOME} 03 | awk '{print $1}' {unknown}"
+    assert instance.artifacts[0].path == "out/3.txt"
+
+
+@pytest.mark.asyncio
+async def test_empty_matrix_node(capfd):
+    wf = Tree(
+        name="test empty matrix",
+        root=TreeNode(
+            name="Root Node",
+            command="echo done",
+            children=[TreeNode(name="test", command="echo {x}", matrix=Matrix.of(x=[]))],
+        ),
+    )
+    assert await Engine(Config()).run_workflow(wf) == ExitCode.SUCCESS
+    out, _ = capfd.readouterr()
+    assert out == "done\n"
+
+
+class SlowDBService(NoDBService):
+    def __init__(self) -> None:
+        self.records: list[tuple[str, str]] = []
+
+    async def start_execution(self, run_info: RunInfo, execution_info: ExecutionInfo) -> None:
+        self.records.append(("start", execution_info.node.name))
+
+    async def finish_execution(self, run_info: RunInfo, execution_info: ExecutionInfo) -> None:
+        await asyncio.sleep(0.3)
+        self.records.append(("finish", execution_info.node.name))
+
+
+def _chain() -> Tree:
+    return Tree(
+        name="test pipelined",
+        root=TreeNode(name="parent", command="true", children=[TreeNode(name="child", command="true")]),
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "pipelined, records",
+    [
+        (False, [("start", "child"), ("finish", "child"), ("start", "parent"), ("finish", "parent")]),
+        (True, [("start", "child"), ("start", "parent"), ("finish", "child"), ("finish", "parent")]),
+    ],
+)
+async def test_pipelined_releases_dependents_on_exit(pipelined, records):
+    db_service = SlowDBService()
+    executor = Executor(_chain().as_graph(), Servicer(db_service, NoStorageService()), pipelined=pipelined)
+    assert await executor.execute() == ExitCode.SUCCESS
+    assert db_service.records == records
+
+
+@pytest.mark.asyncio
+async def test_pipelined_finalisation_failure_fails_run(tmp_path):
+    wf = Tree(
+        name="test pipelined failure",
+        root=TreeNode(
+            name="parent",
+            command="true",
+            children=[
+                TreeNode(name="child", command="true", artifacts=(Artifact("report", path=str(tmp_path / "missing")),))
+            ],
+        ),
+    )
+    config = Config(storage=LocalStorageConfig(base_path=tmp_path / "data"), pipelined=True)
+    assert await Engine(config).run_workflow(wf) == ExitCode.FAIL
@@ -0,0 +1,157 @@
+import asyncio
+import uuid
+
+import pytest
+
+from wtflow.infra.engine import Engine, ExitCode, NodeResult
+from wtflow.infra.events import (
+    EventBus,
+    LogChunk,
+    NodeFinished,
+    NodeQueued,
+    NodeStarted,
+    RunFinished,
+    RunStarted,
+)
+from wtflow.infra.nodes import Node, TreeNode
+from wtflow.infra.workflow import Tree
+
+
+@pytest.mark.asyncio
+async def test_run_workflow_events():
+    wf = Tree(
+        name="test events",
+        root=TreeNode(
+            name="Root Node",
+            children=[
+                TreeNode(name="Node 1", command='echo "Hello 1"'),
+                TreeNode(name="Node 2", command='echo "Hello 2" >&2'),
+            ],
+        ),
+    )
+    events = [event async for event in Engine().run_workflow_events(wf)]
+
+    assert isinstance(events[0], RunStarted)
+    assert isinstance(events[-1], RunFinished)
+    assert events[-1].exit_code == ExitCode.SUCCESS
+    assert {event.node.name for event in events if isinstance(event, NodeQueued)} == {"Root Node", "Node 1", "Node 2"}
+    finished = {event.node.name: event.result for event in events if isinstance(event, NodeFinished)}
+    assert finished == {"Root Node": NodeResult.SUCCESS, "Node 1": NodeResult.SUCCESS, "Node 2": NodeResult.SUCCESS}
+    chunks = {(event.node.name, event.artifact, event.data) for event in events if isinstance(event, LogChunk)}
+    assert chunks == {("Node 1", "stdout", b"Hello 1\n"), ("Node 2", "stderr", b"Hello 2\n")}
+    starts = [i for i, event in enumerate(events) if isinstance(event, NodeStarted) and event.node.name == "Root Node"]
+    ends = [i for i, event in enumerate(events) if isinstance(event, NodeFinished) and event.node.name != "Root Node"]
+    assert starts[0] > max(ends)
+
+
+@pytest.mark.asyncio
+async def test_run_workflow_events_failure():
+    wf = Tree(name="test events failure", root=TreeNode(name="fail node", command="exit 3"))
+    events = [event async for event in Engine().run_workflow_events(wf)]
+
+    assert isinstance(events[-1], RunFinished)
+    assert events[-1].exit_code == ExitCode.FAIL
+    assert [event.result for event in events if isinstance(event, NodeFinished)] == [NodeResult.FAIL]
+
+
+@pytest.mark.asyncio
+async def test_live_viewers_follow_run():
+    engine = Engine()
+    viewers = [engine.events.subscribe() for _ in range(2)]
+    wf = Tree(name="test viewers", root=TreeNode(name="Node", command="echo hi"))
+    assert await engine.run_workflow(wf) == ExitCode.SUCCESS
+
+    for viewer in viewers:
+        viewer.close()
+        received = [event async for event in viewer]
+        assert [type(event) for event in received if not isinstance(event, LogChunk)] == [
+            RunStarted,
+            NodeQueued,
+            NodeStarted,
+            NodeFinished,
+            RunFinished,
+        ]
+
+
+def test_slow_subscriber_coalesces_log_chunks():
+    bus = EventBus()
+    run_id = uuid.uuid4()
+    node = Node(name="node")
+    subscription = bus.subscribe(maxsize=2)
+
+    bus.publish(NodeStarted(run_id=run_id, node=node))
+    for i in range(10):
+        bus.publish(LogChunk(run_id=run_id, node=node, artifact="stdout", data=b"%d\n" % i))
+
+    assert subscription.dropped == 0
+    assert len(subscription._queue) == 2
+    assert subscription._queue[1] == LogChunk(
+        run_id=run_id,
+        node=node,
+        artifact="stdout",
+        data=b"".join(b"%d\n" % i for i in range(10)),
+        timestamp=subscription._queue[1].timestamp,
+    )
+
+
+def test_slow_subscriber_keeps_lifecycle_events():
+    bus = EventBus()
+    run_id = uuid.uuid4()
+    node = Node(name="node")
+    subscription = bus.subscribe(maxsize=2)
+
+    bus.publish(LogChunk(run_id=run_id, node=node, artifact="stdout", data=b"out\n"))
+    bus.publish(LogChunk(run_id=run_id, node=node, artifact="stderr", data=b"err\n"))
+    bus.publish(LogChunk(run_id=run_id, node=node, artifact="stdout", data=b"more\n"))
+    bus.publish(NodeFinished(run_id=run_id, node=node, result=NodeResult.SUCCESS))
+
+    assert subscription.dropped == 2
+    assert [type(event) for event in subscription._queue] == [LogChunk, NodeFinished]
+    assert subscription._queue[0].data == b"err\n"  # type: ignore[attr-defined]
+
+
+@pytest.mark.asyncio
+async def test_lossless_subscriber_holds_back_producer():
+    bus = EventBus()
+    run_id = uuid.uuid4()
+    nodes = [Node(name="a"), Node(name="b")]
+    subscription = bus.subscribe(maxsize=2, run_id=run_id, lossless=True)
+
+    async def produce() -> None:
+        for i in range(10):
+            chunk = LogChunk(run_id=run_id, node=nodes[i % 2], artifact="stdout", data=b"%d\n" % i)
+            bus.publish(chunk)
+            await bus.drain(chunk)
+        bus.publish(RunFinished(run_id=run_id, exit_code=0))
+
+    producer = asyncio.create_task(produce())
+    await asyncio.sleep(0.01)
+    assert not producer.done()
+    assert len(subscription._queue) == 2
+    received = [event async for event in subscription]
+    await producer
+
+    assert subscription.dropped == 0
+    assert [event.data for event in received if isinstance(event, LogChunk)] == [b"%d\n" % i for i in range(10)]
+    assert isinstance(received[-1], RunFinished)
+
+
+@pytest.mark.asyncio
+async def test_run_subscription_ends_with_its_run():
+    bus = EventBus()
+    run_id, other_run_id = uuid.uuid4(), uuid.uuid4()
+    subscription = bus.subscribe(run_id=run_id)
+
+    async def publish() -> None:
+        await asyncio.sleep(0)
+        bus.publish(RunStarted(run_id=other_run_id, workflow="other"))
+        bus.publish(RunStarted(run_id=run_id, workflow="mine"))
+        bus.publish(RunFinished(run_id=run_id, exit_code=0))
+        bus.publish(RunFinished(run_id=other_run_id, exit_code=0))
+
+    task = asyncio.create_task(publish())
+    received = [event async for event in subscription]
+    await task
+
+    assert [event.run_id for event in received] == [run_id, run_id]
+    assert not bus
@@ -0,0 +1,124 @@
+from pathlib import Path
+
+import pytest
+
+from wtflow.config import BundleStorageConfig, Config, LocalStorageConfig
+from wtflow.infra.artifact import Artifact
+from wtflow.infra.engine import Engine, Executor, ExitCode
+from wtflow.infra.handoff import Capture, Handoff, env_name
+from wtflow.infra.nodes import Matrix, Node, TreeNode
+from wtflow.infra.workflow import Tree
+from wtflow.services.db.db_service import NoDBService
+from wtflow.services.servicer import Servicer
+
+
+def test_env_name():
+    assert env_name(Node(name="build"), Artifact("stdout")) == "WTFLOW_BUILD_STDOUT"
+    assert env_name(Node(name="tests[shard=1]"), Artifact("junit-report")) == "WTFLOW_TESTS_SHARD_1_JUNIT_REPORT"
+
+
+def test_capture_overflow():
+    capture = Capture(limit=8)
+    capture.write(b"1234")
+    capture.write(b"5678")
+    assert capture.buffer == b"12345678" and not capture.overflowed
+    capture.write(b"9")
+    assert capture.overflowed and not capture.buffer
+
+
+def test_segments_are_read_only_and_removed():
+    handoff = Handoff()
+    node = Node(name="node")
+    handoff.publish_data(node, node, Artifact("stdout"), b"data")
+    path = handoff.environment([node])["WTFLOW_NODE_STDOUT"]
+    assert Path(path).read_bytes() == b"data"
+    assert Path(path).stat().st_mode & 0o777 == 0o444
+    handoff.close()
+    assert handoff.environment([node]) == {}
+    assert not Path(path).exists()
+
+
+@pytest.mark.asyncio
+async def test_parent_reads_children_outputs(tmp_path):
+    wf = Tree(
+        name="test handoff",
+        root=TreeNode(
+            name="parent",
+            command='cat "$WTFLOW_CHILD_STDOUT" "$WTFLOW_BUILD_REPORT" "$WTFLOW_SHARD_N_2_STDOUT"',
+            children=[
+                TreeNode(name="child", command="echo hello"),
+                TreeNode(
+                    name="build",
+                    command=f"echo report > {tmp_path}/report.txt",
+                    artifacts=(Artifact("report", path=str(tmp_path / "report.txt")),),
+                ),
+                TreeNode(name="shard", command="echo shard {n}", matrix=Matrix.of(n=[1, 2])),
+            ],
+        ),
+    )
+    data_dir = tmp_path / "data"
+    config = Config(storage=LocalStorageConfig(base_path=data_dir))
+    assert await Engine(config).run_workflow(wf) == ExitCode.SUCCESS
+    [stdout] = data_dir.glob("test handoff/*/parent/stdout.txt")
+    assert stdout.read_text() == "hello\nreport\nshard 2\n"
+
+
+def test_empty_outputs_share_a_file():
+    handoff = Handoff()
+    a, b = Node(name="a"), Node(name="b")
+    handoff.publish_data(a, a, Artifact("stdout"), b"")
+    handoff.publish_data(b, b, Artifact("stdout"), b"")
+    paths = {handoff.environment([a])["WTFLOW_A_STDOUT"], handoff.environment([b])["WTFLOW_B_STDOUT"]}
+    assert len(paths) == 1
+    assert Path(paths.pop()).read_bytes() == b""
+    assert len(list(handoff._segment_directory().iterdir())) == 1
+    handoff.close()
+
+
+@pytest.mark.asyncio
+async def test_large_output_handed_off_from_local_storage(tmp_path):
+    wf = Tree(
+        name="test handoff stored",
+        root=TreeNode(
+            name="parent",
+            command='wc -l < "$WTFLOW_CHILD_STDOUT"',
+            children=[TreeNode(name="child", command="seq 1000")],
+        ),
+    )
+    data_dir = tmp_path / "data"
+    servicer = Engine(Config(storage=LocalStorageConfig(base_path=data_dir))).servicer
+    executor = Executor(wf.as_graph(), servicer, handoff_limit=100)
+    assert await executor.execute() == ExitCode.SUCCESS
+    [stdout] = data_dir.glob("test handoff stored/*/parent/stdout.txt")
+    assert stdout.read_text().strip() == "1000"
+
+
+@pytest.mark.asyncio
+async def test_large_output_handed_off_from_spilled_bundle(tmp_path):
+    wf = Tree(
+        name="test handoff bundle",
+        root=TreeNode(
+            name="parent",
+            command='wc -l < "$WTFLOW_CHILD_STDOUT"',
+            children=[TreeNode(name="child", command="seq 1000")],
+        ),
+    )
+    storage = BundleStorageConfig(base_path=tmp_path / "data", spill_threshold=1000).create_storage_service()
+    executor = Executor(wf.as_graph(), Servicer(NoDBService(), storage), handoff_limit=100)
+    assert await executor.execute() == ExitCode.SUCCESS
+    parent = next(node for node in executor.graph.nodes if node.name == "parent")
+    assert storage.read_artifact(executor.run_info, parent, Artifact("stdout")).strip() == b"1000"
+
+
+@pytest.mark.parametrize("command, level", [('test -z "$WTFLOW_CHILD_STDOUT"', "WARNING"), ("true", "DEBUG")])
+@pytest.mark.asyncio
+async def test_large_output_is_not_handed_off(caplog, command, level):
+    caplog.set_level("DEBUG", logger="wtflow.infra.engine")
+    wf = Tree(
+        name="test handoff limit",
+        root=TreeNode(name="parent", command=command, children=[TreeNode(name="child", command="seq 1000")]),
+    )
+    executor = Executor(wf.as_graph(), Engine(Config()).servicer, handoff_limit=100)
+    assert await executor.execute() == ExitCode.SUCCESS
+    [record] = [record for record in caplog.records if "over the hand-off limit" in record.getMessage()]
+    assert record.levelname == level
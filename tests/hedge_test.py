@@ -0,0 +1,78 @@
+import sqlite3
+import time
+
+import pytest
+
+from wtflow.config import Config
+from wtflow.infra.engine import Engine, Executor, ExitCode, NodeResult
+from wtflow.infra.events import LogChunk
+from wtflow.infra.hedge import percentile
+from wtflow.infra.nodes import Hedge, Node, TreeNode
+from wtflow.infra.workflow import Tree
+
+
+def test_percentile():
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 95) == 95.0
+    assert percentile(values, 100) == 100.0
+    assert percentile([3.0], 50) == 3.0
+
+
+def test_hedge_requires_idempotent():
+    with pytest.raises(ValueError):
+        Node(name="node", command="true", hedge=Hedge(delay=1.0))
+    assert Node(name="node", command="true", idempotent=True, hedge=Hedge()).instance({}).hedge == Hedge()
+
+
+@pytest.mark.asyncio
+async def test_straggler_is_hedged(db_config, local_storage_config, data_dir, tmp_path):
+    # The first attempt takes the lock and hangs; the second one finishes at once.
+    command = f"if mkdir {tmp_path}/lock 2>/dev/null; then echo slow; sleep 30; else echo fast; fi"
+    wf = Tree(
+        name="test hedge",
+        root=TreeNode(name="flaky", command=command, idempotent=True, hedge=Hedge(delay=0.3)),
+    )
+    engine = Engine(Config(database=db_config, storage=local_storage_config))
+
+    start = time.monotonic()
+    assert await engine.run_workflow(wf) == ExitCode.SUCCESS
+    assert time.monotonic() - start < 10
+    assert engine.metrics.hedges == 1
+
+    [stdout] = data_dir.glob("test hedge/*/flaky/stdout.txt")
+    assert stdout.read_text() == "fast\n"
+    with sqlite3.connect(db_config.database_path) as conn:
+        attempts = conn.execute("SELECT attempt, result FROM executions ORDER BY attempt").fetchall()
+    assert attempts == [(0, NodeResult.CANCEL), (1, NodeResult.SUCCESS)]
+
+
+@pytest.mark.asyncio
+async def test_only_winner_output_published(tmp_path):
+    command = f"if mkdir {tmp_path}/lock 2>/dev/null; then echo slow; sleep 30; else echo fast; fi"
+    wf = Tree(
+        name="test hedge events",
+        root=TreeNode(name="flaky", command=command, idempotent=True, hedge=Hedge(delay=0.3)),
+    )
+    chunks = [event.data async for event in Engine(Config()).run_workflow_events(wf) if isinstance(event, LogChunk)]
+    assert chunks == [b"fast\n"]
+
+
+@pytest.mark.asyncio
+async def test_fast_node_is_not_hedged(db_config):
+    node = TreeNode(name="fast", command="true", idempotent=True, hedge=Hedge(delay=5.0))
+    engine = Engine(Config(database=db_config))
+    assert await engine.run_workflow(Tree(name="test no hedge", root=node)) == ExitCode.SUCCESS
+    assert engine.metrics.hedges == 0
+
+
+@pytest.mark.asyncio
+async def test_threshold_from_history(db_config):
+    node = TreeNode(name="node", command="sleep 0.1", idempotent=True, hedge=Hedge(percentile=50, min_samples=3))
+    wf = Tree(name="test hedge history", root=node)
+    engine = Engine(Config(database=db_config))
+
+    assert await Executor(wf.as_graph(), engine.servicer)._hedge_delay(node) is None
+    for _ in range(3):
+        assert await engine.run_workflow(wf) == ExitCode.SUCCESS
+    delay = await Executor(wf.as_graph(), engine.servicer)._hedge_delay(node)
+    assert delay is not None and 0.1 <= delay < 5
@@ -0,0 +1,150 @@
+import os
+import shutil
+from contextlib import ExitStack
+
+import pytest
+
+from wtflow.config import Config, LocalStorageConfig
+from wtflow.infra.artifact import Artifact
+from wtflow.infra.engine import Engine, ExitCode
+from wtflow.infra.info import RunInfo
+from wtflow.infra.nodes import Matrix, Node, TreeNode
+from wtflow.infra.workflow import Graph, Tree
+from wtflow.services.storage.local import file_copy
+from wtflow.services.storage.local.file_copy import ShortCopyError, copy_file
+from wtflow.services.storage.local.line_index import index_path
+from wtflow.services.storage.local.local_storage_service import LocalStorageService
+
+NODE = Node(name="node")
+RUN = RunInfo(graph=Graph(name="graph", nodes=(NODE,)))
+STDOUT = Artifact("stdout")
+
+
+@pytest.fixture()
+def storage(data_dir):
+    storage = LocalStorageService(data_dir)
+    with storage.open_artifact(RUN, NODE, STDOUT) as f:
+        for i in range(10_000):
+            f.write(f"line {i}\n".encode())
+        f.write(b"partial")
+    return storage
+
+
+def test_read_artifact(storage):
+    data = storage.read_artifact(RUN, NODE, STDOUT)
+    assert data.startswith(b"line 0\nline 1\n")
+    assert data.endswith(b"line 9999\npartial")
+
+
+def test_tail_artifact(storage):
+    assert storage.tail_artifact(RUN, NODE, STDOUT, 3) == [b"line 9998\n", b"line 9999\n", b"partial"]
+    assert storage.tail_artifact(RUN, NODE, STDOUT, 0) == []
+    assert len(storage.tail_artifact(RUN, NODE, STDOUT, 100_000)) == 10_001
+
+
+def test_iter_lines(storage):
+    assert list(storage.iter_lines(RUN, NODE, STDOUT, 5, 7)) == [b"line 5\n", b"line 6\n"]
+    assert list(storage.iter_lines(RUN, NODE, STDOUT, 10_000)) == [b"partial"]
+
+
+def test_index_written_while_writing(storage, data_dir):
+    path = data_dir / "graph" / str(RUN.run_id) / "node" / "stdout.txt"
+    assert index_path(path).stat().st_size == 10_000 * 8
+
+
+def test_append_and_stale_index(storage, data_dir):
+    with storage.open_artifact(RUN, NODE, STDOUT) as f:
+        f.write(b" line\nlast\n")
+    assert storage.tail_artifact(RUN, NODE, STDOUT, 2) == [b"partial line\n", b"last\n"]
+
+    path = data_dir / "graph" / str(RUN.run_id) / "node" / "stdout.txt"
+    index_path(path).unlink()
+    assert list(storage.iter_lines(RUN, NODE, STDOUT, 1, 2)) == [b"line 1\n"]
+    assert index_path(path).exists()
+
+
+def test_handle_pool_bounds_open_files(data_dir):
+    storage = LocalStorageService(data_dir, max_open_files=2)
+    nodes = [Node(name=f"node-{i}") for i in range(5)]
+    with ExitStack() as stack:
+        writers = [stack.enter_context(storage.open_artifact(RUN, node, STDOUT)) for node in nodes]
+        for i in range(3):
+            for writer in writers:
+                writer.write(f"{i}\n".encode())
+                assert len(storage.pool) <= 2
+    assert len(storage.pool) == 0
+    for node in nodes:
+        assert storage.read_artifact(RUN, node, STDOUT) == b"0\n1\n2\n"
+        assert storage.tail_artifact(RUN, node, STDOUT, 1) == [b"2\n"]
+
+
+def test_runs_do_not_share_artifacts(data_dir):
+    storage = LocalStorageService(data_dir)
+    other = RunInfo(graph=RUN.graph)
+    for run_info in (RUN, other):
+        with storage.open_artifact(run_info, NODE, STDOUT) as f:
+            f.write(f"{run_info.run_id}\n".encode())
+    assert storage.read_artifact(RUN, NODE, STDOUT) == f"{RUN.run_id}\n".encode()
+    assert storage.read_artifact(other, NODE, STDOUT) == f"{other.run_id}\n".encode()
+
+
+def test_copy_file(tmp_path):
+    source = tmp_path / "source.bin"
+    source.write_bytes(b"x" * 100_000)
+
+    assert copy_file(source, tmp_path / "copy.bin") in {"reflink", "copy_file_range", "sendfile", "copy"}
+    assert (tmp_path / "copy.bin").read_bytes() == source.read_bytes()
+
+    assert copy_file(source, tmp_path / "link.bin", link=True) == "hardlink"
+    assert (tmp_path / "link.bin").stat().st_ino == source.stat().st_ino
+
+
+def test_short_copy_falls_through(tmp_path, monkeypatch):
+    source = tmp_path / "source.bin"
+    source.write_bytes(bytes(range(256)) * 400)
+    real_copy_file_range = os.copy_file_range
+
+    def short_copy_file_range(src, dst, count, offset_src=None, offset_dst=None):
+        if offset_src:
+            return 0
+        return real_copy_file_range(src, dst, min(count, 1000), offset_src, offset_dst)
+
+    monkeypatch.setattr(file_copy, "_METHODS", [("copy_file_range", file_copy._copy_file_range)])
+    monkeypatch.setattr(os, "copy_file_range", short_copy_file_range)
+    assert copy_file(source, tmp_path / "copy.bin") == "copy"
+    assert (tmp_path / "copy.bin").read_bytes() == source.read_bytes()
+
+    monkeypatch.setattr(shutil, "copyfile", lambda src, dst: dst.write_bytes(src.read_bytes()[:1000]))
+    with pytest.raises(ShortCopyError):
+        copy_file(source, tmp_path / "copy.bin")
+
+
+@pytest.mark.asyncio
+async def test_collect_artifacts(data_dir, tmp_path):
+    report = Artifact("report", "json", path=str(tmp_path / "report-{shard}.json"))
+    wf = Tree(
+        name="test collect",
+        root=TreeNode(
+            name="tests",
+            command=f"echo shard {{shard}} > {tmp_path}/report-{{shard}}.json",
+            artifacts=(report,),
+            matrix=Matrix.of(shard=[1, 2]),
+        ),
+    )
+    config = Config(storage=LocalStorageConfig(base_path=data_dir))
+    assert await Engine(config).run_workflow(wf) == ExitCode.SUCCESS
+
+    [stored_1] = data_dir.glob("test collect/*/tests[[]shard=1]/report.json")
+    [stored_2] = data_dir.glob("test collect/*/tests[[]shard=2]/report.json")
+    assert stored_1.read_text() == "shard 1\n"
+    assert stored_2.read_text() == "shard 2\n"
+
+
+@pytest.mark.asyncio
+async def test_missing_artifact_fails_node(data_dir, tmp_path):
+    wf = Tree(
+        name="test missing",
+        root=TreeNode(name="node", command="true", artifacts=(Artifact("report", path=str(tmp_path / "nope")),)),
+    )
+    config = Config(storage=LocalStorageConfig(base_path=data_dir))
+    assert await Engine(config).run_workflow(wf) == ExitCode.FAIL
@@ -0,0 +1,81 @@
+import json
+import os
+import sqlite3
+
+import pytest
+
+from wtflow.config import Config, LogDBConfig
+from wtflow.infra.engine import Engine
+from wtflow.infra.nodes import TreeNode
+from wtflow.infra.workflow import Tree
+from wtflow.services.db.log.compactor import LogCompactor
+
+WF = Tree(
+    name="test with log db",
+    root=TreeNode(
+        name="Root Node",
+        children=[
+            TreeNode(name="Node 1", command="echo 'Hello'"),
+            TreeNode(name="Node 2", command="echo 'World'"),
+        ],
+    ),
+)
+
+
+@pytest.mark.asyncio
+async def test_events_appended_to_segment(data_dir):
+    engine = Engine(config=Config(database=LogDBConfig(directory=str(data_dir / "log"))))
+    assert await engine.run_workflow(WF) == 0
+
+    (segment,) = (data_dir / "log").glob("*.jsonl")
+    records = [json.loads(line) for line in segment.read_text().splitlines()]
+    assert [r["type"] for r in records[:2]] == ["graph", "run_start"]
+    assert records[-1]["type"] == "run_finish"
+    assert sum(r["type"] == "execution_finish" for r in records) == 3
+
+
+@pytest.mark.asyncio
+async def test_background_compaction(data_dir):
+    database_path = data_dir / "history.db"
+    config = Config(database=LogDBConfig(directory=str(data_dir / "log"), compact_to=str(database_path)))
+    engine = Engine(config=config)
+    assert await engine.run_workflow(WF) == 0
+    assert await engine.run_workflow(WF) == 0
+
+    with sqlite3.connect(database_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM runs WHERE end_time IS NOT NULL").fetchone() == (2,)
+        assert conn.execute("SELECT COUNT(*) FROM executions WHERE end_time IS NOT NULL").fetchone() == (6,)
+        assert conn.execute("SELECT COUNT(*) FROM nodes").fetchone() == (3,)
+        assert conn.execute("SELECT COUNT(*), SUM(size) FROM artifacts").fetchone() == (8, 24)
+
+    assert LogCompactor(data_dir / "log", database_path).compact() == 0
+
+
+@pytest.mark.asyncio
+async def test_segment_per_process(data_dir):
+    engine = Engine(config=Config(database=LogDBConfig(directory=str(data_dir / "log"))))
+    assert await engine.run_workflow(WF) == 0
+    (segment,) = (data_dir / "log").glob("*.jsonl")
+    assert segment.name.endswith(f".{os.getpid()}.jsonl")
+
+
+@pytest.mark.asyncio
+async def test_malformed_records_skipped(data_dir, caplog):
+    directory = data_dir / "log"
+    database_path = data_dir / "history.db"
+    engine = Engine(config=Config(database=LogDBConfig(directory=str(directory))))
+    assert await engine.run_workflow(WF) == 0
+    (segment,) = directory.glob("*.jsonl")
+    lines = segment.read_bytes().splitlines(keepends=True)
+    lines.insert(1, b'{"type": "run_start", "run_id": \n')
+    lines.insert(2, b'{"type": "graph", "digest": "x", "name": "x", "nodes": [[1]]}\n')
+    segment.write_bytes(b"".join(lines))
+
+    assert LogCompactor(directory, database_path).compact() == len(lines) - 2
+    assert caplog.text.count("Skipping malformed record") == 2
+    with sqlite3.connect(database_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM runs WHERE end_time IS NOT NULL").fetchone() == (1,)
+        assert conn.execute("SELECT COUNT(*) FROM graphs").fetchone() == (1,)
+
+    assert await engine.run_workflow(WF) == 0
+    assert LogCompactor(directory, database_path).compact() > 0
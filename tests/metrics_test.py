@@ -0,0 +1,116 @@
+import asyncio
+import json
+
+import pytest
+
+from wtflow.config import Config, MetricsConfig
+from wtflow.infra.engine import Engine, ExitCode
+from wtflow.infra.metrics import Histogram
+from wtflow.infra.nodes import Matrix, TreeNode
+from wtflow.infra.workflow import Tree
+
+
+async def _get(path: str, *, host: str = "127.0.0.1", port: int = 0, unix_path: str | None = None) -> tuple[str, str]:
+    if unix_path is not None:
+        reader, writer = await asyncio.open_unix_connection(unix_path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+    response = (await reader.read()).decode()
+    writer.close()
+    await writer.wait_closed()
+    head, _, body = response.partition("\r\n\r\n")
+    return head.split("\r\n")[0], body
+
+
+def _sample(text: str, name: str) -> float:
+    for line in text.splitlines():
+        if line.startswith(f"{name} "):
+            return float(line.split()[1])
+    raise KeyError(name)
+
+
+def test_histogram():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(value)
+
+    assert histogram.render("h") == [
+        'h_bucket{le="0.1"} 1',
+        'h_bucket{le="1.0"} 3',
+        'h_bucket{le="+Inf"} 4',
+        "h_sum 4.25",
+        "h_count 4",
+    ]
+
+
+def test_parse_metrics_address():
+    assert MetricsConfig.parse("9200") == MetricsConfig(port=9200)
+    assert MetricsConfig.parse("0.0.0.0:9200") == MetricsConfig(host="0.0.0.0", port=9200)
+    assert MetricsConfig.parse("/run/wtflow.sock") == MetricsConfig(unix_path="/run/wtflow.sock")
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint():
+    wf = Tree(
+        name="test metrics",
+        root=TreeNode(
+            name="Root Node",
+            children=[
+                TreeNode(name="Node 1", command="echo hello"),
+                TreeNode(name="Node 2", command="echo {n}", matrix=Matrix.of(n=[1, 2, 3])),
+            ],
+        ),
+    )
+    engine = Engine(Config(metrics=MetricsConfig(port=0, lag_interval=0.01)))
+    try:
+        assert await engine.run_workflow(wf) == ExitCode.SUCCESS
+        assert engine.metrics_server is not None
+        host, port = engine.metrics_server.address[:2]
+
+        status_line, body = await _get("/metrics", host=host, port=port)
+        assert status_line == "HTTP/1.1 200 OK"
+        assert _sample(body, "wtflow_nodes_completed_total") == 5
+        assert _sample(body, "wtflow_nodes_running") == 0
+        assert _sample(body, "wtflow_nodes_queued") == 0
+        assert _sample(body, 'wtflow_node_results_total{result="success"}') == 5
+        assert _sample(body, "wtflow_captured_bytes_total") == len(b"hello\n1\n2\n3\n")
+        assert _sample(body, "wtflow_spawn_latency_seconds_count") == 4
+        assert _sample(body, "wtflow_db_write_latency_seconds_count") == 12
+        assert _sample(body, "wtflow_event_loop_lag_seconds") >= 0
+
+        status_line, body = await _get("/status", host=host, port=port)
+        assert status_line == "HTTP/1.1 200 OK"
+        status = json.loads(body)
+        assert status["runs"] == []
+        assert status["last_run"]["workflow"] == "test metrics"
+        assert status["last_run"]["results"] == {"success": 5}
+        assert status["last_run"]["exit_code"] == ExitCode.SUCCESS
+
+        status_line, _ = await _get("/nope", host=host, port=port)
+        assert status_line == "HTTP/1.1 404 Not Found"
+    finally:
+        await engine.close()
+
+
+@pytest.mark.asyncio
+async def test_status_during_run(tmp_path):
+    unix_path = str(tmp_path / "metrics.sock")
+    wf = Tree(name="test status", root=TreeNode(name="slow", command="sleep 0.5"))
+    engine = Engine(Config(metrics=MetricsConfig(unix_path=unix_path)))
+    try:
+        task = asyncio.create_task(engine.run_workflow(wf))
+        while not engine.metrics.running:
+            await asyncio.sleep(0.01)
+
+        _, body = await _get("/status", unix_path=unix_path)
+        [run] = json.loads(body)["runs"]
+        assert run["workflow"] == "test status"
+        assert list(run["running"]) == ["slow"]
+
+        _, body = await _get("/metrics", unix_path=unix_path)
+        assert _sample(body, "wtflow_nodes_running") == 1
+        assert _sample(body, "wtflow_runs_active") == 1
+        assert await task == ExitCode.SUCCESS
+    finally:
+        await engine.close()
@@ -0,0 +1,106 @@
+import asyncio
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from wtflow.config import Config, LocalStorageConfig
+from wtflow.infra.engine import Engine, ExitCode
+from wtflow.infra.nodes import Resources, TreeNode
+from wtflow.infra.resources import CoreAllocator, available_cpus, resource_setter
+from wtflow.infra.workflow import Tree
+
+
+async def _run_node(tmp_path: Path, node: TreeNode) -> str:
+    config = Config(storage=LocalStorageConfig(base_path=tmp_path))
+    assert await Engine(config).run_workflow(Tree(name="test resources", root=node)) == ExitCode.SUCCESS
+    [stdout] = tmp_path.glob(f"test resources/*/{node.name}/stdout.txt")
+    return stdout.read_text()
+
+
+@pytest.mark.asyncio
+async def test_allocator_serves_requests_in_order():
+    allocator = CoreAllocator([0, 1, 2, 3])
+    first = await allocator.acquire(3)
+    assert first == (0, 1, 2)
+
+    big = asyncio.create_task(allocator.acquire(2))
+    small = asyncio.create_task(allocator.acquire(1))
+    await asyncio.sleep(0)
+    assert not big.done() and not small.done()
+
+    allocator.release(first)
+    assert await big == (0, 1)
+    assert await small == (2,)
+    assert allocator.free == 1
+
+    allocator.release(await big)
+    allocator.release(await small)
+    assert await allocator.acquire(10) == (0, 1, 2, 3)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_request_gives_up_its_place():
+    allocator = CoreAllocator([0, 1])
+    held = await allocator.acquire(2)
+    waiting = asyncio.create_task(allocator.acquire(2))
+    await asyncio.sleep(0)
+    waiting.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiting
+    allocator.release(held)
+    assert allocator.free == 2
+
+
+def test_reserved_core_is_not_allocated():
+    allocator = CoreAllocator([0, 1, 2], reserved=0)
+    assert allocator.cpus == (1, 2)
+
+
+@pytest.mark.asyncio
+async def test_cpu_affinity(tmp_path):
+    cpu = available_cpus()[-1]
+    node = TreeNode(
+        name="pinned",
+        command=f"{sys.executable} -c 'import os; print(sorted(os.sched_getaffinity(0)))'",
+        resources=Resources(cpus=(cpu,)),
+    )
+    assert await _run_node(tmp_path, node) == f"[{cpu}]\n"
+
+
+@pytest.mark.asyncio
+async def test_allocated_cores(tmp_path):
+    node = TreeNode(
+        name="allocated",
+        command=f"{sys.executable} -c 'import os; print(len(os.sched_getaffinity(0)))'",
+        resources=Resources(cores=1),
+    )
+    assert await _run_node(tmp_path, node) == "1\n"
+
+
+@pytest.mark.asyncio
+async def test_nice_and_limits(tmp_path):
+    node = TreeNode(
+        name="limited",
+        command=f"{sys.executable} -c 'import os; print(os.nice(0))' && ulimit -n && ulimit -v",
+        resources=Resources(nice=5, max_open_files=64, max_memory=2 * 1024**3),
+    )
+    assert await _run_node(tmp_path, node) == f"5\n64\n{2 * 1024**2}\n"
+
+
+@pytest.mark.skipif(shutil.which("ionice") is None, reason="ionice is not installed")
+@pytest.mark.asyncio
+async def test_ionice(tmp_path):
+    node = TreeNode(name="ionice", command="ionice -p $$", resources=Resources(ionice=6))
+    assert await _run_node(tmp_path, node) == "best-effort: prio 6\n"
+
+
+def test_failed_setting_raises():
+    exited = subprocess.Popen(["true"])
+    exited.wait()
+    setter = resource_setter(Resources(ionice=6), None)
+    assert setter is not None
+    with pytest.raises(ProcessLookupError):
+        setter(exited.pid)
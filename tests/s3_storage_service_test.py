@@ -0,0 +1,208 @@
+import asyncio
+import threading
+import time
+import urllib.parse
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from wtflow.config import Config, S3StorageConfig
+from wtflow.infra.artifact import Artifact
+from wtflow.infra.engine import Engine
+from wtflow.infra.info import RunInfo
+from wtflow.infra.nodes import Node, TreeNode
+from wtflow.infra.workflow import Graph, Tree
+from wtflow.services.storage.s3 import s3_storage_service
+from wtflow.services.storage.s3.s3_client import S3Error
+from wtflow.services.storage.s3.s3_storage_service import S3StorageService
+
+
+class FakeS3:
+    def __init__(self):
+        self.objects: dict[str, bytes] = {}
+        self.uploads: dict[str, dict[int, bytes]] = {}
+        self.part_delay = 0.0
+        self.part_gate = threading.Event()
+        self.part_gate.set()
+        self.connections = 0
+        self.failing: str | None = None
+
+
+def _handler(s3: FakeS3) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            s3.connections += 1
+
+        def log_message(self, format, *args):
+            pass
+
+        def _parse(self):
+            url = urllib.parse.urlsplit(self.path)
+            query = dict(urllib.parse.parse_qsl(url.query, keep_blank_values=True))
+            body = self.rfile.read(int(self.headers.get("content-length", 0)))
+            assert self.headers["authorization"].startswith("AWS4-HMAC-SHA256 Credential=key/")
+            return urllib.parse.unquote(url.path), query, body
+
+        def _reply(self, status=200, body=b"", headers=None):
+            self.send_response(status)
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.send_header("content-length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            path, query, body = self._parse()
+            if "uploads" in query:
+                upload_id = uuid.uuid4().hex
+                s3.uploads[upload_id] = {}
+                result = (
+                    f"<InitiateMultipartUploadResult><UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>"
+                )
+                self._reply(body=result.encode())
+            else:
+                parts = s3.uploads.pop(query["uploadId"])
+                assert body.count(b"<Part>") == len(parts)
+                s3.objects[path] = b"".join(parts[n] for n in sorted(parts))
+                self._reply(body=b"<CompleteMultipartUploadResult/>")
+
+        def do_PUT(self):
+            path, query, body = self._parse()
+            if s3.failing is not None and s3.failing in path:
+                self._reply(500, b"<Error><Code>InternalError</Code></Error>")
+            elif "uploadId" in query:
+                time.sleep(s3.part_delay)
+                s3.part_gate.wait()
+                s3.uploads[query["uploadId"]][int(query["partNumber"])] = body
+                self._reply(headers={"ETag": f'"{uuid.uuid4().hex}"'})
+            else:
+                s3.objects[path] = body
+                self._reply()
+
+        def do_GET(self):
+            path, _, _ = self._parse()
+            if path in s3.objects:
+                self._reply(body=s3.objects[path])
+            else:
+                self._reply(404, b"<Error><Code>NoSuchKey</Code></Error>")
+
+        def do_DELETE(self):
+            _, query, _ = self._parse()
+            s3.uploads.pop(query["uploadId"], None)
+            self._reply(204)
+
+    return Handler
+
+
+@pytest.fixture()
+def fake_s3():
+    s3 = FakeS3()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(s3))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield s3, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def _config(endpoint_url, **kwargs):
+    return S3StorageConfig(
+        bucket="bucket",
+        endpoint_url=endpoint_url,
+        access_key="key",
+        secret_key="secret",
+        **kwargs,
+    )
+
+
+@pytest.fixture()
+def small_parts(monkeypatch):
+    monkeypatch.setattr(s3_storage_service, "MIN_PART_SIZE", 1)
+
+
+def test_part_size_validated():
+    with pytest.raises(ValueError):
+        _config("http://127.0.0.1", part_size=1024).create_storage_service()
+
+
+@pytest.mark.asyncio
+async def test_multipart_upload(fake_s3, small_parts):
+    s3, endpoint_url = fake_s3
+    s3.part_delay = 0.1
+    storage = _config(endpoint_url, part_size=10, max_concurrency=4).create_storage_service()
+    run_info = RunInfo(graph=Graph(name="wf"))
+    node = Node(name="node")
+    stdout = Artifact("stdout")
+
+    start = time.perf_counter()
+    with storage.open_artifact(run_info, node, stdout) as f:
+        for i in range(8):
+            f.write(f"line {i:04}\n".encode())
+    assert time.perf_counter() - start < 0.1
+
+    await storage.flush()
+    assert s3.connections <= 4
+    assert storage.read_artifact(run_info, node, stdout) == b"".join(f"line {i:04}\n".encode() for i in range(8))
+    assert storage.tail_artifact(run_info, node, stdout, 1) == [b"line 0007\n"]
+    assert not s3.uploads
+
+
+@pytest.mark.asyncio
+async def test_parts_in_flight_bounded(fake_s3, small_parts):
+    s3, endpoint_url = fake_s3
+    s3.part_gate.clear()
+    storage = _config(endpoint_url, part_size=10, max_concurrency=1).create_storage_service()
+    assert isinstance(storage, S3StorageService)
+    run_info = RunInfo(graph=Graph(name="wf"))
+    node = Node(name="node")
+
+    with storage.open_artifact(run_info, node, Artifact("stdout")) as f:
+        f.write(b"line 0000\n")
+        assert not f.congested
+        f.write(b"line 0001\n")
+        assert f.congested
+        drain = asyncio.create_task(f.drain())
+        await asyncio.sleep(0.2)
+        assert not drain.done()
+        s3.part_gate.set()
+        await asyncio.wait_for(drain, 5)
+        for i in range(2, 6):
+            f.write(f"line {i:04}\n".encode())
+
+    await storage.flush()
+    assert storage.read_artifact(run_info, node, Artifact("stdout")) == b"".join(
+        f"line {i:04}\n".encode() for i in range(6)
+    )
+    assert storage._executor is None
+
+
+@pytest.mark.asyncio
+async def test_flush_is_per_run(fake_s3):
+    s3, endpoint_url = fake_s3
+    s3.failing = "/failing/"
+    storage = _config(endpoint_url).create_storage_service()
+    node = Node(name="node")
+    runs = [RunInfo(graph=Graph(name=name)) for name in ("failing", "working")]
+    for run_info in runs:
+        with storage.open_artifact(run_info, node, Artifact("stdout")) as f:
+            f.write(b"output\n")
+
+    await storage.flush(runs[1])
+    with pytest.raises(S3Error):
+        await storage.flush(runs[0])
+
+
+@pytest.mark.asyncio
+async def test_run_with_s3_storage(fake_s3):
+    s3, endpoint_url = fake_s3
+    config = Config(storage=_config(endpoint_url, prefix="runs/"))
+    wf = Tree(name="test s3", root=TreeNode(name="Root Node", command="echo 'Hello'"))
+    engine = Engine(config=config)
+    assert await engine.run_workflow(wf) == 0
+    (key,) = [key for key in s3.objects if key.endswith("/Root Node/stdout.txt")]
+    assert key.startswith("/bucket/runs/test s3/")
+    assert s3.objects[key] == b"Hello\n"
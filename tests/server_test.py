@@ -0,0 +1,106 @@
+import asyncio
+import io
+
+import pytest
+import pytest_asyncio
+
+from wtflow.config import Config, NoStorageConfig
+from wtflow.infra.engine import Engine
+from wtflow.infra.nodes import TreeNode
+from wtflow.infra.server import RunServer, submit
+from wtflow.infra.workflow import Tree
+
+
+@pytest_asyncio.fixture
+async def server(tmp_path):
+    log = tmp_path / "log"
+    workflows = {
+        name: Tree(
+            name=name,
+            root=TreeNode(
+                name="root",
+                command=f"echo {name}; echo {name} > /dev/stderr",
+                children=[
+                    TreeNode(name="step", command=f"echo start >> {log}; sleep 0.2; echo end >> {log}"),
+                ],
+            ),
+        )
+        for name in ("first", "second")
+    }
+    workflows["failing"] = Tree(name="failing", root=TreeNode(name="root", command="exit 3"))
+    workflows["silent"] = Tree(name="silent", root=TreeNode(name="root", command=f"sleep 1; touch {tmp_path}/marker"))
+    server = RunServer(Engine(Config(concurrency=1)), workflows, tmp_path / "wtflow.sock")
+    await server.start()
+    try:
+        yield server
+    finally:
+        await server.close()
+
+
+async def _submit(server, workflow, **kwargs):
+    stdout, stderr = io.BytesIO(), io.BytesIO()
+    exit_code = await submit(server.path, workflow, stdout=stdout, stderr=stderr, **kwargs)
+    return exit_code, stdout.getvalue(), stderr.getvalue()
+
+
+@pytest.mark.asyncio
+async def test_submit_streams_output(server):
+    assert await _submit(server, "first") == (0, b"first\n", b"first\n")
+    assert await _submit(server, "failing") == (1, b"", b"")
+    assert set(server._graphs) == {"first", "failing"}
+
+
+@pytest.mark.asyncio
+async def test_submit_selected_nodes(server):
+    assert await _submit(server, "first", only=["root"]) == (0, b"first\n", b"first\n")
+
+
+@pytest.mark.asyncio
+async def test_submit_errors(server):
+    exit_code, _, stderr = await _submit(server, "missing")
+    assert exit_code == 1
+    assert stderr == b"Error: Workflow 'missing' not found.\n"
+
+    exit_code, _, stderr = await _submit(server, "first", targets=["missing"])
+    assert exit_code == 1
+    assert stderr == b"Error: Node 'missing' not found in workflow 'first'.\n"
+
+
+@pytest.mark.asyncio
+async def test_runs_share_concurrency_budget(server, tmp_path):
+    results = await asyncio.gather(_submit(server, "first"), _submit(server, "second"))
+    assert [exit_code for exit_code, _, _ in results] == [0, 0]
+    assert (tmp_path / "log").read_text() == "start\nend\nstart\nend\n"
+
+
+@pytest.mark.asyncio
+async def test_second_server_refuses_socket(server):
+    with pytest.raises(RuntimeError):
+        await RunServer(server.engine, {}, server.path).start()
+
+
+@pytest.mark.asyncio
+async def test_silent_run_cancelled_on_disconnect(server, tmp_path):
+    reader, writer = await asyncio.open_unix_connection(server.path)
+    writer.write(b'{"workflow": "silent"}\n')
+    await writer.drain()
+    await asyncio.sleep(0.3)
+    writer.close()
+    await writer.wait_closed()
+    await asyncio.sleep(1.5)
+    assert not (tmp_path / "marker").exists()
+    assert not server.engine.metrics.running
+
+
+@pytest.mark.asyncio
+async def test_output_not_lost_when_client_is_slow(tmp_path):
+    children = [TreeNode(name=f"chatty {i}", command="seq 20000") for i in range(4)]
+    workflows = {"chatty": Tree(name="chatty", root=TreeNode(name="root", children=children))}
+    server = RunServer(Engine(Config(storage=NoStorageConfig(echo=False))), workflows, tmp_path / "wtflow.sock", 10)
+    await server.start()
+    try:
+        exit_code, stdout, _ = await _submit(server, "chatty")
+    finally:
+        await server.close()
+    assert exit_code == 0
+    assert sorted(stdout.splitlines()) == sorted(b"%d" % i for i in range(1, 20001) for _ in range(4))
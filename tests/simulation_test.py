@@ -0,0 +1,119 @@
+import asyncio
+import random
+
+import pytest
+
+from wtflow.cli.main import main
+from wtflow.config import Config, Sqlite3Config
+from wtflow.infra.engine import Engine
+from wtflow.infra.nodes import TreeNode
+from wtflow.infra.simulation import Distribution, Durations, VirtualTimeLoop, simulate
+from wtflow.infra.workflow import Tree
+
+
+def _tree(*durations: float) -> Tree:
+    # A root with one child per duration, the duration in the name.
+    children = [TreeNode(name=f"child-{i}-{d}", command=f"sleep {d}") for i, d in enumerate(durations)]
+    return Tree(name="simulated", root=TreeNode(name="root", command="true", children=children))
+
+
+def test_distribution_parse():
+    assert Distribution.parse("fixed:2") == Distribution("fixed", (2.0,))
+    assert Distribution.parse("lognormal:1,0.5") == Distribution("lognormal", (1.0, 0.5))
+    for spec in ("fixed", "uniform:1", "normal:1,2"):
+        with pytest.raises(ValueError):
+            Distribution.parse(spec)
+    rng = random.Random(0)
+    assert all(1 <= Distribution.parse("uniform:1,2").sample(rng) <= 2 for _ in range(100))
+
+
+def test_virtual_time_loop():
+    loop = VirtualTimeLoop()
+    try:
+        assert loop.run_until_complete(asyncio.sleep(3600, result="done")) == "done"
+        assert loop.time() == pytest.approx(3600)
+    finally:
+        loop.close()
+
+
+def test_makespan_and_critical_path():
+    graph = _tree(3, 1, 1, 1).as_graph()
+    history = {node: [1.0 if node.name == "root" else float(node.name.rpartition("-")[2])] for node in graph.nodes}
+    result = simulate(graph, 2, Durations(Distribution.parse("fixed:1"), history))
+
+    # The 3s child alongside three 1s children on the other slot, then the root.
+    assert result.makespan == pytest.approx(4)
+    assert result.busy == pytest.approx(7)
+    assert result.utilisation == pytest.approx(7 / 8)
+    assert result.executions == 5
+    assert [(node.name, start, end) for node, start, end in result.critical_path] == [
+        ("child-0-3", 0, 3),
+        ("root", 3, 4),
+    ]
+
+    # With a single slot nothing overlaps.
+    assert simulate(graph, 1, Durations(Distribution.parse("fixed:1"), history)).makespan == pytest.approx(7)
+
+
+def test_batches_are_simulated(capfd):
+    children = [TreeNode(name=f"child-{i}", command="echo real", batchable=True) for i in range(6)]
+    graph = Tree(name="simulated batch", root=TreeNode(name="root", command="true", children=children)).as_graph()
+    result = simulate(graph, 2, Durations(Distribution.parse("fixed:1")))
+
+    # Two batches of three children, then the root.
+    assert result.makespan == pytest.approx(4)
+    assert result.executions == 7
+    assert "real" not in capfd.readouterr().out
+
+
+def test_simulation_is_deterministic():
+    graph = _tree(*range(20)).as_graph()
+    results = [simulate(graph, 3, Durations(Distribution.parse("exponential:2"), seed=7)) for _ in range(3)]
+    assert results[0] == results[1] == results[2]
+    assert results[0] != simulate(graph, 3, Durations(Distribution.parse("exponential:2"), seed=8))
+
+
+def test_durations_are_capped_by_timeout():
+    node = TreeNode(name="node", command="true", timeout=2.0)
+    durations = Durations(Distribution.parse("fixed:10"))
+    assert durations.sample(node) == 2.0
+    assert durations.sample(TreeNode(name="group")) == 0.0
+
+
+@pytest.mark.asyncio
+async def test_durations_from_history(db_config):
+    wf = Tree(name="history", root=TreeNode(name="root", command="sleep 0.1"))
+    engine = Engine(Config(database=db_config))
+    await engine.run_workflow(wf)
+    graph = wf.as_graph()
+
+    durations = await Durations.from_history(db_config.create_db_service(), graph, Distribution.parse("fixed:100"))
+    [recorded] = durations.history.values()
+    assert 0.1 <= recorded[0] < 5
+    assert durations.sample(graph.nodes[0]) == recorded[0]
+
+
+def test_cli(tmp_path, capsys):
+    wtfile = tmp_path / "wtfile.py"
+    wtfile.write_text("""\
+import wtflow
+
+
+@wtflow.wf(name="wf")
+def workflow():
+    return wtflow.TreeNode(
+        name="root",
+        command="true",
+        children=[wtflow.TreeNode(name=f"child-{i}", command="true") for i in range(4)],
+    )
+""")
+    assert main(["simulate", str(wtfile), "--workflow", "wf", "--slots", "2", "--durations", "fixed:2"]) == 0
+    out = capsys.readouterr().out
+    assert "Makespan: 6.00s" in out
+    assert "Utilisation: 83.3% of 2 slot(s)" in out
+    assert out.splitlines()[-1].endswith("root")
+
+    database = tmp_path / "runs.db"
+    Sqlite3Config(str(database)).create_db_service()
+    assert main(["simulate", str(wtfile), "--workflow", "wf", "--slots", "2", "--database", str(database)]) == 0
+    assert main(["simulate", str(wtfile), "--workflow", "missing", "--slots", "2"]) == 1
@@ -1,9 +1,18 @@
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
 import pytest
 
-from wtflow.config import Config
+from wtflow.config import Config, Sqlite3Config
+from wtflow.infra.artifact import Artifact
 from wtflow.infra.engine import Engine
-from wtflow.infra.nodes import TreeNode
+from wtflow.infra.nodes import Matrix, TreeNode
 from wtflow.infra.workflow import Tree
+from wtflow.services.db.sqlite.sqlite_db_service import SCHEMA_VERSION, Sqlite3DBService
 
 
 @pytest.mark.asyncio
@@ -36,3 +45,132 @@ async def test_with_db_and_storage_config(db_config, local_storage_config):
     )
     engine = Engine(config=config)
     assert await engine.run_workflow(wf) == 0
+
+
+@pytest.mark.asyncio
+async def test_matrix_stored_as_template(db_config):
+    config = Config(database=db_config)
+    wf = Tree(
+        name="test matrix db",
+        root=TreeNode(name="shards", command="true {shard}", matrix=Matrix.of(shard=range(5), python=["a", "b"])),
+    )
+    engine = Engine(config=config)
+    assert await engine.run_workflow(wf) == 0
+
+    with sqlite3.connect(db_config.database_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM nodes").fetchone() == (1,)
+        assert conn.execute("SELECT name FROM node_matrix ORDER BY position").fetchall() == [("shard",), ("python",)]
+        parameters = [json.loads(p) for (p,) in conn.execute("SELECT parameters FROM execution_parameters")]
+        assert len(parameters) == 10
+        assert {"shard": 4, "python": "b"} in parameters
+
+
+def _run_stress_workflow(database_path: str) -> int:
+    wf = Tree(
+        name="test stress",
+        root=TreeNode(name="Root Node", children=[TreeNode(name=f"Node {i}") for i in range(4)]),
+    )
+    return asyncio.run(Engine(Config(database=Sqlite3Config(database_path))).run_workflow(wf))
+
+
+def test_concurrent_processes(data_dir):
+    database_path = str(data_dir / "shared.db")
+    with ProcessPoolExecutor(16, mp_context=multiprocessing.get_context("fork")) as pool:
+        assert list(pool.map(_run_stress_workflow, [database_path] * 16)) == [0] * 16
+
+    with sqlite3.connect(database_path) as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+        assert conn.execute("SELECT COUNT(*), COUNT(DISTINCT uuid), COUNT(end_time) FROM runs").fetchone() == (
+            16,
+            16,
+            16,
+        )
+        assert conn.execute("SELECT COUNT(*), COUNT(DISTINCT uuid), COUNT(end_time) FROM executions").fetchone() == (
+            80,
+            80,
+            80,
+        )
+
+
+def test_schema_upgrade(data_dir):
+    database_path = data_dir / "old.db"
+    with sqlite3.connect(database_path) as conn:
+        conn.executescript(
+            """
+            CREATE TABLE runs (id INTEGER PRIMARY KEY AUTOINCREMENT, graph_digest TEXT NOT NULL);
+            CREATE TABLE executions (id INTEGER PRIMARY KEY AUTOINCREMENT, run_id INTEGER NOT NULL);
+            INSERT INTO runs (graph_digest) VALUES ('old');
+            """
+        )
+
+    Sqlite3DBService(database_path)
+
+    with sqlite3.connect(database_path) as conn:
+        assert conn.execute("PRAGMA user_version").fetchone() == (SCHEMA_VERSION,)
+        assert conn.execute("SELECT graph_digest, uuid FROM runs").fetchall() == [("old", None)]
+        assert {"uuid", "attempt", "result"} <= {row[1] for row in conn.execute("PRAGMA table_info(executions)")}
+        assert conn.execute("SELECT COUNT(*) FROM artifacts").fetchone() == (0,)
+
+
+@pytest.mark.asyncio
+async def test_artifacts_catalogued(db_config, tmp_path):
+    report = tmp_path / "report.txt"
+    wf = Tree(
+        name="test artifacts",
+        root=TreeNode(
+            name="Root Node",
+            command=f"printf 'a\\nb\\nc'; printf 'x\\n' > {report}",
+            artifacts=(Artifact("report", path=str(report)),),
+            children=[TreeNode(name="Node 1", command="echo 'Hello'")],
+        ),
+    )
+    engine = Engine(config=Config(database=db_config))
+    assert await engine.run_workflow(wf) == 0
+    assert await engine.run_workflow(wf) == 0
+
+    with sqlite3.connect(db_config.database_path) as conn:
+        rows = conn.execute(
+            """
+            SELECT nodes.name, artifacts.name, size, lines, checksum, first_write <= last_write
+            FROM artifacts
+            JOIN executions ON executions.id = artifacts.execution_id
+            JOIN nodes ON nodes.digest = executions.node_digest
+            WHERE run_id = (SELECT MAX(id) FROM runs)
+            ORDER BY size DESC, nodes.name, artifacts.name
+            """
+        ).fetchall()
+        changed = conn.execute("SELECT COUNT(DISTINCT checksum) FROM artifacts WHERE name = 'stdout'").fetchone()
+    assert rows == [
+        ("Node 1", "stdout", 6, 1, hashlib.sha256(b"Hello\n").hexdigest(), 1),
+        ("Root Node", "stdout", 5, 3, hashlib.sha256(b"a\nb\nc").hexdigest(), 1),
+        ("Root Node", "report", 2, 1, hashlib.sha256(b"x\n").hexdigest(), 1),
+        ("Node 1", "stderr", 0, 0, hashlib.sha256(b"").hexdigest(), None),
+        ("Root Node", "stderr", 0, 0, hashlib.sha256(b"").hexdigest(), None),
+    ]
+    assert changed == (2,)
+
+
+@pytest.mark.asyncio
+async def test_waiting_for_lock_does_not_block_loop(data_dir):
+    db_service = Sqlite3DBService(data_dir / "locked.db", busy_timeout=0.5)
+    graph = Tree(name="test lock", root=TreeNode(name="node", command="true")).as_graph()
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    with sqlite3.connect(data_dir / "locked.db", isolation_level=None) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        ticker = asyncio.create_task(tick())
+        save = asyncio.create_task(db_service.save_graph(graph))
+        await asyncio.sleep(0.3)
+        assert not save.done()
+        assert ticks >= 10
+        conn.execute("COMMIT")
+    await save
+    ticker.cancel()
+    with sqlite3.connect(data_dir / "locked.db") as conn:
+        assert conn.execute("SELECT name FROM graphs").fetchall() == [("test lock",)]
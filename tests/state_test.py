@@ -0,0 +1,58 @@
+import math
+
+import pytest
+
+from wtflow.config import Config
+from wtflow.infra.engine import Engine, Executor, ExitCode
+from wtflow.infra.info import ExecutionInfo, RunInfo
+from wtflow.infra.nodes import Matrix, Node, TreeNode
+from wtflow.infra.state import NodeState, RunState
+from wtflow.infra.workflow import Tree
+
+
+@pytest.mark.parametrize("record", [Node(name="node"), TreeNode(name="node")])
+def test_records_are_slotted(record):
+    assert not hasattr(record, "__dict__")
+
+
+def test_info_records_are_slotted():
+    graph = Tree(name="wf", root=TreeNode(name="node")).as_graph()
+    assert not hasattr(RunInfo(graph=graph), "__dict__")
+    assert not hasattr(ExecutionInfo(graph=graph, node=graph.nodes[0]), "__dict__")
+
+
+def test_run_state_columns():
+    state = RunState([Node(name="a"), Node(name="b")])
+    assert len(state) == 2
+    assert state.count(NodeState.PENDING) == 2
+    assert math.isnan(state.start_time[0])
+
+    state.queued(0)
+    state.started(0)
+    state.started(0)
+    assert state.get(0) == NodeState.RUNNING
+    assert state.finished(0) == 1
+    assert state.finished(0, failed=True) == 0
+    assert state.get(0) == NodeState.FAILED
+    assert state.start_time[0] <= state.end_time[0]
+    assert state.count(NodeState.PENDING) == 1
+
+
+@pytest.mark.asyncio
+async def test_executor_state_after_run():
+    wf = Tree(
+        name="test state",
+        root=TreeNode(
+            name="Root Node",
+            children=[
+                TreeNode(name="Node 1", command="true"),
+                TreeNode(name="Node 2", command="true", matrix=Matrix.of(n=[1, 2])),
+            ],
+        ),
+    )
+    graph = wf.as_graph()
+    engine = Engine(Config())
+    executor = Executor(graph, engine.servicer)
+    assert await executor.execute() == ExitCode.SUCCESS
+    assert executor.state.count(NodeState.DONE) == len(graph.nodes)
+    assert not any(executor.state.in_flight)
@@ -0,0 +1,87 @@
+import asyncio
+import hashlib
+import io
+
+import pytest
+
+from wtflow.config import Config
+from wtflow.infra.artifact import Artifact
+from wtflow.infra.engine import Engine, ExitCode
+from wtflow.infra.info import RunInfo
+from wtflow.infra.nodes import Node, TreeNode
+from wtflow.infra.workflow import Graph, Tree
+from wtflow.services.storage.storage_service import ArtifactStats, ConsoleSink, NoStorageService
+
+RUN = RunInfo(graph=Graph(name="graph"))
+
+
+class CountingStream(io.BytesIO):
+    writes = 0
+
+    def write(self, data):
+        self.writes += 1
+        return super().write(data)
+
+
+@pytest.mark.asyncio
+async def test_sink_batches_until_timer():
+    stream = CountingStream()
+    sink = ConsoleSink(lambda: stream, flush_interval=0.01)
+    for i in range(100):
+        sink.write(f"{i}\n".encode())
+    assert stream.writes == 0
+    await asyncio.sleep(0.05)
+    assert stream.writes == 1
+    assert stream.getvalue().count(b"\n") == 100
+
+
+def test_sink_flushes_on_size():
+    stream = CountingStream()
+    sink = ConsoleSink(lambda: stream, buffer_size=10)
+    sink.write(b"12345\n")
+    assert stream.writes == 1
+    sink.write(b"1234567890\n")
+    assert stream.getvalue() == b"12345\n1234567890\n"
+
+
+@pytest.mark.asyncio
+async def test_prefixed_lines():
+    storage = NoStorageService(prefix=True)
+    stream = io.BytesIO()
+    storage.sinks["stdout"].get_stream = lambda: stream
+    with (
+        storage.open_artifact(RUN, Node(name="a"), Artifact("stdout")) as a,
+        storage.open_artifact(RUN, Node(name="b"), Artifact("stdout")) as b,
+    ):
+        a.write(b"one\n")
+        b.write(b"par")
+        a.write(b"two\nthree\n")
+        b.write(b"tial\n")
+        b.write(b"no newline")
+    await storage.flush()
+    assert stream.getvalue() == b"[a] one\n[a] two\n[a] three\n[b] partial\n[b] no newline\n"
+
+
+def test_artifact_stats(tmp_path):
+    stats = ArtifactStats()
+    for data in (b"one\n", b"", b"two\nthree"):
+        stats.update(data)
+    info = stats.info(Artifact("stdout"))
+    assert (info.size, info.lines, info.checksum) == (13, 3, hashlib.sha256(b"one\ntwo\nthree").hexdigest())
+    assert info.first_write is not None and info.last_write is not None
+    assert info.first_write <= info.last_write
+
+    path = tmp_path / "file"
+    path.write_bytes(b"one\ntwo\nthree")
+    assert ArtifactStats.of_file(path).info(Artifact("stdout")).checksum == info.checksum
+    assert ArtifactStats().info(Artifact("stderr")).first_write is None
+
+
+@pytest.mark.asyncio
+async def test_no_stats_without_database(monkeypatch):
+    def update(self, data):
+        raise AssertionError("stats computed for a database that does not keep them")
+
+    monkeypatch.setattr(ArtifactStats, "update", update)
+    wf = Tree(name="test no stats", root=TreeNode(name="node", command="echo out; echo err >&2"))
+    assert await Engine(Config()).run_workflow(wf) == ExitCode.SUCCESS
@@ -0,0 +1,72 @@
+import asyncio
+import sys
+
+import pytest
+
+from wtflow.config import Config
+from wtflow.infra.engine import Engine
+from wtflow.infra.nodes import TreeNode
+from wtflow.infra.watch import FingerprintCache, InotifyWatcher, PollingWatcher, WorkflowWatcher
+from wtflow.infra.workflow import Tree
+
+
+def test_fingerprint_cache(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_text("a")
+    cache = FingerprintCache()
+    assert cache.changed([path]) == {path}
+    assert cache.changed([path]) == set()
+
+    path.write_text("a")
+    assert cache.changed([path]) == set()
+    path.write_text("b")
+    assert cache.changed([path]) == {path}
+    path.unlink()
+    assert cache.changed([path]) == {path}
+
+
+@pytest.mark.asyncio
+async def test_rerun_affected_nodes(tmp_path, capfd):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    (tmp_path / "a" / "x.py").write_text("x")
+    (tmp_path / "b" / "y.py").write_text("y")
+    wf = Tree(
+        name="watch",
+        root=TreeNode(
+            name="root",
+            command="echo root",
+            children=[
+                TreeNode(name="a", command="echo a", inputs=("a/**/*.py",)),
+                TreeNode(name="b", command="echo b", inputs=("b/*.py",)),
+            ],
+        ),
+    )
+    watcher = WorkflowWatcher(Engine(Config()), wf.as_graph(), tmp_path, PollingWatcher())
+    watcher.affected_nodes()
+    assert await watcher.run_affected() is None
+
+    (tmp_path / "a" / "sub").mkdir()
+    (tmp_path / "a" / "sub" / "z.py").write_text("z")
+    capfd.readouterr()
+    assert await watcher.run_affected() == 0
+    out, _ = capfd.readouterr()
+    assert sorted(out.splitlines()) == ["a", "root"]
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux only")
+@pytest.mark.asyncio
+async def test_inotify_watcher(tmp_path):
+    watcher = InotifyWatcher([tmp_path], debounce=0.01)
+    try:
+        task = asyncio.create_task(watcher.wait())
+        await asyncio.sleep(0.01)
+        assert not task.done()
+        (tmp_path / "sub").mkdir()
+        await asyncio.wait_for(task, 1)
+
+        task = asyncio.create_task(watcher.wait())
+        (tmp_path / "sub" / "file").write_text("x")
+        await asyncio.wait_for(task, 1)
+    finally:
+        watcher.close()
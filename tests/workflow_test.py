@@ -0,0 +1,47 @@
+from wtflow.infra.nodes import Node, TreeNode
+from wtflow.infra.workflow import Tree
+
+
+class _CountingDict(dict[Node, tuple[Node, ...]]):
+    lookups = 0
+
+    def get(self, key, default=None):
+        self.lookups += 1
+        return super().get(key, default)
+
+
+def _chain_tree(depth: int, width: int) -> Tree:
+    leaves = [TreeNode(name=f"leaf-{i}", command="true") for i in range(width)]
+    node = TreeNode(name="level-0", children=leaves)
+    for level in range(1, depth):
+        node = TreeNode(name=f"level-{level}", children=[node, TreeNode(name=f"side-{level}")])
+    return Tree(name="big", root=node)
+
+
+def test_select_target_and_only():
+    graph = Tree(
+        name="wf",
+        root=TreeNode(
+            name="root",
+            children=[
+                TreeNode(name="a", children=[TreeNode(name="a1"), TreeNode(name="a2")]),
+                TreeNode(name="b"),
+            ],
+        ),
+    ).as_graph()
+    assert {n.name for n in graph.select(targets=["a"]).nodes} == {"a", "a1", "a2"}
+    assert {n.name for n in graph.select(only=["a"]).nodes} == {"a"}
+    selected = graph.select(targets=["a"], only=["root"])
+    assert {n.name for n in selected.nodes} == {"root", "a", "a1", "a2"}
+    assert {(x.name, y.name) for x, y in selected.edges} == {("a1", "a"), ("a2", "a"), ("a", "root")}
+
+
+def test_select_in_large_graph():
+    graph = _chain_tree(depth=50, width=100_000).as_graph()
+    graph.select(only=["level-0"])
+    # Once the indexes are built, selecting touches only the selected nodes, not the whole graph.
+    predecessors = _CountingDict(graph._predecessors)
+    graph.__dict__["_predecessors"] = predecessors
+    selected = graph.select(targets=["side-10"], only=["level-0"])
+    assert predecessors.lookups <= 4
+    assert {n.name for n in selected.nodes} == {"side-10", "level-0"}